@@ -0,0 +1,97 @@
+"""Recall, latency and memory of the /vdb/add_index configurations on synthetic data.
+
+Each configuration is built with faiss, the library behind the OpenSearch
+``faiss`` engine, from the index factory string matching the body that
+``opensearch.knn_index_body`` produces. Recall@k is measured against the
+exact search of ``LocalVectorStore``.
+
+    pip install faiss-cpu
+    python benchmarks/bench_ann_index.py [vectors] [dimension] [queries]
+"""
+import os
+import statistics
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'layers', 'boto3', 'python'))
+
+from ll_runtime import opensearch, vectorstore  # noqa: E402
+
+K = 10
+EF_SEARCH = int(os.environ.get('BENCH_EF_SEARCH', 100))
+NPROBE = int(os.environ.get('BENCH_NPROBE', 16))
+
+# name, knn_index_body options, faiss factory string, efConstruction
+CONFIGS = [
+    ('hnsw m=16 ef_c=100', {'m': 16, 'ef_construction': 100}, 'HNSW16,Flat', 100),
+    ('hnsw m=32 ef_c=256', {'m': 32, 'ef_construction': 256}, 'HNSW32,Flat', 256),
+    ('hnsw m=16 sq_fp16', {'m': 16, 'encoder': 'sq_fp16'}, 'HNSW16,SQfp16', 100),
+    ('hnsw m=16 byte', {'m': 16, 'data_type': 'byte'}, 'HNSW16,SQ8_direct_signed', 100),
+    ('ivf_pq nlist=256 m=16', {'model_id': 'ivf-pq'}, 'IVF256,PQ16', None),
+]
+
+
+def dataset(count, dimension, queries, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((64, dimension)).astype(np.float32)
+    data = centers[rng.integers(0, 64, count)] + 0.3 * rng.standard_normal((count, dimension)).astype(np.float32)
+    probes = centers[rng.integers(0, 64, queries)] + 0.3 * rng.standard_normal((queries, dimension)).astype(np.float32)
+    return data, probes
+
+
+def to_bytes(matrix, scale):
+    # byte vectors have to be quantized by the caller before indexing
+    return np.clip(np.round(matrix * scale), -128, 127).astype(np.float32)
+
+
+def timed_search(search, probes):
+    timings, rows = [], []
+    for probe in probes:
+        start = time.perf_counter()
+        rows.append(search(probe))
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return rows, statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def recall(found, truth):
+    return np.mean([len(set(f) & set(t)) / K for f, t in zip(found, truth)])
+
+
+def main(count=50000, dimension=128, queries=200):
+    threads = faiss.omp_get_max_threads()
+    data, probes = dataset(count, dimension, queries)
+    # Latency is per single-query request, so searches run on one thread
+    faiss.omp_set_num_threads(1)
+    truth, p50, p99 = timed_search(lambda probe: vectorstore.top_k(data, probe, K, 'l2')[1], probes)
+    print(f'{"configuration":<24}{"build s":>9}{"recall@10":>11}{"p50 ms":>9}{"p99 ms":>9}{"memory MiB":>12}')
+    print(f'{"exact (local store)":<24}{0:>9.1f}{1:>11.3f}{p50:>9.3f}{p99:>9.3f}{data.nbytes / 2 ** 20:>12.1f}')
+
+    scale = 127 / np.abs(data).max()
+    for name, options, factory, ef_construction in CONFIGS:
+        opensearch.knn_index_body(dimension, **options)
+        vectors, queries_ = (to_bytes(data, scale), to_bytes(probes, scale)) if 'data_type' in options else (data, probes)
+        index = faiss.index_factory(dimension, factory)
+        faiss.omp_set_num_threads(threads)
+        start = time.perf_counter()
+        if ef_construction:
+            index.hnsw.efConstruction = ef_construction
+        index.train(vectors)
+        index.add(vectors)
+        build = time.perf_counter() - start
+        faiss.omp_set_num_threads(1)
+        if ef_construction:
+            index.hnsw.efSearch = EF_SEARCH
+        else:
+            faiss.extract_index_ivf(index).nprobe = NPROBE
+
+        found, p50, p99 = timed_search(lambda probe: index.search(probe[None, :], K)[1][0], queries_)
+        memory = faiss.serialize_index(index).nbytes / 2 ** 20
+        print(f'{name:<24}{build:>9.1f}{recall(found, truth):>11.3f}{p50:>9.3f}{p99:>9.3f}{memory:>12.1f}')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
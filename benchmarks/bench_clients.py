@@ -0,0 +1,63 @@
+"""Warm-invocation latency of per-request vs. shared AWS clients.
+
+Both variants answer a DynamoDB ``get_item`` from a local botocore Stubber,
+so the numbers isolate client construction and endpoint resolution cost.
+
+    python benchmarks/bench_clients.py [iterations]
+"""
+import copy
+import os
+import statistics
+import sys
+import time
+
+import boto3
+from botocore.stub import Stubber
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'layers', 'boto3', 'python'))
+
+from ll_runtime import clients  # noqa: E402
+
+for key, value in {'AWS_ACCESS_KEY_ID': 'bench', 'AWS_SECRET_ACCESS_KEY': 'bench', 'AWS_DEFAULT_REGION': 'us-east-1'}.items():
+    os.environ.setdefault(key, value)
+
+TABLE = 'chatHistoryTable'
+RESPONSE = {'Item': {'id': {'S': 'chat'}, 'chat': {'L': [{'M': {'q': {'S': 'hi'}, 'a': {'S': 'hello'}}}]}}}
+
+
+def per_request():
+    table = boto3.resource('dynamodb').Table(TABLE)
+    with Stubber(table.meta.client) as stub:
+        stub.add_response('get_item', copy.deepcopy(RESPONSE))
+        table.get_item(Key={'id': 'chat'})
+
+
+def shared(stub):
+    stub.add_response('get_item', copy.deepcopy(RESPONSE))
+    clients.table(TABLE).get_item(Key={'id': 'chat'})
+
+
+def measure(fn, iterations):
+    fn()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def main(iterations=200):
+    stub = Stubber(clients.table(TABLE).meta.client)
+    stub.activate()
+    results = {
+        'per-request client': measure(per_request, iterations),
+        'shared client': measure(lambda: shared(stub), iterations),
+    }
+    for name, (p50, p99) in results.items():
+        print(f'{name:<20} p50={p50:8.3f}ms p99={p99:8.3f}ms')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
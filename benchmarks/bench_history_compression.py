@@ -0,0 +1,94 @@
+"""Capacity units and codec latency of plain vs. compressed history turns.
+
+Turns come from a seeded synthetic chat corpus shaped like RAG traffic:
+short questions, answers that quote retrieved passages from a shared pool of
+documents plus free text and the odd code block. Item sizes follow DynamoDB's
+sizing rules (attribute names plus values), so write units are per append and
+read units are per ``last_n=20`` window, eventually consistent.
+
+Latency is the CPU cost of encoding and decoding one turn; the DynamoDB round
+trip itself is the same for every codec and scales with the bytes moved.
+
+    python benchmarks/bench_history_compression.py [turns]
+"""
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'layers', 'boto3', 'python'))
+
+from ll_runtime import compression, history  # noqa: E402
+
+WORDS = ('the model index vector query latency request table cache region answer context document user '
+         'embedding endpoint token prompt stream batch shard write read capacity cost policy lambda api '
+         'deploy config error retry timeout throughput summary turn history search score filter result').split()
+WINDOW = 20
+
+
+def sentence(rng):
+    words = [rng.choice(WORDS[:12]) if rng.random() < 0.5 else rng.choice(WORDS) for _ in range(rng.randint(6, 18))]
+    return ' '.join(words).capitalize() + '.'
+
+
+def corpus(turns, seed=7):
+    rng = random.Random(seed)
+    documents = [' '.join(sentence(rng) for _ in range(rng.randint(4, 10))) for _ in range(40)]
+    for _ in range(turns):
+        q = ' '.join(sentence(rng) for _ in range(rng.randint(1, 2)))
+        parts = [f'[{i + 1}] {rng.choice(documents)}' for i in range(rng.randint(0, 4))]
+        parts += [' '.join(sentence(rng) for _ in range(rng.randint(2, 8)))]
+        if rng.random() < 0.2:
+            parts.append('```python\n' + '\n'.join(f'result = client.{rng.choice(WORDS)}(id={i})' for i in range(8)) + '\n```')
+        yield q, '\n\n'.join(parts)
+
+
+def item_size(item):
+    size = len('id') + 36 + len('turn') + 3
+    for name, value in item.items():
+        size += len(name) + len(value if isinstance(value, bytes) else value.encode('utf-8'))
+    return size
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def measure(turns, codec):
+    history.HISTORY_CODEC = codec
+    sizes, encode_us, decode_us = [], [], []
+    for q, a in turns:
+        start = time.perf_counter()
+        item = history.encode(q, a)
+        encode_us.append((time.perf_counter() - start) * 1e6)
+        start = time.perf_counter()
+        assert history.decode(item) == {'q': q, 'a': a}
+        decode_us.append((time.perf_counter() - start) * 1e6)
+        sizes.append(item_size(item))
+    windows = [sum(sizes[i:i + WINDOW]) for i in range(0, len(sizes), WINDOW)]
+    return {
+        'bytes/turn': statistics.mean(sizes),
+        'WCU/append': statistics.mean(math.ceil(size / 1024) for size in sizes),
+        f'RCU/{WINDOW} turns': statistics.mean(math.ceil(size / 4096) * 0.5 for size in windows),
+        'encode': percentiles(encode_us),
+        'decode': percentiles(decode_us),
+    }
+
+
+def main(count=2000):
+    turns = list(corpus(count))
+    codecs = [None, 'zlib'] + (['zstd'] if compression.zstandard else [])
+    print(f'{count} turns, mean {statistics.mean(len(q) + len(a) for q, a in turns):.0f} characters')
+    print(f'{"codec":<6} {"bytes/turn":>10} {"WCU/append":>10} {f"RCU/{WINDOW} turns":>13} '
+          f'{"encode p50/p99 us":>18} {"decode p50/p99 us":>18}')
+    for codec in codecs:
+        result = measure(turns, codec)
+        print(f'{codec or "plain":<6} {result["bytes/turn"]:>10.0f} {result["WCU/append"]:>10.2f} '
+              f'{result[f"RCU/{WINDOW} turns"]:>13.2f} {"%.1f/%.1f" % result["encode"]:>18} {"%.1f/%.1f" % result["decode"]:>18}')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
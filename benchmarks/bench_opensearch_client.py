@@ -0,0 +1,68 @@
+"""p50/p99 of the /vdb/query search call with a per-request vs. a cached OpenSearch client.
+
+Runs against a local plain-HTTP OpenSearch stand-in, so the saving shown is
+client construction plus TCP connection setup; against AOSS the cached client
+also skips a TLS handshake on every warm request.
+
+    python benchmarks/bench_opensearch_client.py [iterations]
+"""
+import os
+import statistics
+import sys
+import time
+
+from opensearchpy import OpenSearch, RequestsAWSV4SignerAuth, RequestsHttpConnection
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'layers', 'boto3', 'python'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+for key, value in {'AWS_ACCESS_KEY_ID': 'bench', 'AWS_SECRET_ACCESS_KEY': 'bench', 'AWS_DEFAULT_REGION': 'us-east-1'}.items():
+    os.environ.setdefault(key, value)
+
+from ll_runtime import clients, opensearch  # noqa: E402
+from ll_runtime.collections import Collection  # noqa: E402
+from opensearch_stub import serve  # noqa: E402
+
+QUERY = {'size': 10, 'query': {'knn': {'embedding': {'vector': [0.1] * 1024, 'k': 10}}}}
+
+
+def per_request(collection):
+    # What each handler used to do: new signer, new client, new connection
+    credentials = clients.session().get_credentials()
+    client = OpenSearch(hosts=[collection.endpoint], http_auth=RequestsAWSV4SignerAuth(credentials, collection.region, 'aoss'),
+                        http_compress=True, connection_class=RequestsHttpConnection)
+    client.search(index='docs', body=QUERY)
+
+
+def cached(collection, backend):
+    opensearch.get_client(collection, backend).search(index='docs', body=QUERY)
+
+
+def measure(fn, iterations):
+    fn()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def main(iterations=300):
+    server, url = serve()
+    collection = Collection('local', 'LLManager-local', url, 'us-east-1')
+    try:
+        results = {
+            'per-request client': measure(lambda: per_request(collection), iterations),
+            'cached (requests)': measure(lambda: cached(collection, 'requests'), iterations),
+            'cached (urllib3)': measure(lambda: cached(collection, 'urllib3'), iterations),
+        }
+    finally:
+        server.shutdown()
+    for name, (p50, p99) in results.items():
+        print(f'{name:<20} p50={p50:8.3f}ms p99={p99:8.3f}ms')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
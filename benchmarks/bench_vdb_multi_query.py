@@ -0,0 +1,93 @@
+"""Wall time of N single /vdb/query calls vs. one multi-query call.
+
+The embedding model and the collection are local stand-ins with fixed
+latencies (``BENCH_EMBED_MS`` per invoke, ``BENCH_SEARCH_MS`` per OpenSearch request),
+and the embedding cache is disabled so every query is embedded. The API
+Gateway round trip each single call would also pay is not included.
+
+    python benchmarks/bench_vdb_multi_query.py [queries] [rounds]
+"""
+import contextlib
+import importlib.util
+import io
+import json
+import math
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src', 'layers', 'boto3', 'python'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+for key, value in {'AWS_ACCESS_KEY_ID': 'bench', 'AWS_SECRET_ACCESS_KEY': 'bench', 'AWS_DEFAULT_REGION': 'us-east-1'}.items():
+    os.environ.setdefault(key, value)
+
+from ll_runtime import clients, collections  # noqa: E402
+from ll_runtime.cache import TieredCache  # noqa: E402
+from opensearch_stub import serve  # noqa: E402
+
+EMBED_SECONDS = float(os.environ.get('BENCH_EMBED_MS', 30)) / 1000
+SEARCH_SECONDS = float(os.environ.get('BENCH_SEARCH_MS', 8)) / 1000
+DIMENSION = 1024
+
+
+class ModelLambda:
+    def invoke(self, Payload, **kwargs):
+        time.sleep(EMBED_SECONDS)
+        return {'Payload': io.BytesIO(json.dumps([0.1] * DIMENSION).encode('utf-8'))}
+
+
+class EmbeddingEndpoint:
+    def invoke_endpoint(self, Body, **kwargs):
+        time.sleep(EMBED_SECONDS)
+        texts = json.loads(Body)['text_inputs']
+        return {'Body': io.BytesIO(json.dumps({'embedding': [[0.1] * DIMENSION] * len(texts)}).encode('utf-8'))}
+
+
+def load_query_lambda():
+    spec = importlib.util.spec_from_file_location('vdb_query', os.path.join(ROOT, 'src', 'vdb', 'query', 'lambda_function.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.embedding_cache = TieredCache(0)
+    return module
+
+
+def measure(fn, rounds):
+    timings = []
+    # The handler logs cache stats on every call
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()
+        for _ in range(rounds):
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main(queries=8, rounds=10):
+    server, url = serve(SEARCH_SECONDS)
+    collections._collections['bench'] = (collections.Collection('bench', 'LLManager-bench', url, 'us-east-1'), math.inf)
+    clients._clients[('lambda', None)] = ModelLambda()
+    clients._clients[('sagemaker-runtime', None)] = EmbeddingEndpoint()
+    module = load_query_lambda()
+    texts = [f'rewrite {i} of the question' for i in range(queries)]
+
+    def single():
+        for text in texts:
+            module.lambda_handler({'body': json.dumps({'name': 'bench', 'index': 'docs', 'query': text})}, None)
+
+    def multi():
+        module.lambda_handler({'body': json.dumps({'name': 'bench', 'index': 'docs', 'queries': texts})}, None)
+
+    try:
+        results = {f'{queries} single queries': measure(single, rounds), '1 multi-query call': measure(multi, rounds)}
+    finally:
+        server.shutdown()
+    for name, p50 in results.items():
+        print(f'{name:<20} p50={p50:8.1f}ms')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,49 @@
+"""A local OpenSearch stand-in answering ``_search`` and ``_msearch`` with canned kNN hits."""
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def hits(size):
+    return {'hits': {'total': {'value': size}, 'hits': [
+        {'_id': str(i), '_score': 1.0 / (i + 1), '_source': {'metadata': f'document {i}'}, 'sort': [1.0 / (i + 1)]}
+        for i in range(size)]}}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = 0.0
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        time.sleep(self.latency)
+        if self.path.split('?')[0].endswith('/_msearch'):
+            searches = [json.loads(line) for line in body.decode('utf-8').splitlines() if line.strip()][1::2]
+            payload = {'responses': [dict(hits(search.get('size', 10)), status=200) for search in searches]}
+        else:
+            payload = hits(json.loads(body or b'{}').get('size', 10))
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(latency=0.0):
+    """Start the stand-in on a free port and return ``(server, url)``."""
+    handler = type('StubHandler', (Handler,), {'latency': latency})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
@@ -2,9 +2,17 @@ from aws_cdk import (
     aws_dynamodb as dynamodb, 
     aws_lambda as lambda_, 
     aws_iam as iam, 
-    aws_apigateway as apigw
+    aws_apigateway as apigw,
+    aws_lambda_event_sources as event_sources,
+    aws_s3 as s3,
+    aws_events as events,
+    aws_events_targets as targets,
+    Duration,
 )
 from constructs import Construct
+import os
+
+from ll_manager.resources.jobs.jobs import JobResources
 
 class HistoryResources(Construct):
     def __init__(self, scope: Construct, construct_id: str, basic_lambda_policy: iam.PolicyStatement, 
@@ -12,16 +20,32 @@ class HistoryResources(Construct):
         super().__init__(scope, construct_id, **kwargs)
 
         hist_table = self.create_table()
+
+        # Opt-in: rolling summaries of long conversations, made with this model, see ll_runtime.compaction
+        compaction_model = os.environ.get('HISTORY_COMPACTION_MODEL')
+
+        turns_table = self.create_turns_table(compaction_model)
+
+        archive_bucket = self.create_archive_bucket()
         
         permissive_table_statement, readonly_table_statement = self.create_table_statement(hist_table)
 
         history_resource = gateway.root.add_resource("history")
 
-        self.get_endpoint(basic_lambda_policy, boto3_layer, history_resource, hist_table, readonly_table_statement, authorizer)
+        self.get_endpoint(basic_lambda_policy, boto3_layer, history_resource, hist_table, turns_table, archive_bucket, readonly_table_statement, authorizer)
+
+        self.add_new_endpoint(basic_lambda_policy, boto3_layer, history_resource, turns_table, permissive_table_statement, authorizer)
 
-        self.add_new_endpoint(basic_lambda_policy, boto3_layer, history_resource, hist_table, permissive_table_statement, authorizer)
+        self.append_endpoint(basic_lambda_policy, boto3_layer, history_resource, hist_table, turns_table, archive_bucket, permissive_table_statement, authorizer)
 
-        self.append_endpoint(basic_lambda_policy, boto3_layer, history_resource, hist_table, permissive_table_statement, authorizer)
+        self.migrate_function(basic_lambda_policy, boto3_layer, hist_table, turns_table)
+
+        self.archive_function(basic_lambda_policy, boto3_layer, turns_table, archive_bucket)
+
+        self.bulk_endpoint(basic_lambda_policy, boto3_layer, history_resource, turns_table, authorizer)
+
+        if compaction_model:
+            self.compact_function(basic_lambda_policy, boto3_layer, turns_table, compaction_model)
 
     def create_table_statement(self, hist_table):
         permissive_table_statement = iam.PolicyStatement(
@@ -44,37 +68,147 @@ class HistoryResources(Construct):
                                    
         return hist_table
 
-    def append_endpoint(self, basic_lambda_policy, boto3_layer, history_resource, hist_table, readonly_table_statement, authorizer):
-        history_append_policy = iam.PolicyDocument(statements=[basic_lambda_policy, readonly_table_statement])
+    def create_turns_table(self, compaction_model):
+        # One item per turn, see ll_runtime.history; chatHistoryTable is only read to migrate old conversations
+        turns_table = dynamodb.Table(self, "HistTurnsTable", partition_key=dynamodb.Attribute(name="id", type=dynamodb.AttributeType.STRING),
+                                     sort_key=dynamodb.Attribute(name="turn", type=dynamodb.AttributeType.NUMBER),
+                                     billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST, table_name="chatHistoryTurnsTable",
+                                     stream=dynamodb.StreamViewType.NEW_IMAGE if compaction_model else None,
+                                     time_to_live_attribute="expires_at")
+        # Sparse: only head items carry idle_shard, so the archive job reads just the idle conversations
+        turns_table.add_global_secondary_index(index_name="idle-index",
+                                               partition_key=dynamodb.Attribute(name="idle_shard", type=dynamodb.AttributeType.NUMBER),
+                                               sort_key=dynamodb.Attribute(name="last_active", type=dynamodb.AttributeType.NUMBER),
+                                               projection_type=dynamodb.ProjectionType.KEYS_ONLY)
+
+        return turns_table
+
+    def create_archive_bucket(self):
+        # Idle conversations as gzipped JSON lines, see ll_runtime.history.archive
+        archive_bucket = s3.Bucket(self, "HistoryArchiveBucket", encryption=s3.BucketEncryption.S3_MANAGED,
+                                   block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+                                   lifecycle_rules=[s3.LifecycleRule(transitions=[s3.Transition(
+                                       storage_class=s3.StorageClass.INFREQUENT_ACCESS, transition_after=Duration.days(30))])])
+
+        return archive_bucket
+
+    def append_endpoint(self, basic_lambda_policy, boto3_layer, history_resource, hist_table, turns_table, archive_bucket, permissive_table_statement, authorizer):
+        history_append_policy = iam.PolicyDocument(statements=[basic_lambda_policy, permissive_table_statement])
         history_append_role = iam.Role(self, "HistoryAppendRole", assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
                                   inline_policies={"history_append_policy": history_append_policy})
         history_append_lambda = lambda_.Function(self, "HistoryAppendLambda", runtime=lambda_.Runtime.PYTHON_3_11, code=lambda_.Code.from_asset("src/history/append"), 
                                             handler="lambda_function.lambda_handler", role=history_append_role, layers=[boto3_layer])
-        history_append_lambda.add_environment("TABLE_NAME", hist_table.table_name)
-        hist_table.grant_read_write_data(history_append_lambda)
+        history_append_lambda.add_environment("TABLE_NAME", turns_table.table_name)
+        history_append_lambda.add_environment("LEGACY_TABLE_NAME", hist_table.table_name)
+        history_append_lambda.add_environment("HISTORY_ARCHIVE_BUCKET", archive_bucket.bucket_name)
+        turns_table.grant_read_write_data(history_append_lambda)
+        hist_table.grant_read_data(history_append_lambda)
+        archive_bucket.grant_read(history_append_lambda)
         lambda_integration = apigw.LambdaIntegration(history_append_lambda)
         history_resource.add_resource("append").add_method("POST", lambda_integration, authorizer=authorizer)
 
-    def add_new_endpoint(self, basic_lambda_policy, boto3_layer, history_resource, hist_table, permissive_table_statement, authorizer):
+    def add_new_endpoint(self, basic_lambda_policy, boto3_layer, history_resource, turns_table, permissive_table_statement, authorizer):
         history_new_policy = iam.PolicyDocument(statements=[basic_lambda_policy, permissive_table_statement])
         history_new_role = iam.Role(self, "HistoryNewRole", assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
                                    inline_policies={"history_new_policy": history_new_policy})
         history_new_lambda = lambda_.Function(self, "HistoryNewLambda", runtime=lambda_.Runtime.PYTHON_3_11, code=lambda_.Code.from_asset("src/history/new"), 
                                              handler="lambda_function.lambda_handler", role=history_new_role, layers=[boto3_layer])
-        history_new_lambda.add_environment("TABLE_NAME", hist_table.table_name)
-        hist_table.grant_read_write_data(history_new_lambda)
+        history_new_lambda.add_environment("TABLE_NAME", turns_table.table_name)
+        turns_table.grant_read_write_data(history_new_lambda)
         lambda_integration = apigw.LambdaIntegration(history_new_lambda)
         history_resource.add_resource("new").add_method("POST", lambda_integration, authorizer=authorizer)
 
-    def get_endpoint(self, basic_lambda_policy, boto3_layer, history_resource, hist_table, permissive_table_statement, authorizer):
-        history_get_policy = iam.PolicyDocument(statements=[basic_lambda_policy, permissive_table_statement])
+    def get_endpoint(self, basic_lambda_policy, boto3_layer, history_resource, hist_table, turns_table, archive_bucket, readonly_table_statement, authorizer):
+        history_get_policy = iam.PolicyDocument(statements=[basic_lambda_policy, readonly_table_statement])
         history_get_role = iam.Role(self, "HistoryGetRole", assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
                                    inline_policies={"history_get_policy": history_get_policy})
         history_get_lambda = lambda_.Function(self, "HistoryGetLambda", runtime=lambda_.Runtime.PYTHON_3_11, code=lambda_.Code.from_asset("src/history/get"), 
                                              handler="lambda_function.lambda_handler", role=history_get_role, layers=[boto3_layer])
-        history_get_lambda.add_environment("TABLE_NAME", hist_table.table_name)
-        hist_table.grant_read_write_data(history_get_lambda)
+        history_get_lambda.add_environment("TABLE_NAME", turns_table.table_name)
+        history_get_lambda.add_environment("LEGACY_TABLE_NAME", hist_table.table_name)
+        history_get_lambda.add_environment("HISTORY_ARCHIVE_BUCKET", archive_bucket.bucket_name)
+        turns_table.grant_read_write_data(history_get_lambda)
+        hist_table.grant_read_data(history_get_lambda)
+        archive_bucket.grant_read(history_get_lambda)
         lambda_integration = apigw.LambdaIntegration(history_get_lambda)
         history_resource.add_resource("get").add_method("POST", lambda_integration, authorizer=authorizer)
 
-        
+    def migrate_function(self, basic_lambda_policy, boto3_layer, hist_table, turns_table):
+        # Invoked by hand, once per scan segment, to copy chatHistoryTable into chatHistoryTurnsTable
+        history_migrate_policy = iam.PolicyDocument(statements=[basic_lambda_policy])
+        history_migrate_role = iam.Role(self, "HistoryMigrateRole", assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
+                                        inline_policies={"history_migrate_policy": history_migrate_policy})
+        history_migrate_lambda = lambda_.Function(self, "HistoryMigrateLambda", runtime=lambda_.Runtime.PYTHON_3_11, code=lambda_.Code.from_asset("src/history/migrate"), 
+                                                  handler="lambda_function.lambda_handler", role=history_migrate_role, layers=[boto3_layer],
+                                                  timeout=Duration.seconds(900))
+        history_migrate_lambda.add_environment("TABLE_NAME", turns_table.table_name)
+        history_migrate_lambda.add_environment("LEGACY_TABLE_NAME", hist_table.table_name)
+        turns_table.grant_read_write_data(history_migrate_lambda)
+        hist_table.grant_read_data(history_migrate_lambda)
+
+    def compact_function(self, basic_lambda_policy, boto3_layer, turns_table, compaction_model):
+        sagemaker_statement = iam.PolicyStatement(
+            actions=[
+                "sagemaker:DescribeEndpoint",
+                "sagemaker:InvokeEndpoint"
+            ],
+            resources=["*"]
+        )
+        history_compact_policy = iam.PolicyDocument(statements=[basic_lambda_policy, sagemaker_statement])
+        history_compact_role = iam.Role(self, "HistoryCompactRole", assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
+                                        inline_policies={"history_compact_policy": history_compact_policy})
+        history_compact_lambda = lambda_.Function(self, "HistoryCompactLambda", runtime=lambda_.Runtime.PYTHON_3_11, code=lambda_.Code.from_asset("src/history/compact"), 
+                                                  handler="lambda_function.lambda_handler", role=history_compact_role, layers=[boto3_layer],
+                                                  timeout=Duration.seconds(300))
+        history_compact_lambda.add_environment("TABLE_NAME", turns_table.table_name)
+        history_compact_lambda.add_environment("COMPACTION_MODEL", compaction_model)
+        turns_table.grant_read_write_data(history_compact_lambda)
+        # Appends bump the head item (turn 0), so only those records wake the compactor
+        history_compact_lambda.add_event_source(event_sources.DynamoEventSource(
+            turns_table, starting_position=lambda_.StartingPosition.LATEST, batch_size=100, retry_attempts=2,
+            max_batching_window=Duration.seconds(5),
+            filters=[lambda_.FilterCriteria.filter({"dynamodb": {"Keys": {"turn": {"N": lambda_.FilterRule.is_equal("0")}}}})]))
+
+    def archive_function(self, basic_lambda_policy, boto3_layer, turns_table, archive_bucket):
+        history_archive_policy = iam.PolicyDocument(statements=[basic_lambda_policy])
+        history_archive_role = iam.Role(self, "HistoryArchiveRole", assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
+                                        inline_policies={"history_archive_policy": history_archive_policy})
+        history_archive_lambda = lambda_.Function(self, "HistoryArchiveLambda", runtime=lambda_.Runtime.PYTHON_3_11, code=lambda_.Code.from_asset("src/history/archive"), 
+                                                  handler="lambda_function.lambda_handler", role=history_archive_role, layers=[boto3_layer],
+                                                  timeout=Duration.seconds(900))
+        history_archive_lambda.add_environment("TABLE_NAME", turns_table.table_name)
+        history_archive_lambda.add_environment("HISTORY_ARCHIVE_BUCKET", archive_bucket.bucket_name)
+        turns_table.grant_read_write_data(history_archive_lambda)
+        archive_bucket.grant_read_write(history_archive_lambda)
+        events.Rule(self, "HistoryArchiveSchedule", schedule=events.Schedule.rate(Duration.days(1)),
+                    targets=[targets.LambdaFunction(history_archive_lambda)])
+
+    def bulk_endpoint(self, basic_lambda_policy, boto3_layer, history_resource, turns_table, authorizer):
+        s3_statement = iam.PolicyStatement(
+            actions=[
+                "s3:GetObject",
+                "s3:PutObject",
+                "s3:AbortMultipartUpload"
+            ],
+            resources=["*"]
+        )
+        history_bulk_policy = iam.PolicyDocument(statements=[basic_lambda_policy, s3_statement])
+        history_bulk_role = iam.Role(self, "HistoryBulkRole", assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
+                                     inline_policies={"history_bulk_policy": history_bulk_policy})
+        # Import and export jobs, see ll_runtime.bulk_jobs
+        bulk_jobs = JobResources(self, "HistoryBulkJobs", "chatHistoryJobsTable", "src/history/bulk_worker", history_bulk_role, boto3_layer)
+        bulk_jobs.worker.add_environment("TABLE_NAME", turns_table.table_name)
+        turns_table.grant_read_write_data(bulk_jobs.worker)
+
+        history_bulk_lambda = lambda_.Function(self, "HistoryBulkLambda", runtime=lambda_.Runtime.PYTHON_3_11, code=lambda_.Code.from_asset("src/history/bulk"), 
+                                               handler="lambda_function.lambda_handler", role=history_bulk_role, layers=[boto3_layer],
+                                               timeout=Duration.seconds(30))
+        history_bulk_lambda.add_environment("TABLE_NAME", turns_table.table_name)
+        bulk_jobs.grant_start(history_bulk_lambda)
+
+        lambda_integration = apigw.LambdaIntegration(history_bulk_lambda)
+        history_resource.add_resource("import").add_method("POST", lambda_integration, authorizer=authorizer)
+        history_resource.add_resource("export").add_method("POST", lambda_integration, authorizer=authorizer)
+        bulk_resource = history_resource.add_resource("bulk")
+        bulk_resource.add_resource("status").add_method("POST", lambda_integration, authorizer=authorizer)
+        bulk_resource.add_resource("retry").add_method("POST", lambda_integration, authorizer=authorizer)
@@ -0,0 +1,42 @@
+from aws_cdk import (
+    aws_dynamodb as dynamodb, 
+    aws_lambda as lambda_, 
+    aws_iam as iam, 
+    aws_lambda_event_sources as event_sources,
+    aws_sqs as sqs,
+    Duration,
+)
+from constructs import Construct
+
+class JobResources(Construct):
+    """A jobs table, its queues and the worker Lambda that runs the queued tasks, see ll_runtime.jobs."""
+
+    def __init__(self, scope: Construct, construct_id: str, table_name: str, worker_code: str, role: iam.Role,
+                 boto3_layer: lambda_.LayerVersion, **kwargs) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        self.table = dynamodb.Table(self, "Table", partition_key=dynamodb.Attribute(name="job_id", type=dynamodb.AttributeType.STRING),
+                                    sort_key=dynamodb.Attribute(name="task", type=dynamodb.AttributeType.STRING),
+                                    billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST, table_name=table_name)
+
+        # Workers get up to 15 minutes per task, so messages stay hidden a little longer than that.
+        # Messages that keep failing are parked in the dead-letter queue, whose records the worker marks as failed
+        self.dead_letter_queue = sqs.Queue(self, "DeadLetterQueue", visibility_timeout=Duration.seconds(960),
+                                           retention_period=Duration.days(14))
+        self.queue = sqs.Queue(self, "Queue", visibility_timeout=Duration.seconds(960),
+                               dead_letter_queue=sqs.DeadLetterQueue(queue=self.dead_letter_queue, max_receive_count=5))
+
+        self.worker = lambda_.Function(self, "WorkerLambda", runtime=lambda_.Runtime.PYTHON_3_11, code=lambda_.Code.from_asset(worker_code), 
+                                       handler="lambda_function.lambda_handler", role=role, layers=[boto3_layer],
+                                       timeout=Duration.seconds(900), memory_size=1024)
+        self.grant_start(self.worker)
+        self.worker.add_environment("DEAD_LETTER_QUEUE_ARN", self.dead_letter_queue.queue_arn)
+        self.worker.add_event_source(event_sources.SqsEventSource(self.queue, batch_size=1, report_batch_item_failures=True))
+        self.worker.add_event_source(event_sources.SqsEventSource(self.dead_letter_queue, batch_size=10, report_batch_item_failures=True))
+
+    def grant_start(self, function):
+        # Starting a job records it and queues its tasks; workers also queue the pages they list
+        function.add_environment("JOBS_TABLE_NAME", self.table.table_name)
+        function.add_environment("QUEUE_URL", self.queue.queue_url)
+        self.table.grant_read_write_data(function)
+        self.queue.grant_send_messages(function)
@@ -5,7 +5,9 @@ from aws_cdk import (
     aws_apigateway as apigw,
     aws_events as events,
     aws_events_targets as events_targets,
+    CfnOutput,
     Duration,
+    Stack,
 )
 from constructs import Construct
 
@@ -15,6 +17,8 @@ class ModelResources(Construct):
         super().__init__(scope, construct_id, **kwargs)
 
         model_table = self.create_table()
+
+        cache_table = self.create_cache_table()
         
         permissive_table_statement = self.create_table_statement(model_table)
         
@@ -31,8 +35,7 @@ class ModelResources(Construct):
         # TODO: iam and sagemaker perms, S3 perms?
         self.create_endpoint(basic_lambda_policy, model_resource, model_table, permissive_table_statement, authorizer)
 
-        # TODO: iam and sagemaker perms
-        self.query_endpoint(basic_lambda_policy, boto3_layer, model_resource, model_table, permissive_table_statement, authorizer)
+        self.query_endpoint(basic_lambda_policy, boto3_layer, model_resource, model_table, permissive_table_statement, authorizer, cache_table)
 
         # TODO: iam and sagemaker perms
         self.status_endpoint(basic_lambda_policy, boto3_layer, model_resource, authorizer)
@@ -52,6 +55,13 @@ class ModelResources(Construct):
                                    
         return model_table
 
+    def create_cache_table(self):
+        cache_table = dynamodb.Table(self, "GenerationCacheTable", partition_key=dynamodb.Attribute(name="id", type=dynamodb.AttributeType.STRING),
+                                     billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST, table_name="generationCacheTable",
+                                     time_to_live_attribute="ttl")
+
+        return cache_table
+
     def status_endpoint(self, basic_lambda_policy, boto3_layer, model_resource, authorizer):
         model_status_policy = iam.PolicyDocument(statements=[basic_lambda_policy])
         model_status_role = iam.Role(self, "ModelStatusRole", assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
@@ -62,16 +72,37 @@ class ModelResources(Construct):
         lambda_integration = apigw.LambdaIntegration(model_query_lambda)
         model_resource.add_resource("status").add_method("POST", lambda_integration, authorizer=authorizer)
 
-    def query_endpoint(self, basic_lambda_policy, boto3_layer, model_resource, model_table, permissive_table_statement, authorizer):
-        model_query_policy = iam.PolicyDocument(statements=[basic_lambda_policy, permissive_table_statement])
+    def query_endpoint(self, basic_lambda_policy, boto3_layer, model_resource, model_table, permissive_table_statement, authorizer, cache_table):
+        sagemaker_statement = iam.PolicyStatement(
+            actions=[
+                "sagemaker:DescribeEndpoint",
+                "sagemaker:InvokeEndpoint",
+                "sagemaker:InvokeEndpointWithResponseStream"
+            ],
+            resources=["*"]
+        )
+        model_query_policy = iam.PolicyDocument(statements=[basic_lambda_policy, permissive_table_statement, sagemaker_statement])
         model_query_role = iam.Role(self, "ModelQueryRole", assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
                                   inline_policies={"model_query_policy": model_query_policy})
         model_query_lambda = lambda_.Function(self, "ModelQueryLambda", runtime=lambda_.Runtime.PYTHON_3_11, code=lambda_.Code.from_asset("src/model/query"), 
                                             handler="lambda_function.lambda_handler", role=model_query_role, timeout=Duration.seconds(300), layers=[boto3_layer])
+        model_query_lambda.add_environment("CACHE_TABLE_NAME", cache_table.table_name)
         model_table.grant_read_write_data(model_query_lambda)
+        cache_table.grant_read_write_data(model_query_lambda)
         lambda_integration = apigw.LambdaIntegration(model_query_lambda)
         model_resource.add_resource("query").add_method("POST", lambda_integration, authorizer=authorizer)
 
+        # API Gateway buffers responses, so token streams go through a RESPONSE_STREAM function URL
+        # running the same handler module as a server under the Lambda Web Adapter
+        web_adapter_layer = lambda_.LayerVersion.from_layer_version_arn(self, "WebAdapterLayer",
+            f"arn:aws:lambda:{Stack.of(self).region}:753240598075:layer:LambdaAdapterLayerX86:24")
+        model_stream_lambda = lambda_.Function(self, "ModelStreamLambda", runtime=lambda_.Runtime.PYTHON_3_11, code=lambda_.Code.from_asset("src/model/query"),
+                                             handler="run.sh", role=model_query_role, timeout=Duration.seconds(300), layers=[boto3_layer, web_adapter_layer],
+                                             environment={"AWS_LAMBDA_EXEC_WRAPPER": "/opt/bootstrap", "AWS_LWA_INVOKE_MODE": "response_stream",
+                                                          "CACHE_TABLE_NAME": cache_table.table_name})
+        model_stream_url = model_stream_lambda.add_function_url(auth_type=lambda_.FunctionUrlAuthType.AWS_IAM, invoke_mode=lambda_.InvokeMode.RESPONSE_STREAM)
+        CfnOutput(self, "ModelStreamUrl", value=model_stream_url.url)
+
     def delete_endpoint(self, basic_lambda_policy, boto3_layer, model_resource, model_table, permissive_table_statement, authorizer):
         model_delete_policy = iam.PolicyDocument(statements=[basic_lambda_policy, permissive_table_statement])
         model_delete_role = iam.Role(self, "ModelDeleteRole", assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
@@ -130,12 +161,15 @@ class ModelResources(Construct):
         )
         sagemaker_layer = lambda_.LayerVersion(self, "SagemakerLayer", code=lambda_.Code.from_asset("src/layers/sagemaker"),
                                                compatible_runtimes=[lambda_.Runtime.PYTHON_3_11])
+        # Only ll_runtime from the Boto3Layer, so the sagemaker layer's pinned boto3 is the one imported
+        runtime_layer = lambda_.LayerVersion(self, "RuntimeLayer", code=lambda_.Code.from_asset("src/layers/boto3", exclude=["requirements.txt", "python/lib"]),
+                                             compatible_runtimes=[lambda_.Runtime.PYTHON_3_11])
         
         model_create_policy = iam.PolicyDocument(statements=[basic_lambda_policy, permissive_table_statement, sagemaker_statement, create_roles_statement, s3_access_statement])
         model_create_role = iam.Role(self, "ModelCreateRole", assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
                                    inline_policies={"model_create_policy": model_create_policy})
         model_create_lambda = lambda_.Function(self, "ModelCreateLambda", runtime=lambda_.Runtime.PYTHON_3_11, code=lambda_.Code.from_asset("src/model/create"), timeout=Duration.seconds(300),
-                                             handler="lambda_function.lambda_handler", role=model_create_role, layers=[sagemaker_layer], environment={"TABLE_NAME": model_table.table_name})
+                                             handler="lambda_function.lambda_handler", role=model_create_role, layers=[sagemaker_layer, runtime_layer], environment={"TABLE_NAME": model_table.table_name})
         model_table.grant_read_write_data(model_create_lambda)
         lambda_integration = apigw.LambdaIntegration(model_create_lambda)
         model_resource.add_resource("create").add_method("POST", lambda_integration, authorizer=authorizer)
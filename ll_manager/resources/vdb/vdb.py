@@ -5,22 +5,29 @@ from aws_cdk import (
     aws_iam as iam, 
     aws_apigateway as apigw,
     aws_opensearchserverless as opensearch,
+    Duration,
 )
 from constructs import Construct
 import os
 
+from ll_manager.resources.jobs.jobs import JobResources
+
 class VdbResources(Construct):
     def __init__(self, scope: Construct, construct_id: str, basic_lambda_policy: iam.PolicyStatement, boto3_layer: lambda_.LayerVersion, 
                  authorizer: apigw.TokenAuthorizer, gateway: apigw.RestApi, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
         vdb_table = self.create_table()
+
+        embedding_cache_table = self.create_embedding_cache_table()
         
         permissive_table_statement = self.create_table_statement(vdb_table)
+
+        collection_statement = self.create_collection_statement()
         
         vdb_resource = gateway.root.add_resource("vdb")
 
-        self.add_endpoint(basic_lambda_policy, boto3_layer, vdb_resource, vdb_table, permissive_table_statement, authorizer)
+        self.add_endpoint(basic_lambda_policy, boto3_layer, vdb_resource, vdb_table, permissive_table_statement, authorizer, collection_statement)
 
         self.create_endpoint(basic_lambda_policy, boto3_layer, vdb_resource, vdb_table, permissive_table_statement, authorizer)
 
@@ -28,18 +35,23 @@ class VdbResources(Construct):
 
         self.embed_endpoint(basic_lambda_policy, boto3_layer, vdb_resource, vdb_table, permissive_table_statement, authorizer)
 
-        self.query_endpoint(basic_lambda_policy, boto3_layer, vdb_resource, vdb_table, permissive_table_statement, authorizer)
+        self.ingest_endpoint(basic_lambda_policy, boto3_layer, vdb_resource, vdb_table, permissive_table_statement, authorizer)
+
+        self.query_endpoint(basic_lambda_policy, boto3_layer, vdb_resource, vdb_table, permissive_table_statement, authorizer, collection_statement,
+                            embedding_cache_table)
 
         self.status_endpoint(basic_lambda_policy, boto3_layer, vdb_resource, authorizer)
 
-        self.add_index_endpoint(basic_lambda_policy, boto3_layer, vdb_resource, authorizer)
+        self.add_index_endpoint(basic_lambda_policy, boto3_layer, vdb_resource, authorizer, collection_statement)
 
-    def add_endpoint(self, basic_lambda_policy, boto3_layer, vdb_resource, vdb_table, permissive_table_statement, authorizer):
-        vdb_add_lambda_policy = iam.PolicyDocument(statements=[basic_lambda_policy, permissive_table_statement])
+    def add_endpoint(self, basic_lambda_policy, boto3_layer, vdb_resource, vdb_table, permissive_table_statement, authorizer, collection_statement):
+        vdb_add_lambda_policy = iam.PolicyDocument(statements=[basic_lambda_policy, permissive_table_statement, collection_statement])
         vdb_add_lambda_role = iam.Role(self, "VdbAddLambdaRole", assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
                                         inline_policies={"vdb_add_lambda_policy": vdb_add_lambda_policy})
         vdb_add_lambda = lambda_.Function(self, "VdbAddLambda", runtime=lambda_.Runtime.PYTHON_3_11, code=lambda_.Code.from_asset("src/vdb/add"), 
-                                          handler="lambda_function.lambda_handler", role=vdb_add_lambda_role, layers=[boto3_layer])
+                                          handler="lambda_function.lambda_handler", role=vdb_add_lambda_role, layers=[boto3_layer],
+                                          timeout=Duration.seconds(900), memory_size=1024)
+        vdb_add_lambda.add_environment("TABLE_NAME", vdb_table.table_name)
         vdb_table.grant_read_write_data(vdb_add_lambda)
         lambda_integration = apigw.LambdaIntegration(vdb_add_lambda)
         vdb_resource.add_resource("add").add_method("POST", lambda_integration, authorizer=authorizer)
@@ -53,12 +65,32 @@ class VdbResources(Construct):
             
         return permissive_table_statement
 
+    def create_collection_statement(self):
+        collection_statement = iam.PolicyStatement(
+                actions=["aoss:BatchGetCollection", "aoss:APIAccessAll"],
+                resources=["*"],
+                effect=iam.Effect.ALLOW,
+            )
+
+        return collection_statement
+
     def create_table(self):
         vdb_table = dynamodb.Table(self, "VdbTable", partition_key=dynamodb.Attribute(name="id", type=dynamodb.AttributeType.STRING), 
                                    billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST, table_name="vdbLifecycleTable")
+        # Per-source chunk manifests, see ll_runtime.manifest
+        vdb_table.add_global_secondary_index(index_name="source-index",
+                                             partition_key=dynamodb.Attribute(name="source_id", type=dynamodb.AttributeType.STRING),
+                                             sort_key=dynamodb.Attribute(name="chunk_hash", type=dynamodb.AttributeType.STRING))
                                    
         return vdb_table
 
+    def create_embedding_cache_table(self):
+        embedding_cache_table = dynamodb.Table(self, "EmbeddingCacheTable", partition_key=dynamodb.Attribute(name="id", type=dynamodb.AttributeType.STRING),
+                                               billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST, table_name="embeddingCacheTable",
+                                               time_to_live_attribute="ttl")
+
+        return embedding_cache_table
+
     def status_endpoint(self, basic_lambda_policy, boto3_layer, vdb_resource, authorizer):
         vdb_status_policy = iam.PolicyDocument(statements=[basic_lambda_policy])
         vdb_status_role = iam.Role(self, "VdbStatusRole", assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
@@ -68,26 +100,82 @@ class VdbResources(Construct):
         lambda_integration = apigw.LambdaIntegration(vdb_query_lambda)
         vdb_resource.add_resource("status").add_method("POST", lambda_integration, authorizer=authorizer)
 
-    def query_endpoint(self, basic_lambda_policy, boto3_layer, vdb_resource, vdb_table, permissive_table_statement, authorizer):
-        vdb_query_policy = iam.PolicyDocument(statements=[basic_lambda_policy, permissive_table_statement])
+    def query_endpoint(self, basic_lambda_policy, boto3_layer, vdb_resource, vdb_table, permissive_table_statement, authorizer, collection_statement,
+                       embedding_cache_table):
+        sagemaker_statement = iam.PolicyStatement(
+            actions=[
+                "sagemaker:InvokeEndpoint"
+            ],
+            resources=["*"]
+        )
+        vdb_query_policy = iam.PolicyDocument(statements=[basic_lambda_policy, permissive_table_statement, collection_statement, sagemaker_statement])
         vdb_query_role = iam.Role(self, "VdbQueryRole", assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
                                   inline_policies={"vdb_query_policy": vdb_query_policy})
         vdb_query_lambda = lambda_.Function(self, "VdbQueryLambda", runtime=lambda_.Runtime.PYTHON_3_11, code=lambda_.Code.from_asset("src/vdb/query"), 
                                             handler="lambda_function.lambda_handler", role=vdb_query_role, layers=[boto3_layer])
+        vdb_query_lambda.add_environment("CACHE_TABLE_NAME", embedding_cache_table.table_name)
         vdb_table.grant_read_write_data(vdb_query_lambda)
+        embedding_cache_table.grant_read_write_data(vdb_query_lambda)
         lambda_integration = apigw.LambdaIntegration(vdb_query_lambda)
         vdb_resource.add_resource("query").add_method("POST", lambda_integration, authorizer=authorizer)
 
     def embed_endpoint(self, basic_lambda_policy, boto3_layer, vdb_resource, vdb_table, permissive_table_statement, authorizer):
-        vdb_embed_policy = iam.PolicyDocument(statements=[basic_lambda_policy, permissive_table_statement])
+        sagemaker_statement = iam.PolicyStatement(
+            actions=[
+                "sagemaker:DescribeEndpoint",
+                "sagemaker:InvokeEndpoint"
+            ],
+            resources=["*"]
+        )
+        vdb_embed_policy = iam.PolicyDocument(statements=[basic_lambda_policy, permissive_table_statement, sagemaker_statement])
         vdb_embed_role = iam.Role(self, "VdbEmbedRole", assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
                                   inline_policies={"vdb_embed_policy": vdb_embed_policy})
         vdb_embed_lambda = lambda_.Function(self, "VdbEmbedLambda", runtime=lambda_.Runtime.PYTHON_3_11, code=lambda_.Code.from_asset("src/vdb/embed"), 
-                                            handler="lambda_function.lambda_handler", role=vdb_embed_role, layers=[boto3_layer])
+                                            handler="lambda_function.lambda_handler", role=vdb_embed_role, layers=[boto3_layer],
+                                            timeout=Duration.seconds(900), memory_size=1024)
+        vdb_embed_lambda.add_environment("TABLE_NAME", vdb_table.table_name)
         vdb_table.grant_read_write_data(vdb_embed_lambda)
         lambda_integration = apigw.LambdaIntegration(vdb_embed_lambda)
         vdb_resource.add_resource("embed").add_method("POST", lambda_integration, authorizer=authorizer)
 
+    def ingest_endpoint(self, basic_lambda_policy, boto3_layer, vdb_resource, vdb_table, permissive_table_statement, authorizer):
+        sagemaker_statement = iam.PolicyStatement(
+            actions=[
+                "sagemaker:DescribeEndpoint",
+                "sagemaker:InvokeEndpoint"
+            ],
+            resources=["*"]
+        )
+        s3_statement = iam.PolicyStatement(
+            actions=[
+                "s3:ListBucket",
+                "s3:GetObject",
+                "s3:PutObject",
+                "s3:AbortMultipartUpload"
+            ],
+            resources=["*"]
+        )
+        vdb_ingest_policy = iam.PolicyDocument(statements=[basic_lambda_policy, permissive_table_statement, sagemaker_statement, s3_statement])
+        vdb_ingest_role = iam.Role(self, "VdbIngestRole", assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
+                                   inline_policies={"vdb_ingest_policy": vdb_ingest_policy})
+        # Ingestion jobs and their per-object progress, see ll_runtime.ingest
+        ingest_jobs = JobResources(self, "VdbIngestJobs", "vdbIngestJobsTable", "src/vdb/ingest_worker", vdb_ingest_role, boto3_layer)
+        ingest_jobs.worker.add_environment("TABLE_NAME", vdb_table.table_name)
+        vdb_table.grant_read_write_data(ingest_jobs.worker)
+
+        vdb_ingest_lambda = lambda_.Function(self, "VdbIngestLambda", runtime=lambda_.Runtime.PYTHON_3_11, code=lambda_.Code.from_asset("src/vdb/ingest"), 
+                                             handler="lambda_function.lambda_handler", role=vdb_ingest_role, layers=[boto3_layer],
+                                             timeout=Duration.seconds(900), memory_size=1024)
+        vdb_ingest_lambda.add_environment("TABLE_NAME", vdb_table.table_name)
+        vdb_table.grant_read_write_data(vdb_ingest_lambda)
+        ingest_jobs.grant_start(vdb_ingest_lambda)
+
+        lambda_integration = apigw.LambdaIntegration(vdb_ingest_lambda)
+        ingest_resource = vdb_resource.add_resource("ingest")
+        ingest_resource.add_method("POST", lambda_integration, authorizer=authorizer)
+        ingest_resource.add_resource("status").add_method("POST", lambda_integration, authorizer=authorizer)
+        ingest_resource.add_resource("retry").add_method("POST", lambda_integration, authorizer=authorizer)
+
     def delete_endpoint(self, basic_lambda_policy, boto3_layer, vdb_resource, vdb_table, permissive_table_statement, authorizer):
         vdb_delete_policy = iam.PolicyDocument(statements=[basic_lambda_policy, permissive_table_statement])
         vdb_delete_role = iam.Role(self, "VdbDeleteRole", assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
@@ -188,8 +276,8 @@ class VdbResources(Construct):
             policy=json.dumps(data_access_policy)
         )
 
-    def add_index_endpoint(self, basic_lambda_policy, boto3_layer, vdb_resource, authorizer):
-        vdb_add_index_policy = iam.PolicyDocument(statements=[basic_lambda_policy])
+    def add_index_endpoint(self, basic_lambda_policy, boto3_layer, vdb_resource, authorizer, collection_statement):
+        vdb_add_index_policy = iam.PolicyDocument(statements=[basic_lambda_policy, collection_statement])
         vdb_add_index_role = iam.Role(self, "VdbAddIndexRole", assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
                                       inline_policies={"vdb_add_index_policy": vdb_add_index_policy})
         vdb_add_index_lambda = lambda_.Function(self, "VdbAddIndexLambda", runtime=lambda_.Runtime.PYTHON_3_11, code=lambda_.Code.from_asset("src/vdb/add_index"), 
@@ -1,6 +1,6 @@
 import json
-import boto3
 import os
+from ll_runtime import history
 
 
 def lambda_handler(event, context):
@@ -9,13 +9,16 @@ def lambda_handler(event, context):
     q = body['q']
     a = body['a']
 
-    table = boto3.resource('dynamodb').Table(os.environ['TABLE_NAME'])
-    response = table.get_item(Key={'id': id})
-    chat = response['Item']['chat']
-    chat.append({'q': q, 'a': a})
-    table.update_item(Key={'id': id}, UpdateExpression='SET chat = :chat', ExpressionAttributeValues={':chat': chat})
+    try:
+        turn = history.append(os.environ['TABLE_NAME'], id, q, a, os.environ.get('LEGACY_TABLE_NAME'))
+    except history.ConversationNotFound:
+        return {
+            'statusCode': 400,
+            'body': json.dumps('Conversation not found')
+        }
+    print(json.dumps({'append': {'id': id, 'turn': turn}}))
     
     return {
         'statusCode': 200,
         'body': json.dumps('History Appended!')
-    }
\ No newline at end of file
+    }
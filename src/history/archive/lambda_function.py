@@ -0,0 +1,47 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from boto3.dynamodb.conditions import Key
+from ll_runtime import clients, history
+
+ARCHIVE_AFTER_DAYS = float(os.environ.get('ARCHIVE_AFTER_DAYS', 30))
+# Leave time to finish the conversations in flight; the next run picks up the rest
+RESERVED_MILLIS = int(os.environ.get('ARCHIVE_RESERVED_MILLIS', 60000))
+
+
+def idle_heads(table_name, shard, cutoff):
+    table = clients.table(table_name)
+    kwargs = {'IndexName': history.IDLE_INDEX,
+              'KeyConditionExpression': Key('idle_shard').eq(shard) & Key('last_active').lt(cutoff)}
+    while True:
+        response = table.query(**kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def lambda_handler(event, context):
+    """Move conversations idle for more than ``days`` (default ARCHIVE_AFTER_DAYS) to S3."""
+    table_name = os.environ['TABLE_NAME']
+    bucket = os.environ['HISTORY_ARCHIVE_BUCKET']
+    cutoff = int(time.time() - float((event or {}).get('days', ARCHIVE_AFTER_DAYS)) * 86400)
+
+    def run(shard):
+        archived = skipped = 0
+        for head in idle_heads(table_name, shard, cutoff):
+            if context and context.get_remaining_time_in_millis() < RESERVED_MILLIS:
+                break
+            if history.archive(table_name, bucket, head['id'], head['last_active']):
+                archived += 1
+            else:
+                skipped += 1
+        return archived, skipped
+
+    with ThreadPoolExecutor(history.HISTORY_IDLE_SHARDS) as executor:
+        results = list(executor.map(run, range(history.HISTORY_IDLE_SHARDS)))
+    result = {'archived': sum(archived for archived, _ in results), 'skipped': sum(skipped for _, skipped in results)}
+    print(json.dumps({'archive': result}))
+
+    return result
@@ -0,0 +1,51 @@
+import json
+import os
+from ll_runtime import bulk_jobs, jobs
+
+
+def not_found(job_id):
+    return {
+        'statusCode': 400,
+        'body': json.dumps(f'Job {job_id} not found')
+    }
+
+
+def lambda_handler(event, context):
+    body = json.loads(event['body'])
+    jobs_table_name = os.environ['JOBS_TABLE_NAME']
+    route = event.get('resource', '/history/import').rstrip('/').rsplit('/', 1)[-1]
+
+    if route == 'status':
+        result = bulk_jobs.status(jobs_table_name, body['job_id'])
+        if result is None:
+            return not_found(body['job_id'])
+        return {
+            'statusCode': 200,
+            'body': json.dumps(result)
+        }
+
+    kinds = bulk_jobs.kinds(os.environ['TABLE_NAME'])
+    queue = jobs.get_queue(jobs_table_name, kinds)
+    try:
+        if route == 'retry':
+            result = jobs.retry(jobs_table_name, queue, body['job_id'])
+            if result is None:
+                return not_found(body['job_id'])
+        elif route == 'export':
+            result = bulk_jobs.start_export(jobs_table_name, queue, kinds, body['s3_dest_bucket'],
+                                            body.get('s3_dest_prefix', ''), body.get('segments'))
+        else:
+            result = bulk_jobs.start_import(jobs_table_name, queue, kinds, body['s3_src_bucket'], body['s3_src_key'],
+                                            body.get('workers'))
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps(str(e))
+        }
+    queue.join()
+    print(json.dumps({route: result}))
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps(result)
+    }
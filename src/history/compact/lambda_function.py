@@ -0,0 +1,32 @@
+import json
+import os
+import traceback
+from boto3.dynamodb.types import TypeDeserializer
+from ll_runtime import compaction, endpoints
+
+deserializer = TypeDeserializer()
+
+
+def lambda_handler(event, context):
+    # Stream records of head items; only the newest image of each conversation matters
+    heads = {}
+    for record in event['Records']:
+        image = record['dynamodb'].get('NewImage')
+        if image:
+            head = {key: deserializer.deserialize(value) for key, value in image.items()}
+            heads[head['id']] = head
+
+    endpoint_name = endpoints.endpoint_name(os.environ['COMPACTION_MODEL'])
+    if heads and not endpoints.in_service(endpoint_name):
+        print(json.dumps({'compact': {'skipped': len(heads), 'reason': 'Compaction model not in service'}}))
+        return
+
+    # Compaction is best effort; a conversation that fails here is tried again on its next append
+    compacted = 0
+    for conversation_id, head in heads.items():
+        try:
+            if compaction.compact(os.environ['TABLE_NAME'], conversation_id, endpoint_name, head):
+                compacted += 1
+        except Exception:
+            traceback.print_exc()
+    print(json.dumps({'compact': {'conversations': len(heads), 'compacted': compacted}}))
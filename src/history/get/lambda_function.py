@@ -1,18 +1,45 @@
 import json
-import boto3
 import os
+from ll_runtime import history
 
 
 def lambda_handler(event, context):
     body = json.loads(event['body'])
     id = body['id']
+    table_name = os.environ['TABLE_NAME']
+    legacy_table_name = os.environ.get('LEGACY_TABLE_NAME')
 
-    table = boto3.resource('dynamodb').Table(os.environ['TABLE_NAME'])
+    try:
+        if body.get('summary'):
+            # The rolling summary stands in for the turns it covers, see ll_runtime.compaction
+            if body.get('before_turn') is not None:
+                raise ValueError('before_turn cannot be combined with summary')
+            summary, chat = history.read_summarized(table_name, id, body.get('last_n'), body.get('max_chars'),
+                                                    body.get('max_tokens'), legacy_table_name)
+            return {
+                'statusCode': 200,
+                'body': json.dumps({'summary': summary, 'turns': chat})
+            }
+        chat, before_turn = history.read(table_name, id, body.get('last_n'), body.get('before_turn'),
+                                         body.get('max_chars'), body.get('max_tokens'), legacy_table_name)
+    except history.ConversationNotFound:
+        return {
+            'statusCode': 400,
+            'body': json.dumps('Conversation not found')
+        }
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps(str(e))
+        }
 
-    response = table.get_item(Key={'id': id})
-    chat = response['Item']['chat']
+    headers = {}
+    # Older turns are left; pass this back as before_turn for the next page
+    if before_turn is not None:
+        headers['X-Before-Turn'] = str(before_turn)
 
     return {
         'statusCode': 200,
+        'headers': headers,
         'body': json.dumps(chat)
-    }
\ No newline at end of file
+    }
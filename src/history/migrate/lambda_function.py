@@ -0,0 +1,38 @@
+import json
+import os
+from ll_runtime import clients, history
+
+# Leave time to report where the scan stopped
+RESERVED_MILLIS = int(os.environ.get('MIGRATE_RESERVED_MILLIS', 30000))
+
+
+def lambda_handler(event, context):
+    """Copy legacy conversations into the turns table.
+
+    Scans one segment of the legacy table; invoke it once per segment and again
+    with the returned ``start_key`` until it comes back as None.
+    """
+    table_name = os.environ['TABLE_NAME']
+    kwargs = {'Segment': int(event.get('segment', 0)), 'TotalSegments': int(event.get('total_segments', 1))}
+    if event.get('start_key'):
+        kwargs['ExclusiveStartKey'] = event['start_key']
+
+    legacy_table = clients.table(os.environ['LEGACY_TABLE_NAME'])
+    migrated = skipped = 0
+    while True:
+        response = legacy_table.scan(**kwargs)
+        for item in response.get('Items', []):
+            if history.migrate_item(table_name, item):
+                migrated += 1
+            else:
+                skipped += 1
+        start_key = response.get('LastEvaluatedKey')
+        kwargs['ExclusiveStartKey'] = start_key
+        if start_key is None or (context and context.get_remaining_time_in_millis() < RESERVED_MILLIS):
+            break
+
+    result = {'segment': kwargs['Segment'], 'total_segments': kwargs['TotalSegments'], 'migrated': migrated,
+              'skipped': skipped, 'start_key': start_key}
+    print(json.dumps({'migrate': result}))
+
+    return result
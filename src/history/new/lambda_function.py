@@ -1,7 +1,6 @@
 import json
 import os
-import boto3
-import uuid
+from ll_runtime import history
 
 
 def lambda_handler(event, context):
@@ -9,15 +8,11 @@ def lambda_handler(event, context):
     q = body['q']
     a = body['a']
 
-    table = boto3.resource('dynamodb').Table(os.environ['TABLE_NAME'])
-    id = str(uuid.uuid4())
-    chat = [{'q': q, 'a': a}]
-    record = {'id': id, 'chat': chat}
-    table.put_item(Item=record)
+    id = history.create(os.environ['TABLE_NAME'], q, a)
 
     return {
         'statusCode': 200,
         'body': json.dumps({
             'id': id
         })
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,6 @@
+"""Shared runtime helpers for the LLManager Lambda handlers.
+
+Shipped in the Boto3Layer so every handler imports it from ``/opt/python``.
+The model create function gets the package alone, without the Boto3Layer's
+pinned dependencies, so it must only need boto3 at import time.
+"""
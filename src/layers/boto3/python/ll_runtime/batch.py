@@ -0,0 +1,98 @@
+"""DynamoDB BatchWriteItem with backoff for unprocessed items.
+
+Puts are grouped into requests of 25 and written by up to ``workers``
+threads. Items DynamoDB leaves unprocessed, typically while a table is
+throttled, are re-sent with jittered exponential backoff.
+
+DynamoDB rejects a request that writes the same key twice. With
+``overwrite_by_pkeys``, a put whose key is already in the pending request
+replaces the earlier one, so the last write wins as it would across requests.
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from ll_runtime import clients
+
+BATCH_WRITE_SIZE = 25
+BATCH_WRITE_WORKERS = int(os.environ.get('BATCH_WRITE_WORKERS', 8))
+BATCH_WRITE_RETRIES = int(os.environ.get('BATCH_WRITE_RETRIES', 8))
+BATCH_WRITE_BACKOFF = float(os.environ.get('BATCH_WRITE_BACKOFF', 0.05))
+
+
+class BatchWriter:
+    def __init__(self, table_name, workers=None, retries=None, overwrite_by_pkeys=None):
+        self.table_name = table_name
+        self.overwrite_by_pkeys = overwrite_by_pkeys
+        self.workers = int(workers or BATCH_WRITE_WORKERS)
+        self.retries = BATCH_WRITE_RETRIES if retries is None else retries
+        self.stats = {'items': 0, 'requests': 0, 'retried': 0}
+        self._executor = ThreadPoolExecutor(self.workers)
+        self._futures = []
+        self._pending = []
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def put(self, item):
+        request = {'PutRequest': {'Item': item}}
+        if self.overwrite_by_pkeys:
+            key = tuple(item[name] for name in self.overwrite_by_pkeys)
+            if key in self._keys:
+                self._pending[self._keys[key]] = request
+                return
+            self._keys[key] = len(self._pending)
+        self._pending.append(request)
+        if len(self._pending) == BATCH_WRITE_SIZE:
+            self._submit()
+
+    def _submit(self):
+        requests, self._pending = self._pending, []
+        self._keys = {}
+        self._futures.append(self._executor.submit(self._write, requests))
+        # Bounds the requests held in memory and surfaces failures early
+        while len(self._futures) >= 4 * self.workers:
+            done, pending = wait(self._futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+            self._futures = list(pending)
+
+    def _write(self, requests):
+        dynamodb = clients.resource('dynamodb')
+        written = len(requests)
+        for attempt in range(self.retries + 1):
+            response = dynamodb.batch_write_item(RequestItems={self.table_name: requests})
+            unprocessed = response.get('UnprocessedItems', {}).get(self.table_name, [])
+            with self._lock:
+                self.stats['requests'] += 1
+                self.stats['retried'] += len(unprocessed)
+            if not unprocessed:
+                with self._lock:
+                    self.stats['items'] += written
+                return
+            requests = unprocessed
+            time.sleep(BATCH_WRITE_BACKOFF * 2 ** attempt * (1 + random.random()))
+        raise RuntimeError(f'{len(requests)} items still unprocessed after {self.retries} retries')
+
+    def flush(self):
+        if self._pending:
+            self._submit()
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._executor.shutdown(cancel_futures=True)
@@ -0,0 +1,50 @@
+"""Chat history import and export jobs, see ``ll_runtime.jobs`` and ``ll_runtime.transfer``.
+
+An import is one task, its object, and an export one task per scan segment.
+"""
+import json
+import os
+
+from ll_runtime import jobs, transfer
+
+# Each segment is a task item and a message, so exports are split less finely than a scan could be
+MAX_EXPORT_SEGMENTS = int(os.environ.get('HISTORY_EXPORT_MAX_SEGMENTS', 1000))
+
+
+def kinds(turns_table_name):
+    """The job kinds of the history bulk Lambdas, reading and writing ``turns_table_name``."""
+    def run_import(params, key):
+        return transfer.import_object(turns_table_name, params['s3_src_bucket'], key, params.get('workers'))
+
+    def run_export(params, segment):
+        return transfer.export_segment(turns_table_name, params['s3_dest_bucket'], params['s3_dest_prefix'],
+                                       int(segment), params['segments'])
+
+    return {
+        'import': jobs.Kind('import', run_import, counters=('lines', 'conversations', 'items', 'requests', 'retried')),
+        'export': jobs.Kind('export', run_export, counters=('items', 'bytes')),
+    }
+
+
+def start_import(table_name, queue, kinds, bucket, key, workers=None):
+    return jobs.start(table_name, queue, kinds['import'], {'s3_src_bucket': bucket, 'workers': workers}, [key])
+
+
+def start_export(table_name, queue, kinds, bucket, prefix, segments=None):
+    segments = transfer.check_segments(segments)
+    if segments > MAX_EXPORT_SEGMENTS:
+        raise ValueError(f'segments must be between 1 and {MAX_EXPORT_SEGMENTS}')
+    params = {'s3_dest_bucket': bucket, 's3_dest_prefix': prefix, 'segments': segments}
+    return jobs.start(table_name, queue, kinds['export'], params, [f'{segment:05}' for segment in range(segments)])
+
+
+def status(table_name, job_id):
+    """``jobs.status`` with the rate of items moved and, for exports, the objects written so far."""
+    result = jobs.status(table_name, job_id)
+    if result is None:
+        return None
+    result['items_per_second'] = round(result['items'] / result['seconds'], 2) if result['seconds'] > 0 else None
+    if result['kind'] == 'export':
+        result['objects'] = [json.loads(item['stats'])['key'] for item in jobs.tasks(
+            table_name, job_id, 'succeeded', ProjectionExpression='#stats', ExpressionAttributeNames={'#stats': 'stats'})]
+    return result
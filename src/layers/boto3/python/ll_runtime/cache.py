@@ -0,0 +1,110 @@
+"""Two-tier response caches: an in-process LRU backed by an optional DynamoDB table.
+
+The DynamoDB tier expects a table keyed on ``id`` with TTL enabled on ``ttl``.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from boto3.dynamodb.types import Binary
+
+from ll_runtime import clients
+
+
+def make_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class DynamoCache:
+    def __init__(self, table_name, ttl_seconds):
+        self.table_name = table_name
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key):
+        item = clients.table(self.table_name).get_item(Key={'id': key}).get('Item')
+        # TTL deletion runs in the background, so expired items can still be returned
+        if not item or int(item.get('ttl', 0)) < time.time():
+            return None
+        value = item['value']
+        return value.value if isinstance(value, Binary) else value
+
+    def put(self, key, value):
+        clients.table(self.table_name).put_item(Item={
+            'id': key,
+            'value': value,
+            'ttl': int(time.time() + self.ttl_seconds),
+        })
+
+
+class TieredCache:
+    def __init__(self, maxsize, table_name=None, ttl_seconds=86400):
+        self.local = LRUCache(maxsize)
+        self.remote = DynamoCache(table_name, ttl_seconds) if table_name else None
+        self.local_hits = 0
+        self.remote_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            self.local_hits += 1
+            return value
+        if self.remote:
+            try:
+                value = self.remote.get(key)
+            except Exception:
+                self.errors += 1
+                value = None
+            if value is not None:
+                self.remote_hits += 1
+                self.local.put(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self.local.put(key, value)
+        if self.remote:
+            try:
+                self.remote.put(key, value)
+            except Exception:
+                self.errors += 1
+
+    def stats(self):
+        return {
+            'hits': self.local_hits + self.remote_hits,
+            'local_hits': self.local_hits,
+            'remote_hits': self.remote_hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'size': len(self.local),
+        }
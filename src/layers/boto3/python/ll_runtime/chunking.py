@@ -0,0 +1,89 @@
+"""Split streamed text into chunks for embedding.
+
+Chunks are built as lines arrive, so memory is bounded by one window:
+
+* ``line``: one chunk per line
+* ``chars``: windows of ``size`` characters across line boundaries
+* ``tokens``: windows of ``size`` whitespace-separated tokens
+
+Consecutive windows share ``overlap`` characters or tokens. Chunks are
+stripped and empty ones are dropped.
+"""
+import hashlib
+import os
+import re
+from collections import deque
+
+CHUNK_BY = ('line', 'chars', 'tokens')
+CHUNK_SIZE = {'chars': int(os.environ.get('CHUNK_SIZE_CHARS', 1000)), 'tokens': int(os.environ.get('CHUNK_SIZE_TOKENS', 200))}
+
+_token = re.compile(r'\S+')
+
+
+def content_hash(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+def chunk(lines, by='line', size=None, overlap=0):
+    """Return an iterator over the chunks of ``lines``; options are checked up front."""
+    if by not in CHUNK_BY:
+        raise ValueError(f'chunk_by must be one of {", ".join(CHUNK_BY)}')
+    if by == 'line':
+        chunks = lines
+    else:
+        size = int(size or CHUNK_SIZE[by])
+        overlap = int(overlap or 0)
+        if size <= 0 or not 0 <= overlap < size:
+            raise ValueError('chunk_size must be positive and chunk_overlap between 0 and chunk_size')
+        chunks = _char_windows(lines, size, overlap) if by == 'chars' else _token_windows(lines, size, overlap)
+    return _non_empty(chunks)
+
+
+def _non_empty(chunks):
+    for text in chunks:
+        text = text.strip()
+        if text:
+            yield text
+
+
+def _char_windows(lines, size, overlap):
+    buffer = ''
+    fresh = 0  # characters in the buffer not yet part of an emitted window
+    for line in lines:
+        buffer += line + '\n'
+        fresh += len(line) + 1
+        while len(buffer) >= size:
+            yield buffer[:size]
+            buffer = buffer[size - overlap:]
+            fresh = len(buffer) - overlap
+    if fresh > 0 and buffer[len(buffer) - fresh:].strip():
+        yield buffer
+
+
+def _token_windows(lines, size, overlap):
+    window = deque()
+    fresh = 0
+    for line in lines:
+        for token in _token.findall(line):
+            window.append(token)
+            fresh += 1
+            if len(window) == size:
+                yield ' '.join(window)
+                for _ in range(size - overlap):
+                    window.popleft()
+                fresh = 0
+    if fresh > 0:
+        yield ' '.join(window)
+
+
+def drop_duplicates(chunks, stats=None):
+    """Yield each distinct chunk once, counting the rest in ``stats['duplicates_dropped']``."""
+    seen = set()
+    for text in chunks:
+        key = content_hash(text)
+        if key in seen:
+            if stats is not None:
+                stats['duplicates_dropped'] = stats.get('duplicates_dropped', 0) + 1
+            continue
+        seen.add(key)
+        yield text
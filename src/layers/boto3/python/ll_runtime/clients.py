@@ -0,0 +1,88 @@
+"""Lazily created, module-scoped AWS clients.
+
+Clients live for the lifetime of the execution environment, so warm
+invocations reuse their connection pools instead of paying for client
+construction, endpoint resolution and a fresh TLS handshake per request.
+"""
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 50))
+MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', 5))
+
+CONFIG = Config(
+    retries={'mode': 'adaptive', 'max_attempts': MAX_ATTEMPTS},
+    max_pool_connections=MAX_POOL_CONNECTIONS,
+    tcp_keepalive=True,
+)
+
+_lock = threading.RLock()
+_session = None
+_clients = {}
+_resources = {}
+_tables = {}
+
+
+def session():
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = boto3.session.Session()
+    return _session
+
+
+def client(service, region_name=None):
+    key = (service, region_name)
+    if key not in _clients:
+        # boto3 sessions are not thread safe, clients are
+        with _lock:
+            if key not in _clients:
+                _clients[key] = session().client(service, region_name=region_name, config=CONFIG)
+    return _clients[key]
+
+
+def resource(service, region_name=None):
+    key = (service, region_name)
+    if key not in _resources:
+        with _lock:
+            if key not in _resources:
+                _resources[key] = session().resource(service, region_name=region_name, config=CONFIG)
+    return _resources[key]
+
+
+def table(name):
+    if name not in _tables:
+        _tables[name] = resource('dynamodb').Table(name)
+    return _tables[name]
+
+
+def conditional(write, *args, **kwargs):
+    """Run a conditional DynamoDB ``write``, returning False instead of raising when its condition fails.
+
+    A transaction counts as failed when any of its conditions does.
+    """
+    try:
+        write(*args, **kwargs)
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        if e.response['Error']['Code'] == 'TransactionCanceledException' and any(
+                reason.get('Code') == 'ConditionalCheckFailed' for reason in e.response.get('CancellationReasons', [])):
+            return False
+        raise
+    return True
+
+
+def reset():
+    """Drop every cached client, e.g. between tests."""
+    global _session
+    with _lock:
+        _session = None
+        _clients.clear()
+        _resources.clear()
+        _tables.clear()
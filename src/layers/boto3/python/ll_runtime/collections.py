@@ -0,0 +1,52 @@
+"""Resolve OpenSearch Serverless collection names to their endpoints.
+
+Lookups are cached across warm invocations for ``COLLECTION_CACHE_TTL``
+seconds, or ``COLLECTION_NEGATIVE_CACHE_TTL`` when the collection is missing
+or not yet active.
+"""
+import os
+import time
+from collections import namedtuple
+
+from ll_runtime import clients
+
+COLLECTION_CACHE_TTL = float(os.environ.get('COLLECTION_CACHE_TTL', 300))
+COLLECTION_NEGATIVE_CACHE_TTL = float(os.environ.get('COLLECTION_NEGATIVE_CACHE_TTL', 15))
+
+Collection = namedtuple('Collection', ['id', 'name', 'endpoint', 'region'])
+
+# collection name -> (Collection or None, expires_at)
+_collections = {}
+
+
+def full_name(name):
+    return 'LLManager-' + name
+
+
+def resolve(name):
+    now = time.monotonic()
+    cached = _collections.get(name)
+    if cached and cached[1] > now:
+        return cached[0]
+
+    opensearch = clients.client('opensearchserverless', region_name=os.environ.get('AWS_REGION'))
+    response = opensearch.batch_get_collection(names=[full_name(name)])
+    active = [c for c in response.get('collectionDetails', []) if c.get('status') == 'ACTIVE']
+    collection = None
+    if active:
+        details = active[0]
+        # arn:aws:aoss:<region>:<account>:collection/<id>
+        region = details['arn'].split(':')[3]
+        collection = Collection(details['id'], details['name'], details['collectionEndpoint'], region)
+
+    ttl = COLLECTION_CACHE_TTL if collection else COLLECTION_NEGATIVE_CACHE_TTL
+    _collections[name] = (collection, now + ttl)
+    return collection
+
+
+def invalidate(name):
+    _collections.pop(name, None)
+
+
+def reset():
+    _collections.clear()
@@ -0,0 +1,78 @@
+"""Rolling summaries that keep long conversations short.
+
+Compaction runs off the append path: the history compact Lambda reads the
+turns table's stream and, once a conversation's unsummarized turns pass
+``COMPACT_AFTER_TURNS`` or ``COMPACT_AFTER_CHARS``, folds all but the newest
+``KEEP_RECENT_TURNS`` of them into the summary item at turn -1:
+
+* ``summary``: the summary text
+* ``through``: the last turn it covers
+* ``chars``: how many of the head's ``chars`` it covers
+"""
+import os
+
+from ll_runtime import clients, endpoints, history
+
+COMPACT_AFTER_TURNS = int(os.environ.get('COMPACT_AFTER_TURNS', 20))
+COMPACT_AFTER_CHARS = int(os.environ.get('COMPACT_AFTER_CHARS', 20000))
+KEEP_RECENT_TURNS = int(os.environ.get('KEEP_RECENT_TURNS', 6))
+SUMMARY_MAX_NEW_TOKENS = int(os.environ.get('SUMMARY_MAX_NEW_TOKENS', 512))
+
+PROMPT = (
+    'Summarize the conversation below so it can stand in for the turns it covers. Keep names, facts, '
+    'decisions and open questions; leave out pleasantries.\n\n{previous}{turns}\n\nSummary:'
+)
+
+
+def due(head, summary):
+    """Whether the turns after ``summary`` (None before the first compaction) may be worth compacting.
+
+    Turn numbers lost to failed appends still count here, so this can
+    overestimate; ``compact`` checks again against the turns it reads.
+    """
+    through = int(summary['through']) if summary else 0
+    chars = int(summary['chars']) if summary else 0
+    pending = int(head['turns']) - through
+    return pending > KEEP_RECENT_TURNS and (pending >= COMPACT_AFTER_TURNS
+                                            or int(head.get('chars', 0)) - chars >= COMPACT_AFTER_CHARS)
+
+
+def prompt(previous, turns):
+    previous = f'Summary so far:\n{previous}\n\n' if previous else ''
+    return PROMPT.format(previous=previous, turns='\n'.join(f'User: {turn["q"]}\nAssistant: {turn["a"]}' for turn in turns))
+
+
+def compact(table_name, conversation_id, endpoint_name, head=None):
+    """Fold older turns into the summary if the conversation is due, returning the new summary item or None."""
+    table = clients.table(table_name)
+    if head is None:
+        head = table.get_item(Key={'id': conversation_id, 'turn': history.HEAD}).get('Item')
+        if head is None:
+            return None
+    summary = table.get_item(Key={'id': conversation_id, 'turn': history.SUMMARY}).get('Item')
+    if not due(head, summary):
+        return None
+
+    through = int(summary['through']) if summary else 0
+    chars = int(summary['chars']) if summary else 0
+    # Turn numbers can skip, so the turns kept as they are are found by reading them
+    recent, cursor = history.read(table_name, conversation_id, last_n=KEEP_RECENT_TURNS, after_turn=through)
+    if cursor is None:
+        return None
+    turns, _ = history.read(table_name, conversation_id, before_turn=cursor, after_turn=through)
+    if len(turns) + len(recent) < COMPACT_AFTER_TURNS and int(head.get('chars', 0)) - chars < COMPACT_AFTER_CHARS:
+        return None
+    response = endpoints.invoke(endpoint_name, {'inputs': prompt(summary and summary['summary'], turns),
+                                                'parameters': {'max_new_tokens': SUMMARY_MAX_NEW_TOKENS}})
+    item = {
+        'id': conversation_id,
+        'turn': history.SUMMARY,
+        'summary': response[0]['generated_text'].strip(),
+        'through': cursor - 1,
+        'chars': chars + sum(len(turn['q']) + len(turn['a']) for turn in turns),
+    }
+    # Two overlapping runs summarize the same turns; only the first one is kept
+    if not clients.conditional(table.put_item, Item=item, ConditionExpression='attribute_not_exists(id) OR through = :through',
+                               ExpressionAttributeValues={':through': through}):
+        return None
+    return item
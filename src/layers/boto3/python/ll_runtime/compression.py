@@ -0,0 +1,37 @@
+"""Compression for payloads stored in DynamoDB.
+
+Records carry their codec name next to the compressed bytes, so the codec can
+change without rewriting old records. ``zlib`` is always available; ``zstd``
+needs the optional ``zstandard`` package.
+"""
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zstd records cannot be read or written without it
+    zstandard = None
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+CODECS = ('zlib', 'zstd')
+
+
+def check(codec):
+    if codec not in CODECS:
+        raise ValueError(f'codec must be one of {", ".join(CODECS)}')
+    if codec == 'zstd' and zstandard is None:
+        raise ValueError('the zstd codec needs the zstandard package')
+
+
+def compress(data, codec):
+    check(codec)
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, ZLIB_LEVEL)
+
+
+def decompress(data, codec):
+    check(codec)
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
@@ -0,0 +1,123 @@
+"""Batched calls to embedding endpoints.
+
+Texts are sent straight to the SageMaker endpoint in batches, with several
+batches in flight at once and per-batch retries with exponential backoff.
+``embed_deduplicated`` additionally embeds repeated texts only once.
+"""
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ll_runtime import endpoints
+from ll_runtime.cache import LRUCache
+from ll_runtime.chunking import content_hash
+
+EMBED_BATCH_SIZE = int(os.environ.get('EMBED_BATCH_SIZE', 32))
+EMBED_MAX_IN_FLIGHT = int(os.environ.get('EMBED_MAX_IN_FLIGHT', 4))
+EMBED_RETRIES = int(os.environ.get('EMBED_RETRIES', 3))
+EMBED_BACKOFF = float(os.environ.get('EMBED_BACKOFF', 0.5))
+EMBED_DEDUP_CACHE_SIZE = int(os.environ.get('EMBED_DEDUP_CACHE_SIZE', 4096))
+
+
+def embed(endpoint_name, texts):
+    if not texts:
+        return []
+    response = endpoints.invoke(endpoint_name, {'text_inputs': texts})
+    # JumpStart text-embedding containers wrap the vectors, TEI returns them bare
+    vectors = response['embedding'] if isinstance(response, dict) else response
+    if len(vectors) != len(texts):
+        raise ValueError(f'Expected {len(texts)} embeddings, got {len(vectors)}')
+    return vectors
+
+
+def embed_with_retry(endpoint_name, texts, retries=EMBED_RETRIES):
+    for attempt in range(retries + 1):
+        try:
+            return embed(endpoint_name, texts)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(EMBED_BACKOFF * 2 ** attempt * (1 + random.random()))
+
+
+def batched(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_batches(endpoint_name, batches, max_in_flight=EMBED_MAX_IN_FLIGHT, retries=EMBED_RETRIES):
+    """Yield ``(batch, vectors)`` in input order, keeping at most ``max_in_flight`` batches pending."""
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor:
+        for batch in batches:
+            if len(pending) >= max_in_flight:
+                done_batch, future = pending.popleft()
+                yield done_batch, future.result()
+            pending.append((batch, executor.submit(embed_with_retry, endpoint_name, batch, retries)))
+        while pending:
+            done_batch, future = pending.popleft()
+            yield done_batch, future.result()
+
+
+def embed_deduplicated(endpoint_name, texts, batch_size=EMBED_BATCH_SIZE, max_in_flight=EMBED_MAX_IN_FLIGHT,
+                       retries=EMBED_RETRIES, cache_size=EMBED_DEDUP_CACHE_SIZE, stats=None):
+    """Like ``embed_batches`` over ``batched(texts)``, but each distinct text is embedded once.
+
+    Vectors of recent texts are kept, by content hash, in an LRU of
+    ``cache_size`` float32 arrays. Repeats found there, or earlier in the same
+    batch, are not sent to the endpoint. ``stats`` counts ``embedded`` and
+    ``reused`` texts.
+    """
+    stats = {} if stats is None else stats
+    stats.setdefault('embedded', 0)
+    stats.setdefault('reused', 0)
+    cache = LRUCache(cache_size)
+    plans = deque()
+    in_flight = set()
+
+    def pending_batches():
+        for batch in batched(texts, batch_size):
+            keys = [content_hash(text) for text in batch]
+            todo = {}
+            for key, text in zip(keys, batch):
+                # Texts already sent by an earlier pending batch are cached by the time this one resolves
+                if key not in todo and key not in in_flight and cache.get(key) is None:
+                    todo[key] = text
+            in_flight.update(todo)
+            plans.append((batch, keys, list(todo)))
+            yield list(todo.values())
+
+    for todo, fresh in embed_batches(endpoint_name, pending_batches(), max_in_flight, retries):
+        batch, keys, todo_keys = plans.popleft()
+        fresh = dict(zip(todo_keys, fresh))
+        for key, vector in fresh.items():
+            cache.put(key, np.asarray(vector, dtype='<f4'))
+        in_flight.difference_update(todo_keys)
+        batch_vectors = []
+        sent = set()
+        for key, text in zip(keys, batch):
+            if key in fresh:
+                batch_vectors.append(fresh[key])
+                stats['reused' if key in sent else 'embedded'] += 1
+                sent.add(key)
+                continue
+            vector = cache.get(key)
+            if vector is None:
+                # Evicted while its batch was in flight
+                vector = np.asarray(embed_with_retry(endpoint_name, [text], retries)[0], dtype='<f4')
+                cache.put(key, vector)
+                stats['embedded'] += 1
+            else:
+                stats['reused'] += 1
+            batch_vectors.append(vector.tolist())
+        yield batch, batch_vectors
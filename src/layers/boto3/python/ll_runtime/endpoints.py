@@ -0,0 +1,81 @@
+"""SageMaker endpoint invocation with a warm-invocation endpoint-state cache.
+
+Endpoint state is resolved with ``describe_endpoint`` on a cache miss and kept
+for ``ENDPOINT_CACHE_TTL`` seconds (``ENDPOINT_NEGATIVE_CACHE_TTL`` when the
+endpoint is missing or not in service). A not-found or validation error from
+an invocation drops the cached entry.
+"""
+import json
+import os
+import time
+
+from botocore.exceptions import ClientError
+
+from ll_runtime import clients
+
+ENDPOINT_CACHE_TTL = float(os.environ.get('ENDPOINT_CACHE_TTL', 300))
+ENDPOINT_NEGATIVE_CACHE_TTL = float(os.environ.get('ENDPOINT_NEGATIVE_CACHE_TTL', 15))
+INVALIDATING_ERRORS = ('ValidationError', 'ValidationException', 'ResourceNotFound')
+
+# endpoint name -> (in_service, expires_at)
+_endpoint_state = {}
+
+
+def endpoint_name(name):
+    return f'LLManager-{name}-endpoint'
+
+
+def in_service(endpoint_name):
+    now = time.monotonic()
+    cached = _endpoint_state.get(endpoint_name)
+    if cached and cached[1] > now:
+        return cached[0]
+
+    try:
+        response = clients.client('sagemaker').describe_endpoint(EndpointName=endpoint_name)
+        active = response['EndpointStatus'] == 'InService'
+    except ClientError as e:
+        if e.response['Error']['Code'] not in INVALIDATING_ERRORS:
+            raise
+        active = False
+
+    ttl = ENDPOINT_CACHE_TTL if active else ENDPOINT_NEGATIVE_CACHE_TTL
+    _endpoint_state[endpoint_name] = (active, now + ttl)
+    return active
+
+
+def invalidate(endpoint_name):
+    _endpoint_state.pop(endpoint_name, None)
+
+
+def invoke(endpoint_name, payload):
+    try:
+        response = clients.client('sagemaker-runtime').invoke_endpoint(
+            EndpointName=endpoint_name,
+            ContentType='application/json',
+            Accept='application/json',
+            Body=json.dumps(payload)
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] in INVALIDATING_ERRORS:
+            invalidate(endpoint_name)
+        raise
+    return json.loads(response['Body'].read())
+
+
+def invoke_stream(endpoint_name, payload):
+    try:
+        response = clients.client('sagemaker-runtime').invoke_endpoint_with_response_stream(
+            EndpointName=endpoint_name,
+            ContentType='application/json',
+            Body=json.dumps(payload)
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] in INVALIDATING_ERRORS:
+            invalidate(endpoint_name)
+        raise
+    return response['Body']
+
+
+def reset():
+    _endpoint_state.clear()
@@ -0,0 +1,342 @@
+"""Chat history stored as one item per turn.
+
+The turns table is keyed on the conversation ``id`` and a numeric ``turn``:
+
+* turn 0 is the conversation's head item; its ``turns`` counter hands out
+  turn numbers, so appends never read the conversation, and ``chars``
+  counts the characters appended so far. A number whose turn could not be
+  written stays unused and is counted in ``gaps``, so turn numbers can skip
+  and ``turns - gaps`` turns are stored
+* turns 1..n hold one ``q`` and ``a`` each; turns of ``HISTORY_COMPRESS_MIN_BYTES``
+  or more are stored instead as ``p``, the compressed JSON of both, with
+  its codec in ``c``
+* turn -1 holds the conversation's rolling summary, see ``ll_runtime.compaction``
+
+Heads carry ``last_active`` and an ``idle_shard``, the keys of the sparse
+``IDLE_INDEX`` the history archive Lambda reads to move idle conversations to
+gzipped JSON lines in ``HISTORY_ARCHIVE_BUCKET``, deleting their turns. Only
+heads get ``expires_at``, ``HISTORY_TTL_DAYS`` after the last append, for
+DynamoDB TTL; it is a backstop well beyond the archive window, and turns never
+expire on their own, so a conversation that stays active keeps all of them.
+
+Conversations still in the legacy table (one item per conversation with a
+``chat`` list) are copied over the first time they are touched, or in bulk
+by the history migrate Lambda. Archived ones are rehydrated the same way.
+"""
+import gzip
+import json
+import os
+import time
+import uuid
+import zlib
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import Binary
+from botocore.exceptions import ClientError
+
+from ll_runtime import clients, compression
+
+HEAD = 0
+SUMMARY = -1
+IDLE_INDEX = 'idle-index'
+APPEND_ATTEMPTS = int(os.environ.get('HISTORY_APPEND_ATTEMPTS', 5))
+HISTORY_PAGE_SIZE = int(os.environ.get('HISTORY_PAGE_SIZE', 100))
+HISTORY_CODEC = os.environ.get('HISTORY_CODEC', 'zlib')
+# Below this, compression saves less than the codec marker and JSON framing cost
+HISTORY_COMPRESS_MIN_BYTES = int(os.environ.get('HISTORY_COMPRESS_MIN_BYTES', 200))
+HISTORY_TTL_DAYS = float(os.environ.get('HISTORY_TTL_DAYS', 365))
+HISTORY_IDLE_SHARDS = int(os.environ.get('HISTORY_IDLE_SHARDS', 8))
+HISTORY_ARCHIVE_BUCKET = os.environ.get('HISTORY_ARCHIVE_BUCKET')
+HISTORY_ARCHIVE_PREFIX = os.environ.get('HISTORY_ARCHIVE_PREFIX', 'history/')
+# DynamoDB's limit on the items of one transaction
+TRANSACT_WRITE_SIZE = 100
+
+
+class ConversationNotFound(Exception):
+    pass
+
+
+def encode(q, a):
+    """The stored attributes of a turn."""
+    if HISTORY_CODEC and len(q.encode('utf-8')) + len(a.encode('utf-8')) >= HISTORY_COMPRESS_MIN_BYTES:
+        payload = json.dumps({'q': q, 'a': a}, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return {'p': compression.compress(payload, HISTORY_CODEC), 'c': HISTORY_CODEC}
+    return {'q': q, 'a': a}
+
+
+def decode(item):
+    """A stored turn as ``{'q', 'a'}``, compressed or not."""
+    if 'p' not in item:
+        return {'q': item['q'], 'a': item['a']}
+    data = item['p'].value if isinstance(item['p'], Binary) else item['p']
+    turn = json.loads(compression.decompress(bytes(data), item['c']))
+    return {'q': turn['q'], 'a': turn['a']}
+
+
+def expires_at(now=None):
+    return int((now or time.time()) + HISTORY_TTL_DAYS * 86400)
+
+
+def idle_shard(conversation_id):
+    return zlib.crc32(conversation_id.encode('utf-8')) % HISTORY_IDLE_SHARDS
+
+
+def head_item(conversation_id, turns, chars, gaps=0):
+    now = time.time()
+    item = {'id': conversation_id, 'turn': HEAD, 'turns': turns, 'chars': chars, 'last_active': int(now),
+            'idle_shard': idle_shard(conversation_id), 'expires_at': expires_at(now)}
+    if gaps:
+        item['gaps'] = gaps
+    return item
+
+
+def create(table_name, q, a):
+    conversation_id = str(uuid.uuid4())
+    with clients.table(table_name).batch_writer() as batch:
+        batch.put_item(Item=head_item(conversation_id, 1, len(q) + len(a)))
+        batch.put_item(Item={'id': conversation_id, 'turn': 1, **encode(q, a)})
+    return conversation_id
+
+
+def _next_turn(table, conversation_id, chars):
+    now = time.time()
+    response = table.update_item(Key={'id': conversation_id, 'turn': HEAD},
+                                 UpdateExpression='ADD turns :one, chars :chars SET last_active = :now, expires_at = :expires, '
+                                                  'idle_shard = :shard',
+                                 ConditionExpression='attribute_exists(id)',
+                                 ExpressionAttributeValues={':one': 1, ':chars': chars, ':now': int(now),
+                                                            ':expires': expires_at(now), ':shard': idle_shard(conversation_id)},
+                                 ReturnValues='UPDATED_NEW')
+    return int(response['Attributes']['turns'])
+
+
+def _skip_turn(table, conversation_id, chars):
+    # The turn number stays used; its characters were never stored
+    clients.conditional(table.update_item, Key={'id': conversation_id, 'turn': HEAD},
+                        UpdateExpression='ADD gaps :one, chars :chars', ConditionExpression='attribute_exists(id)',
+                        ExpressionAttributeValues={':one': 1, ':chars': -chars})
+
+
+def append(table_name, conversation_id, q, a, legacy_table_name=None):
+    """Append one turn and return its number.
+
+    Each attempt is an atomic increment of the head's counter followed by a put
+    of the new turn that only succeeds if the turn is still free, so concurrent
+    appends get distinct turns and never overwrite each other. An attempt whose
+    put fails records the turn number as a gap.
+    """
+    table = clients.table(table_name)
+    item = encode(q, a)
+    chars = len(q) + len(a)
+    for _ in range(APPEND_ATTEMPTS):
+        try:
+            turn = _next_turn(table, conversation_id, chars)
+        except table.meta.client.exceptions.ConditionalCheckFailedException:
+            if not restore(table_name, conversation_id, legacy_table_name):
+                raise ConversationNotFound(conversation_id)
+            continue
+        try:
+            stored = clients.conditional(table.put_item, Item={'id': conversation_id, 'turn': turn, **item},
+                                         ConditionExpression='attribute_not_exists(turn)')
+        except Exception:
+            _skip_turn(table, conversation_id, chars)
+            raise
+        if stored:
+            return turn
+        _skip_turn(table, conversation_id, chars)
+    raise RuntimeError(f'Could not append to {conversation_id} after {APPEND_ATTEMPTS} attempts')
+
+
+def _newest_first(table, kwargs, page_size):
+    kwargs = dict(kwargs, ScanIndexForward=False, Limit=page_size)
+    while True:
+        response = table.query(**kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _cost(item, max_chars, max_tokens):
+    return (len(item['q']) + len(item['a']) if max_chars else 0,
+            len(item['q'].split()) + len(item['a'].split()) if max_tokens else 0)
+
+
+def check_limits(**limits):
+    for name, value in limits.items():
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value <= 0):
+            raise ValueError(f'{name} must be a positive integer')
+
+
+def read(table_name, conversation_id, last_n=None, before_turn=None, max_chars=None, max_tokens=None,
+         legacy_table_name=None, after_turn=HEAD):
+    """Return ``(chat, cursor)``: the newest turns between ``after_turn`` and ``before_turn``, oldest first.
+
+    ``last_n`` caps the number of turns and ``max_chars``/``max_tokens`` keep the
+    newest turns whose questions and answers fit the budget. ``cursor`` is the
+    ``before_turn`` of the next older page, or None once there is nothing older;
+    when even the newest turn is over budget, the chat is empty and the cursor
+    skips that turn.
+    """
+    check_limits(last_n=last_n, before_turn=before_turn, max_chars=max_chars, max_tokens=max_tokens)
+
+    if before_turn is not None and before_turn <= after_turn + 1:
+        return [], None
+
+    table = clients.table(table_name)
+    turns = Key('turn').between(after_turn + 1, before_turn - 1) if before_turn else Key('turn').gt(after_turn)
+    kwargs = {'KeyConditionExpression': Key('id').eq(conversation_id) & turns, 'ProjectionExpression': 'turn, q, a, p, c'}
+    # One more than asked for tells whether an older page exists
+    page_size = last_n + 1 if last_n and not (max_chars or max_tokens) else HISTORY_PAGE_SIZE
+
+    chat, chars, tokens, found, cursor = [], 0, 0, False, None
+    for item in _newest_first(table, kwargs, page_size):
+        found = True
+        item = dict(decode(item), turn=item['turn'])
+        item_chars, item_tokens = _cost(item, max_chars, max_tokens)
+        if ((last_n and len(chat) == last_n) or (max_chars and chars + item_chars > max_chars)
+                or (max_tokens and tokens + item_tokens > max_tokens)):
+            cursor = int(chat[-1]['turn'] if chat else item['turn'])
+            break
+        chars, tokens = chars + item_chars, tokens + item_tokens
+        chat.append(item)
+
+    if not found and before_turn is None and after_turn == HEAD:
+        if restore(table_name, conversation_id, legacy_table_name):
+            return read(table_name, conversation_id, last_n, before_turn, max_chars, max_tokens)
+        raise ConversationNotFound(conversation_id)
+    return [{'q': item['q'], 'a': item['a']} for item in reversed(chat)], cursor
+
+
+def read_summarized(table_name, conversation_id, last_n=None, max_chars=None, max_tokens=None, legacy_table_name=None):
+    """Return ``(summary, chat)``: the rolling summary, if any, and the turns it does not cover.
+
+    The summary counts towards ``max_chars``/``max_tokens``; ``last_n`` only limits the turns.
+    """
+    check_limits(last_n=last_n, max_chars=max_chars, max_tokens=max_tokens)
+    item = clients.table(table_name).get_item(Key={'id': conversation_id, 'turn': SUMMARY},
+                                              ProjectionExpression='summary, through').get('Item')
+    if item is None:
+        return None, read(table_name, conversation_id, last_n, None, max_chars, max_tokens, legacy_table_name)[0]
+    summary = item['summary']
+    if max_chars:
+        max_chars -= len(summary)
+    if max_tokens:
+        max_tokens -= len(summary.split())
+    if (max_chars is not None and max_chars <= 0) or (max_tokens is not None and max_tokens <= 0):
+        return summary, []
+    return summary, read(table_name, conversation_id, last_n, None, max_chars, max_tokens, after_turn=int(item['through']))[0]
+
+
+def turns(table_name, conversation_id, legacy_table_name=None):
+    """Return every turn of the conversation in order as ``{'q', 'a'}`` dicts."""
+    return read(table_name, conversation_id, legacy_table_name=legacy_table_name)[0]
+
+
+def migrate_item(table_name, item):
+    """Copy one legacy ``{'id', 'chat'}`` item into the turns table.
+
+    Returns False if the conversation already has a head item. Turns are written
+    before the head, so a copy interrupted half way is simply redone.
+    """
+    table = clients.table(table_name)
+    if 'Item' in table.get_item(Key={'id': item['id'], 'turn': HEAD}, ProjectionExpression='id'):
+        return False
+    chat = item.get('chat', [])
+    with table.batch_writer() as batch:
+        for turn, entry in enumerate(chat, start=1):
+            batch.put_item(Item={'id': item['id'], 'turn': turn, **encode(entry['q'], entry['a'])})
+    head = head_item(item['id'], len(chat), sum(len(entry['q']) + len(entry['a']) for entry in chat))
+    return clients.conditional(table.put_item, Item=head, ConditionExpression='attribute_not_exists(id)')
+
+
+def migrate(table_name, legacy_table_name, conversation_id):
+    """Copy a conversation from the legacy table, returning True if it is now in the turns table."""
+    item = clients.table(legacy_table_name).get_item(Key={'id': conversation_id}, ConsistentRead=True).get('Item')
+    if item is None:
+        return False
+    migrate_item(table_name, item)
+    return True
+
+
+def restore(table_name, conversation_id, legacy_table_name=None):
+    """Bring a conversation missing from the turns table back from the legacy table or the archive."""
+    return bool((legacy_table_name and migrate(table_name, legacy_table_name, conversation_id))
+                or (HISTORY_ARCHIVE_BUCKET and rehydrate(table_name, HISTORY_ARCHIVE_BUCKET, conversation_id)))
+
+
+def archive_key(conversation_id):
+    return f'{HISTORY_ARCHIVE_PREFIX}{conversation_id}.jsonl.gz'
+
+
+def record(item):
+    """An archived or exported line: the item without its key, storage and TTL attributes."""
+    line = {'turn': int(item['turn'])}
+    if item['turn'] > HEAD:
+        line.update(decode(item))
+    else:
+        line.update({key: int(value) if isinstance(value, Decimal) else value for key, value in item.items()
+                     if key not in ('id', 'turn', 'expires_at', 'last_active', 'idle_shard')})
+    return line
+
+
+def archive(table_name, bucket, conversation_id, last_active):
+    """Move a conversation to ``s3://bucket/archive_key(id)``.
+
+    The turns are deleted in transactions that check the head's ``last_active``
+    is unchanged, and the head last, so a conversation that was appended to in
+    the meantime stays put, with any turns already deleted written back;
+    returns whether it moved.
+    """
+    table = clients.table(table_name)
+    items, kwargs = [], {'KeyConditionExpression': Key('id').eq(conversation_id)}
+    while True:
+        response = table.query(**kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    lines = '\n'.join(json.dumps(record(item), ensure_ascii=False) for item in items)
+    clients.client('s3').put_object(Bucket=bucket, Key=archive_key(conversation_id), Body=gzip.compress(lines.encode('utf-8')),
+                                    ContentType='application/x-ndjson', ContentEncoding='gzip')
+
+    turns = [item for item in items if item['turn'] != HEAD]
+    size = TRANSACT_WRITE_SIZE - 1
+    chunks = [turns[start:start + size] for start in range(0, len(turns), size)] or [[]]
+    unchanged = {'TableName': table_name, 'Key': {'id': conversation_id, 'turn': HEAD},
+                 'ConditionExpression': 'last_active = :seen', 'ExpressionAttributeValues': {':seen': last_active}}
+    for n, chunk in enumerate(chunks):
+        actions = [{'Delete' if n == len(chunks) - 1 else 'ConditionCheck': unchanged}]
+        actions += [{'Delete': {'TableName': table_name, 'Key': {'id': conversation_id, 'turn': item['turn']}}} for item in chunk]
+        if not clients.conditional(table.meta.client.transact_write_items, TransactItems=actions):
+            for item in turns[:n * size]:
+                clients.conditional(table.put_item, Item=item, ConditionExpression='attribute_not_exists(turn)')
+            return False
+    return True
+
+
+def rehydrate(table_name, bucket, conversation_id):
+    """Copy an archived conversation back into the turns table, returning False if there is no archive."""
+    try:
+        body = clients.client('s3').get_object(Bucket=bucket, Key=archive_key(conversation_id))['Body'].read()
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return False
+        raise
+    lines = [json.loads(line) for line in gzip.decompress(body).decode('utf-8').splitlines() if line]
+    table = clients.table(table_name)
+    head = None
+    # Like migrate_item: the head goes last, so an interrupted copy is simply redone
+    with table.batch_writer() as batch:
+        for line in lines:
+            if line['turn'] == HEAD:
+                head = line
+            elif line['turn'] == SUMMARY:
+                batch.put_item(Item={**line, 'id': conversation_id})
+            else:
+                batch.put_item(Item={'id': conversation_id, 'turn': line['turn'], **encode(line['q'], line['a'])})
+    if head is not None:
+        clients.conditional(table.put_item, Item=head_item(conversation_id, head['turns'], head.get('chars', 0), head.get('gaps', 0)),
+                            ConditionExpression='attribute_not_exists(id)')
+    return True
@@ -0,0 +1,35 @@
+"""Prefix-wide ingestion jobs, see ``ll_runtime.jobs``.
+
+Each object under the prefix is a task, found by the workers a page of the
+listing at a time, on which they run the /vdb/embed pipeline.
+"""
+import os
+
+from ll_runtime import clients, jobs, pipeline
+
+LIST_PAGE_SIZE = int(os.environ.get('INGEST_LIST_PAGE_SIZE', 1000))
+
+
+def list_objects(params, token):
+    kwargs = {'Bucket': params['src_bucket'], 'Prefix': params['prefix'], 'MaxKeys': LIST_PAGE_SIZE}
+    if token:
+        kwargs['ContinuationToken'] = token
+    response = clients.client('s3').list_objects_v2(**kwargs)
+    keys = [item['Key'] for item in response.get('Contents', []) if not item['Key'].endswith('/')]
+    return keys, response.get('NextContinuationToken') if response.get('IsTruncated') else None
+
+
+def kinds(manifest_table_name=None):
+    """The job kinds of the ingest Lambdas; chunk manifests are kept in ``manifest_table_name``, the vdb lifecycle table."""
+    def run(params, key):
+        return pipeline.embed_object(params['endpoint_name'], params['src_bucket'], key, params['dest_bucket'],
+                                     params['dest_prefix'] + key[len(params['prefix']):], params['options'],
+                                     manifest_table_name)
+    return {'ingest': jobs.Kind('ingest', run, counters=('lines',), list_tasks=list_objects)}
+
+
+def start(table_name, queue, kinds, src_bucket, prefix, dest_bucket, dest_prefix, endpoint_name, options=None):
+    """Record the job and queue the listing of its first page."""
+    params = {'src_bucket': src_bucket, 'prefix': prefix, 'dest_bucket': dest_bucket, 'dest_prefix': dest_prefix,
+              'endpoint_name': endpoint_name, 'options': options or {}}
+    return jobs.start(table_name, queue, kinds['ingest'], params)
@@ -0,0 +1,297 @@
+"""Jobs split into tasks that queue workers run, with their progress in DynamoDB.
+
+``start`` only records the job and queues its tasks, or for jobs whose tasks
+are found by listing, a list message, so the API answers at once. Workers list
+a page per message, each page queueing the next, record one item per task and
+queue the tasks, which they run with the job's ``Kind``. The jobs table is
+keyed on ``job_id`` and a ``task`` string, so a job's items are read with one
+query and need no index:
+
+* task ``job``: ``kind``, ``params`` (JSON), ``total``, ``succeeded``,
+  ``failed``, ``listed``, ``pages`` (the pages counted so far), ``list_error``
+  if listing was abandoned, the kind's ``counters``, each summed over the tasks
+  that succeeded, and the ``started_at``/``updated_at`` epoch seconds
+* task ``task#<name>``: ``name``, ``status`` (queued, running, succeeded or
+  failed), ``attempts`` and either the run's ``stats`` (JSON) or its ``error``
+
+Job counters only change through atomic ``ADD`` updates, so workers never
+read-modify-write the job item, and redelivered messages never redo finished
+tasks. The vdb ingest and history bulk Lambdas run their jobs through here, see
+``ll_runtime.ingest`` and ``ll_runtime.bulk_jobs``.
+"""
+import json
+import time
+import traceback
+import uuid
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import Attr, Key
+
+from ll_runtime import clients, queues
+
+JOB = 'job'
+MAX_REPORTED_FAILURES = 20
+DEAD_LETTER_ERROR = 'Moved to the dead-letter queue after repeated failed deliveries'
+
+_names = {'#status': 'status'}
+
+
+class Kind:
+    """A kind of job.
+
+    ``run(params, name)`` runs one task and returns its stats; ``counters``
+    name the stats summed on the job. Jobs whose tasks are not known up front
+    take ``list_tasks(params, token)``, which returns a page of task names and
+    the token of the next page, or None after the last one.
+    """
+
+    def __init__(self, name, run, counters=(), list_tasks=None):
+        self.name = name
+        self.run = run
+        self.counters = counters
+        self.list_tasks = list_tasks
+
+
+def job_key(job_id):
+    return {'job_id': job_id, 'task': JOB}
+
+
+def task_key(job_id, name):
+    return {'job_id': job_id, 'task': f'task#{name}'}
+
+
+def _now():
+    return Decimal(str(round(time.time(), 3)))
+
+
+def tasks(table_name, job_id, status=None, **kwargs):
+    """The job's task items, optionally only those with ``status``."""
+    table = clients.table(table_name)
+    kwargs['KeyConditionExpression'] = Key('job_id').eq(job_id) & Key('task').begins_with('task#')
+    if status:
+        kwargs['FilterExpression'] = Attr('status').eq(status)
+    while True:
+        response = table.query(**kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _queued(job_id, name):
+    return {**task_key(job_id, name), 'name': name, 'status': 'queued', 'attempts': 0}
+
+
+def _message(job_id, kind, params, name):
+    return {'job_id': job_id, 'kind': kind, 'task': name, 'params': params}
+
+
+def start(table_name, queue, kind, params, names=None):
+    """Record a job of ``kind`` and queue its tasks, or without ``names`` the listing of its first page."""
+    table = clients.table(table_name)
+    job_id = uuid.uuid4().hex
+    now = _now()
+    listed = names is not None
+    with table.batch_writer() as batch:
+        batch.put_item(Item={**job_key(job_id), 'kind': kind.name, 'params': json.dumps(params),
+                             'total': len(names) if listed else 0, 'succeeded': 0, 'failed': 0, 'listed': listed,
+                             'pages': 0, 'counters': list(kind.counters), **{counter: 0 for counter in kind.counters},
+                             'started_at': now, 'updated_at': now})
+        for name in names or ():
+            batch.put_item(Item=_queued(job_id, name))
+    if listed:
+        queue.send([_message(job_id, kind.name, params, name) for name in names])
+    else:
+        queue.send([{'job_id': job_id, 'kind': kind.name, 'page': 0, 'token': None, 'params': params}])
+    return {'job_id': job_id, 'status': 'running' if listed else 'listing'}
+
+
+def list_page(table_name, queue, kind, message):
+    """List one page of the job's tasks, queue them and then the next page."""
+    table = clients.table(table_name)
+    job_id, page, params = message['job_id'], message['page'], message['params']
+    names, token = kind.list_tasks(params, message['token'])
+
+    # Counted before queueing so a job never reports more tasks done than listed. A
+    # redelivered page is not counted twice and must not reset tasks that already ran
+    counted = clients.conditional(table.update_item, Key=job_key(job_id),
+                                  UpdateExpression='SET pages = :next ADD #total :n', ConditionExpression='pages = :page',
+                                  ExpressionAttributeNames={'#total': 'total'},
+                                  ExpressionAttributeValues={':next': page + 1, ':n': len(names), ':page': page})
+    if counted:
+        with table.batch_writer() as batch:
+            for name in names:
+                batch.put_item(Item=_queued(job_id, name))
+    else:
+        for name in names:
+            clients.conditional(table.put_item, Item=_queued(job_id, name), ConditionExpression='attribute_not_exists(job_id)')
+    queue.send([_message(job_id, kind.name, params, name) for name in names])
+
+    if token:
+        queue.send([{'job_id': job_id, 'kind': kind.name, 'page': page + 1, 'token': token, 'params': params}])
+    else:
+        table.update_item(Key=job_key(job_id), UpdateExpression='SET listed = :listed',
+                          ExpressionAttributeValues={':listed': True})
+    return len(names)
+
+
+def _finished(table, job_id, kind, status, stats=None):
+    counters = kind.counters if stats else ()
+    update = ', '.join([f'{status} :one'] + [f'#{counter} :{counter}' for counter in counters])
+    kwargs = {'ExpressionAttributeNames': {f'#{counter}': counter for counter in counters}} if counters else {}
+    table.update_item(Key=job_key(job_id), UpdateExpression=f'ADD {update} SET updated_at = :now',
+                      ExpressionAttributeValues=dict({f':{counter}': stats[counter] for counter in counters},
+                                                     **{':one': 1, ':now': _now()}), **kwargs)
+
+
+def process(table_name, kind, message):
+    """Run one queued task, returning its final status or None if it had already finished."""
+    table = clients.table(table_name)
+    job_id, name = message['job_id'], message['task']
+    # Redelivered messages must not redo finished work, failed tasks only run again
+    # through retry; a run token makes sure only the latest of two overlapping
+    # deliveries counts towards the job
+    run_id = uuid.uuid4().hex
+    claimed = clients.conditional(table.update_item, Key=task_key(job_id, name),
+                                  UpdateExpression='SET #status = :running, run_id = :run_id ADD attempts :one',
+                                  ConditionExpression='#status IN (:queued, :running)',
+                                  ExpressionAttributeNames=_names,
+                                  ExpressionAttributeValues={':running': 'running', ':run_id': run_id, ':one': 1,
+                                                             ':queued': 'queued'})
+    if not claimed:
+        return None
+
+    stats = None
+    try:
+        stats = kind.run(message['params'], name)
+    except Exception as e:  # recorded on the task so it can be retried
+        status = 'failed'
+        update = 'SET #status = :status, #error = :error'
+        names, values = {'#error': 'error'}, {':error': f'{type(e).__name__}: {e}'[:1000]}
+    else:
+        status = 'succeeded'
+        update = 'SET #status = :status, #stats = :stats REMOVE #error'
+        names, values = {'#stats': 'stats', '#error': 'error'}, {':stats': json.dumps(stats)}
+
+    finished = clients.conditional(table.update_item, Key=task_key(job_id, name), UpdateExpression=update,
+                                   ConditionExpression='run_id = :run_id', ExpressionAttributeNames=dict(_names, **names),
+                                   ExpressionAttributeValues=dict(values, **{':status': status, ':run_id': run_id}))
+    if finished:
+        _finished(table, job_id, kind, status, stats)
+    return status
+
+
+def handle(table_name, queue, kinds, message):
+    """Run a queued message of one of ``kinds`` (a dict by name): a page to list or a task."""
+    kind = kinds[message['kind']]
+    if 'page' in message:
+        return list_page(table_name, queue, kind, message)
+    return process(table_name, kind, message)
+
+
+def get_queue(table_name, kinds):
+    """The queue of ``QUEUE_URL``, or without one a local queue that runs jobs in this invocation."""
+    queue = queues.get_queue(lambda message: handle(table_name, queue, kinds, message))
+    return queue
+
+
+def abandon(table_name, kinds, message, error):
+    """Record a message that exhausted its deliveries, so the job can still finish."""
+    table = clients.table(table_name)
+    job_id = message['job_id']
+    if 'page' in message:
+        table.update_item(Key=job_key(job_id), UpdateExpression='SET listed = :listed, list_error = :error',
+                          ExpressionAttributeValues={':listed': True, ':error': error[:1000]})
+        return
+    failed = clients.conditional(table.update_item, Key=task_key(job_id, message['task']),
+                                 UpdateExpression='SET #status = :failed, #error = :error',
+                                 ConditionExpression='#status IN (:queued, :running)',
+                                 ExpressionAttributeNames=dict(_names, **{'#error': 'error'}),
+                                 ExpressionAttributeValues={':failed': 'failed', ':error': error[:1000],
+                                                            ':queued': 'queued', ':running': 'running'})
+    if failed:
+        _finished(table, job_id, kinds[message['kind']], 'failed')
+
+
+def work(table_name, queue, kinds, records, dead_letter_queue=None):
+    """Run the SQS ``records`` of a worker Lambda, returning its partial batch response.
+
+    Failures of a task itself are recorded by ``process``; anything else (e.g.
+    DynamoDB errors) hands the message back to SQS for redelivery, and messages
+    that keep failing reach ``dead_letter_queue``, whose records are abandoned.
+    """
+    failures = []
+    for record in records:
+        try:
+            message = json.loads(record['body'])
+            if dead_letter_queue and record.get('eventSourceARN') == dead_letter_queue:
+                abandon(table_name, kinds, message, DEAD_LETTER_ERROR)
+                status = 'abandoned'
+            else:
+                status = handle(table_name, queue, kinds, message)
+            print(json.dumps({'job_worker': {'message': record['messageId'], 'kind': message['kind'], 'status': status}}))
+        except Exception:
+            traceback.print_exc()
+            failures.append({'itemIdentifier': record['messageId']})
+    return {'batchItemFailures': failures}
+
+
+def status(table_name, job_id):
+    table = clients.table(table_name)
+    job = table.get_item(Key=job_key(job_id)).get('Item')
+    if job is None:
+        return None
+    total, succeeded, failed = int(job['total']), int(job['succeeded']), int(job['failed'])
+    done = succeeded + failed
+    elapsed = float(job['updated_at'] - job['started_at'])
+    if not job['listed']:
+        state = 'listing'
+    elif done < total:
+        state = 'running'
+    else:
+        state = 'failed' if failed or 'list_error' in job else 'succeeded'
+
+    failures = []
+    if 'list_error' in job:
+        failures.append({'task': None, 'error': job['list_error']})
+    if failed:
+        for item in tasks(table_name, job_id, 'failed', ProjectionExpression='#name, #error',
+                          ExpressionAttributeNames={'#name': 'name', '#error': 'error'}):
+            failures.append({'task': item['name'], 'error': item.get('error')})
+            if len(failures) == MAX_REPORTED_FAILURES:
+                break
+    return {
+        'job_id': job_id,
+        'kind': job['kind'],
+        'status': state,
+        'total': total,
+        'succeeded': succeeded,
+        'failed': failed,
+        'pending': total - done,
+        **{counter: int(job[counter]) for counter in job.get('counters', [])},
+        'seconds': round(elapsed, 3),
+        'tasks_per_second': round(done / elapsed, 2) if elapsed > 0 else None,
+        'failures': failures,
+    }
+
+
+def retry(table_name, queue, job_id):
+    """Queue the job's failed tasks again; tasks that succeeded are left alone."""
+    table = clients.table(table_name)
+    job = table.get_item(Key=job_key(job_id)).get('Item')
+    if job is None:
+        return None
+    params = json.loads(job['params'])
+
+    messages = []
+    for item in list(tasks(table_name, job_id, 'failed')):
+        requeued = clients.conditional(table.update_item, Key=task_key(job_id, item['name']),
+                                       UpdateExpression='SET #status = :queued', ConditionExpression='#status = :failed',
+                                       ExpressionAttributeNames=_names,
+                                       ExpressionAttributeValues={':queued': 'queued', ':failed': 'failed'})
+        if requeued:
+            table.update_item(Key=job_key(job_id), UpdateExpression='ADD failed :minus_one',
+                              ExpressionAttributeValues={':minus_one': -1})
+            messages.append(_message(job_id, job['kind'], params, item['name']))
+    queue.send(messages)
+    return {'job_id': job_id, 'retried': len(messages)}
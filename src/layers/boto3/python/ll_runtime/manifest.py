@@ -0,0 +1,81 @@
+"""Per-source chunk manifests in the vdb lifecycle table.
+
+Every indexed row of a source object is one item, so rows are recorded with
+batched puts and never read-modify-written:
+
+* ``id``: ``<source_id>#<chunk_hash>#<doc_id>``
+* ``source_id``: ``<collection>/<index>/<source uri>``
+* ``chunk_hash``: hex content hash of the chunk text
+* ``doc_id``: the id the vector store gave the row
+* ``removed``: set by /vdb/embed when a re-run no longer produces the chunk
+
+Items are read through ``SOURCE_INDEX``, a global secondary index on
+``(source_id, chunk_hash)``, so reads can lag writes by a moment.
+"""
+import json
+
+from boto3.dynamodb.conditions import Attr, Key
+
+from ll_runtime import clients
+from ll_runtime.chunking import content_hash
+
+SOURCE_INDEX = 'source-index'
+
+
+def source_id(collection, index, uri):
+    return f'{collection}/{index}/{uri}'
+
+
+def chunk_hash(metadata):
+    # /vdb/embed stores the chunk text as the row's metadata
+    text = metadata if isinstance(metadata, str) else json.dumps(metadata, sort_keys=True)
+    return content_hash(text).hex()
+
+
+class SourceManifest:
+    def __init__(self, table_name, source):
+        self.table_name = table_name
+        self.source = source
+
+    def _query(self, **kwargs):
+        table = clients.table(self.table_name)
+        kwargs.update(IndexName=SOURCE_INDEX, KeyConditionExpression=Key('source_id').eq(self.source))
+        while True:
+            response = table.query(**kwargs)
+            yield from response.get('Items', [])
+            if 'LastEvaluatedKey' not in response:
+                return
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def chunks(self):
+        """Map each recorded chunk hash to the ids of its manifest items.
+
+        Rows marked as removed are left out, so a chunk that reappears before
+        /vdb/add prunes them is embedded and indexed again.
+        """
+        chunks = {}
+        for item in self._query(ProjectionExpression='id, chunk_hash', FilterExpression=Attr('removed').not_exists()):
+            chunks.setdefault(item['chunk_hash'], []).append(item['id'])
+        return chunks
+
+    def record(self, hashes, doc_ids):
+        with clients.table(self.table_name).batch_writer(overwrite_by_pkeys=['id']) as batch:
+            for hash_, doc_id in zip(hashes, doc_ids):
+                batch.put_item(Item={'id': f'{self.source}#{hash_}#{doc_id}', 'source_id': self.source,
+                                     'chunk_hash': hash_, 'doc_id': doc_id})
+
+    def mark_removed(self, item_ids):
+        table = clients.table(self.table_name)
+        for item_id in item_ids:
+            table.update_item(Key={'id': item_id}, UpdateExpression='SET removed = :removed',
+                              ExpressionAttributeValues={':removed': True})
+
+    def removed(self):
+        """Return ``(item_id, doc_id)`` for every row marked as removed."""
+        return [(item['id'], item['doc_id'])
+                for item in self._query(FilterExpression=Attr('removed').eq(True))]
+
+    def forget(self, item_ids):
+        with clients.table(self.table_name).batch_writer() as batch:
+            for item_id in item_ids:
+                batch.delete_item(Key={'id': item_id})
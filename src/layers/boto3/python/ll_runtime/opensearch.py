@@ -0,0 +1,282 @@
+"""OpenSearch helpers shared by the vdb handlers.
+
+``get_client`` keeps one client per collection endpoint for the lifetime of
+the execution environment, so warm invocations reuse its HTTP connection
+pool. Requests are signed with the session's refreshable credentials, which
+are re-read (and refreshed when they rotate) on every request.
+"""
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from opensearchpy import (OpenSearch, RequestsAWSV4SignerAuth, RequestsHttpConnection, Urllib3AWSV4SignerAuth,
+                          Urllib3HttpConnection, exceptions)
+
+from ll_runtime import clients
+
+OPENSEARCH_HTTP_BACKEND = os.environ.get('OPENSEARCH_HTTP_BACKEND', 'urllib3')
+OPENSEARCH_POOL_MAXSIZE = int(os.environ.get('OPENSEARCH_POOL_MAXSIZE', 16))
+OPENSEARCH_TIMEOUT = int(os.environ.get('OPENSEARCH_TIMEOUT', 30))
+BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', 500))
+BULK_WORKERS = int(os.environ.get('BULK_WORKERS', 4))
+BULK_RETRIES = int(os.environ.get('BULK_RETRIES', 3))
+BULK_BACKOFF = float(os.environ.get('BULK_BACKOFF', 0.5))
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+MAX_REPORTED_ERRORS = 10
+VECTOR_FIELD = 'embedding'
+# A keyword stored with every document to break score ties; AOSS cannot sort on _id
+DOC_KEY_FIELD = 'doc_key'
+ENGINES = ('faiss', 'lucene', 'nmslib')
+# encoder name -> (engine, HNSW encoder definition)
+ENCODERS = {
+    'sq_fp16': ('faiss', {'name': 'sq', 'parameters': {'type': 'fp16'}}),
+    'sq': ('lucene', {'name': 'sq'}),
+}
+# Lucene takes ef_search with each query only, never as an index method parameter
+INDEX_EF_SEARCH_ENGINES = ('faiss', 'nmslib')
+# data type -> engine -> the space types it supports; float vectors work with every engine and space type
+DATA_TYPES = {
+    'float': None,
+    'byte': {'faiss': ('l2', 'innerproduct'), 'lucene': ('l2', 'cosinesimil', 'innerproduct')},
+    'binary': {'faiss': ('hamming',)},
+}
+
+BACKENDS = {
+    'urllib3': (Urllib3HttpConnection, Urllib3AWSV4SignerAuth),
+    'requests': (RequestsHttpConnection, RequestsAWSV4SignerAuth),
+}
+
+_lock = threading.Lock()
+_clients = {}
+
+
+def get_client(collection, backend=None):
+    backend = backend or OPENSEARCH_HTTP_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown OpenSearch HTTP backend {backend}')
+    key = (collection.endpoint, backend)
+    if key not in _clients:
+        with _lock:
+            if key not in _clients:
+                connection_class, auth_class = BACKENDS[backend]
+                credentials = clients.session().get_credentials()
+                _clients[key] = OpenSearch(
+                    hosts=[collection.endpoint],
+                    http_auth=auth_class(credentials, collection.region, 'aoss'),
+                    use_ssl=collection.endpoint.startswith('https'),
+                    verify_certs=True,
+                    http_compress=True,
+                    connection_class=connection_class,
+                    pool_maxsize=OPENSEARCH_POOL_MAXSIZE,
+                    timeout=OPENSEARCH_TIMEOUT,
+                )
+    return _clients[key]
+
+
+def reset():
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+def response_status(status):
+    # The collection's own 4xx are the caller's to fix; any other failure is a bad gateway
+    return status if isinstance(status, int) and 400 <= status < 500 else 502
+
+
+def error_status(e):
+    """The HTTP status to answer with for a ``TransportError`` from the collection."""
+    if isinstance(e, exceptions.ConnectionTimeout):
+        return 504
+    if isinstance(e, exceptions.ConnectionError):
+        return 503
+    return response_status(e.status_code)
+
+
+def _backoff(attempt):
+    time.sleep(BULK_BACKOFF * 2 ** attempt * (1 + random.random()))
+
+
+def _index_chunk(client, index, docs, retries):
+    """Send one ``_bulk`` request, then resend only the items that failed with a retryable status.
+
+    Returns ``(errors, ids)`` where ``ids`` holds each doc's id, or None if it failed.
+    """
+    pending = list(range(len(docs)))
+    ids = [None] * len(docs)
+    keys = [uuid.uuid4().hex for _ in docs]
+    errors = []
+    for attempt in range(retries + 1):
+        body = []
+        for position in pending:
+            body.append({'index': {'_index': index}})
+            body.append({**docs[position], DOC_KEY_FIELD: keys[position]})
+        try:
+            response = client.bulk(body=body)
+        except Exception as e:
+            status = getattr(e, 'status_code', None)
+            if attempt < retries and (status is None or status in RETRYABLE_STATUSES):
+                _backoff(attempt)
+                continue
+            errors.extend([str(e)] * len(pending))
+            break
+
+        retry = []
+        for position, item in zip(pending, response['items']):
+            result = item.get('index', {})
+            status = result.get('status', 500)
+            if status < 300:
+                ids[position] = result.get('_id')
+            elif status in RETRYABLE_STATUSES and attempt < retries:
+                retry.append(position)
+            else:
+                errors.append(result.get('error'))
+        if not retry:
+            break
+        pending = retry
+        _backoff(attempt)
+    return errors, ids
+
+
+def bulk_index(client, index, docs, chunk_size=BULK_CHUNK_SIZE, workers=BULK_WORKERS, retries=BULK_RETRIES,
+               on_indexed=None):
+    """Index ``docs`` through concurrent ``_bulk`` requests and summarise the outcome.
+
+    ``docs`` may be any iterable; at most ``2 * workers`` chunks are held at once.
+    ``on_indexed(docs, ids)`` is called in order for every chunk with the ids
+    the documents were stored under (None for the ones that failed).
+    """
+    summary = {'indexed': 0, 'failed': 0, 'requests': 0, 'errors': []}
+
+    def collect(chunk, future):
+        errors, ids = future.result()
+        summary['indexed'] += len(chunk) - len(errors)
+        summary['failed'] += len(errors)
+        summary['requests'] += 1
+        for error in errors:
+            if len(summary['errors']) < MAX_REPORTED_ERRORS:
+                summary['errors'].append(error)
+        if on_indexed:
+            on_indexed(chunk, ids)
+
+    start = time.perf_counter()
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        chunk = []
+        for doc in docs:
+            chunk.append(doc)
+            if len(chunk) == chunk_size:
+                if len(pending) >= 2 * workers:
+                    collect(*pending.popleft())
+                pending.append((chunk, executor.submit(_index_chunk, client, index, chunk, retries)))
+                chunk = []
+        if chunk:
+            pending.append((chunk, executor.submit(_index_chunk, client, index, chunk, retries)))
+        while pending:
+            collect(*pending.popleft())
+
+    elapsed = time.perf_counter() - start
+    summary['seconds'] = round(elapsed, 3)
+    summary['docs_per_second'] = round(summary['indexed'] / elapsed, 2) if elapsed else None
+    return summary
+
+
+def bulk_delete(client, index, doc_ids, chunk_size=BULK_CHUNK_SIZE):
+    """Delete documents by id with ``_bulk``; documents that are already gone count as deleted."""
+    summary = {'deleted': 0, 'failed': 0, 'errors': []}
+    doc_ids = list(doc_ids)
+    for start in range(0, len(doc_ids), chunk_size):
+        body = [{'delete': {'_index': index, '_id': doc_id}} for doc_id in doc_ids[start:start + chunk_size]]
+        for item in client.bulk(body=body)['items']:
+            result = item.get('delete', {})
+            if result.get('status', 500) < 300 or result.get('status') == 404:
+                summary['deleted'] += 1
+            else:
+                summary['failed'] += 1
+                if len(summary['errors']) < MAX_REPORTED_ERRORS:
+                    summary['errors'].append(result.get('error'))
+    return summary
+
+
+def knn_filter(filters):
+    # {"lang": "en", "source": ["a", "b"]} -> term/terms clauses on the stored metadata
+    clauses = []
+    for field, value in filters.items():
+        kind = 'terms' if isinstance(value, list) else 'term'
+        clauses.append({kind: {f'metadata.{field}': value}})
+    return {'bool': {'filter': clauses}}
+
+
+def knn_query(vector, k, size, ef_search=None, filters=None, search_after=None):
+    knn = {'vector': vector, 'k': k}
+    if ef_search:
+        knn['method_parameters'] = {'ef_search': int(ef_search)}
+    if filters:
+        knn['filter'] = knn_filter(filters)
+
+    # Only the metadata is returned, so the stored vectors never leave the cluster.
+    # The doc key breaks score ties, so search_after never skips hits tied across a page boundary;
+    # documents indexed before it existed sort last among their ties
+    query = {
+        'size': size,
+        '_source': {'includes': ['metadata']},
+        'sort': [{'_score': 'desc'}, {DOC_KEY_FIELD: {'order': 'asc', 'unmapped_type': 'keyword'}}],
+        'query': {'knn': {VECTOR_FIELD: knn}},
+    }
+    if search_after:
+        query['search_after'] = search_after
+    return query
+
+
+def knn_index_body(dimension=None, engine='faiss', space_type='l2', m=None, ef_construction=None, ef_search=None,
+                   encoder=None, data_type=None, model_id=None):
+    """Build a k-NN index body with its vector stored in ``VECTOR_FIELD``.
+
+    ``model_id`` points at a trained model (e.g. faiss IVF-PQ), which then
+    defines the dimension and method; otherwise an HNSW graph is built with
+    the given engine, parameters and optional encoder or ``byte`` data type.
+    """
+    if model_id:
+        field = {'type': 'knn_vector', 'model_id': model_id}
+    else:
+        if not dimension:
+            raise ValueError('dimension is required unless model_id is given')
+        if engine not in ENGINES:
+            raise ValueError(f'engine must be one of {", ".join(ENGINES)}')
+        if ef_search and engine not in INDEX_EF_SEARCH_ENGINES:
+            raise ValueError(f'ef_search is not an index parameter of the {engine} engine; pass it with each query')
+        if data_type:
+            _check_data_type(data_type, engine, space_type, encoder)
+        parameters = {}
+        for key, value in (('m', m), ('ef_construction', ef_construction), ('ef_search', ef_search)):
+            if value:
+                parameters[key] = int(value)
+        if encoder:
+            if encoder not in ENCODERS or ENCODERS[encoder][0] != engine:
+                raise ValueError(f'encoder {encoder} is not available for the {engine} engine')
+            parameters['encoder'] = ENCODERS[encoder][1]
+        method = {'name': 'hnsw', 'engine': engine, 'space_type': space_type}
+        if parameters:
+            method['parameters'] = parameters
+        field = {'type': 'knn_vector', 'dimension': int(dimension), 'method': method}
+        if data_type:
+            field['data_type'] = data_type
+    return {'settings': {'index.knn': True},
+            'mappings': {'properties': {VECTOR_FIELD: field, DOC_KEY_FIELD: {'type': 'keyword'}}}}
+
+
+def _check_data_type(data_type, engine, space_type, encoder):
+    if data_type not in DATA_TYPES:
+        raise ValueError(f'data_type must be one of {", ".join(DATA_TYPES)}')
+    supported = DATA_TYPES[data_type]
+    if supported is None:
+        return
+    if engine not in supported or space_type not in supported[engine]:
+        raise ValueError(f'data_type {data_type} is not available for the {engine} engine with space_type {space_type}')
+    if encoder:
+        raise ValueError(f'encoder {encoder} quantizes float vectors and cannot be used with data_type {data_type}')
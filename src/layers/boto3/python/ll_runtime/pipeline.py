@@ -0,0 +1,77 @@
+"""The /vdb/embed pipeline for one S3 object, shared with the ingestion workers.
+
+Lines are streamed in, chunked, each distinct chunk is embedded once and the
+results are streamed out, either as a float32 matrix with a metadata sidecar
+or as JSON lines.
+"""
+import time
+
+from ll_runtime import chunking, embeddings, manifest, s3, vectors
+
+
+def skip_known(chunks, known, seen, counts):
+    for text in chunks:
+        hash_ = manifest.chunk_hash(text)
+        seen.add(hash_)
+        if hash_ in known:
+            counts['unchanged'] += 1
+            continue
+        yield text
+
+
+def embed_object(endpoint_name, src_bucket, src_key, dest_bucket, dest_key, options=None, table_name=None):
+    """Embed ``s3://src_bucket/src_key`` into ``dest_key`` and return the run's stats.
+
+    ``options`` takes the /vdb/embed body options. Bad chunking options raise
+    ValueError before anything is read.
+    """
+    options = options or {}
+    batch_size = int(options.get('batch_size', embeddings.EMBED_BATCH_SIZE))
+    max_in_flight = int(options.get('max_in_flight', embeddings.EMBED_MAX_IN_FLIGHT))
+    output_format = options.get('format', 'f32')
+    chunk_by = options.get('chunk_by', 'line')
+    dedupe = options.get('dedupe', True)
+    source = f's3://{src_bucket}/{src_key}'
+
+    start = time.perf_counter()
+    lines = 0
+    counts = {'embedded': 0, 'reused': 0, 'duplicates_dropped': 0}
+    chunks = chunking.chunk(s3.iter_lines(src_bucket, src_key), chunk_by, options.get('chunk_size'),
+                            options.get('chunk_overlap', 0))
+    if options.get('drop_duplicates', False):
+        chunks = chunking.drop_duplicates(chunks, counts)
+
+    # With a target collection and index, only chunks missing from the source's manifest are embedded
+    source_manifest = None
+    if table_name and options.get('name') and options.get('index'):
+        source_manifest = manifest.SourceManifest(table_name, manifest.source_id(options['name'], options['index'], source))
+        known, seen = source_manifest.chunks(), set()
+        counts.update(unchanged=0, removed=0)
+        chunks = skip_known(chunks, known, seen, counts)
+
+    if dedupe:
+        embedded = embeddings.embed_deduplicated(endpoint_name, chunks, batch_size, max_in_flight, stats=counts)
+    else:
+        embedded = embeddings.embed_batches(endpoint_name, embeddings.batched(chunks, batch_size), max_in_flight)
+    with vectors.open_writer(dest_bucket, dest_key, output_format, source) as writer:
+        for batch, batch_vectors in embedded:
+            writer.write(batch, batch_vectors)
+            lines += len(batch)
+    if not dedupe:
+        counts['embedded'] = lines
+    if source_manifest:
+        # /vdb/add deletes these once the new chunks are indexed
+        removed = [item_id for hash_, item_ids in known.items() if hash_ not in seen for item_id in item_ids]
+        source_manifest.mark_removed(removed)
+        counts['removed'] = len(removed)
+
+    elapsed = time.perf_counter() - start
+    return {
+        'lines': lines,
+        'chunk_by': chunk_by,
+        **counts,
+        'format': output_format,
+        'bytes': writer.bytes_written,
+        'seconds': round(elapsed, 3),
+        'lines_per_second': round(lines / elapsed, 2) if elapsed else None,
+    }
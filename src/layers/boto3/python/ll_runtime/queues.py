@@ -0,0 +1,68 @@
+"""Work queues for fanning jobs out to workers.
+
+``SqsQueue`` sends JSON messages to an SQS queue that a worker Lambda
+consumes. ``LocalQueue`` is the in-process stand-in used when no queue is
+configured, e.g. in tests: it hands each message to ``handler`` on a thread
+pool and ``join`` waits for them, including any the handlers send.
+"""
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from ll_runtime import clients
+
+SQS_BATCH_SIZE = 10
+LOCAL_QUEUE_WORKERS = int(os.environ.get('LOCAL_QUEUE_WORKERS', 8))
+
+
+class SqsQueue:
+    def __init__(self, url):
+        self.url = url
+
+    def send(self, messages):
+        sqs = clients.client('sqs')
+        for start in range(0, len(messages), SQS_BATCH_SIZE):
+            entries = [{'Id': str(i), 'MessageBody': json.dumps(message)}
+                       for i, message in enumerate(messages[start:start + SQS_BATCH_SIZE])]
+            for _ in range(clients.MAX_ATTEMPTS):
+                failures = sqs.send_message_batch(QueueUrl=self.url, Entries=entries).get('Failed', [])
+                if any(failure['SenderFault'] for failure in failures):
+                    raise ValueError(f'SQS rejected messages: {failures}')
+                retry = {failure['Id'] for failure in failures}
+                entries = [entry for entry in entries if entry['Id'] in retry]
+                if not entries:
+                    break
+            else:
+                raise RuntimeError(f'SQS could not take {len(entries)} messages')
+
+    def join(self):
+        pass
+
+
+class LocalQueue:
+    def __init__(self, handler, workers=None):
+        self.handler = handler
+        self.executor = ThreadPoolExecutor(workers or LOCAL_QUEUE_WORKERS)
+        self.futures = []
+        self._lock = threading.Lock()
+
+    def send(self, messages):
+        with self._lock:
+            self.futures.extend(self.executor.submit(self.handler, message) for message in messages)
+
+    def join(self):
+        while True:
+            with self._lock:
+                futures, self.futures = self.futures, []
+            if not futures:
+                return
+            wait(futures)
+            for future in futures:
+                future.result()
+
+
+def get_queue(handler, url=None):
+    """An ``SqsQueue`` for ``url`` (default ``QUEUE_URL``), else a ``LocalQueue`` running ``handler``."""
+    url = url or os.environ.get('QUEUE_URL')
+    return SqsQueue(url) if url else LocalQueue(handler)
@@ -0,0 +1,72 @@
+"""Streaming S3 reads and multipart writes with bounded memory."""
+import os
+
+from ll_runtime import clients
+
+READ_CHUNK_SIZE = int(os.environ.get('S3_READ_CHUNK_SIZE', 1024 * 1024))
+PART_SIZE = int(os.environ.get('S3_PART_SIZE', 8 * 1024 * 1024))
+
+
+def iter_lines(bucket, key, chunk_size=None):
+    body = clients.client('s3').get_object(Bucket=bucket, Key=key)['Body']
+    for line in body.iter_lines(chunk_size=chunk_size or READ_CHUNK_SIZE):
+        yield line.decode('utf-8')
+
+
+class MultipartWriter:
+    """Buffers writes into parts of ``part_size`` bytes and uploads them as they fill.
+
+    Objects smaller than one part are written with a single ``put_object``.
+    """
+
+    def __init__(self, bucket, key, part_size=None, content_type='application/x-ndjson'):
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size or PART_SIZE
+        self.content_type = content_type
+        self.bytes_written = 0
+        self._s3 = clients.client('s3')
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._buffer += data
+        self.bytes_written += len(data)
+        if len(self._buffer) >= self.part_size:
+            self._upload_part()
+
+    def _upload_part(self):
+        if self._upload_id is None:
+            response = self._s3.create_multipart_upload(Bucket=self.bucket, Key=self.key, ContentType=self.content_type)
+            self._upload_id = response['UploadId']
+        number = len(self._parts) + 1
+        response = self._s3.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                        PartNumber=number, Body=bytes(self._buffer))
+        self._parts.append({'ETag': response['ETag'], 'PartNumber': number})
+        self._buffer = bytearray()
+
+    def close(self):
+        if self._upload_id is None:
+            self._s3.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer), ContentType=self.content_type)
+            self._buffer = bytearray()
+            return
+        if self._buffer:
+            self._upload_part()
+        self._s3.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                           MultipartUpload={'Parts': self._parts})
+
+    def abort(self):
+        if self._upload_id is not None:
+            self._s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
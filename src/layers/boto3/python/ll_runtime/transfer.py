@@ -0,0 +1,112 @@
+"""Bulk import and export of chat history as JSON lines in S3.
+
+Export writes one line per stored item, ``{'id', 'turn', ...}`` in the
+archive's record format, from ``segments`` parallel scan workers that each
+stream to their own ``part-<segment>.jsonl`` object. Import reads those files
+back and also takes one conversation per line as ``{'id', 'chat'}``, the
+legacy table's shape, where ``id`` may be left out.
+
+Imports overwrite items with the same keys: BatchWriteItem has no conditions.
+The /history/import and /history/export routes run these as jobs, see
+``ll_runtime.bulk_jobs``.
+"""
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from ll_runtime import batch, clients, history, s3
+
+EXPORT_SEGMENTS = int(os.environ.get('EXPORT_SEGMENTS', 8))
+
+
+def _turn(conversation_id, turn, q, a):
+    return {'id': conversation_id, 'turn': turn, **history.encode(q, a)}
+
+
+def _items(record):
+    if 'chat' in record:
+        conversation_id = record.get('id') or str(uuid.uuid4())
+        for turn, entry in enumerate(record['chat'], start=1):
+            yield _turn(conversation_id, turn, entry['q'], entry['a'])
+        yield history.head_item(conversation_id, len(record['chat']),
+                                sum(len(entry['q']) + len(entry['a']) for entry in record['chat']))
+    elif record['turn'] == history.HEAD:
+        yield history.head_item(record['id'], record['turns'], record.get('chars', 0), record.get('gaps', 0))
+    elif record['turn'] == history.SUMMARY:
+        yield record
+    else:
+        yield _turn(record['id'], record['turn'], record['q'], record['a'])
+
+
+def import_lines(table_name, lines, workers=None):
+    start = time.perf_counter()
+    count = conversations = 0
+    with batch.BatchWriter(table_name, workers, overwrite_by_pkeys=('id', 'turn')) as writer:
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                items = list(_items(record))
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f'line {number}: expected a conversation or an exported item ({e!r})')
+            conversations += 'chat' in record or record['turn'] == history.HEAD
+            count += 1
+            for item in items:
+                writer.put(item)
+    elapsed = time.perf_counter() - start
+    return {
+        'lines': count,
+        'conversations': conversations,
+        **writer.stats,
+        'seconds': round(elapsed, 3),
+        'items_per_second': round(writer.stats['items'] / elapsed, 2) if elapsed else None,
+    }
+
+
+def import_object(table_name, bucket, key, workers=None):
+    return import_lines(table_name, s3.iter_lines(bucket, key), workers)
+
+
+def check_segments(segments):
+    segments = int(segments or EXPORT_SEGMENTS)
+    if not 0 < segments <= 1000000:
+        raise ValueError('segments must be between 1 and 1000000')
+    return segments
+
+
+def export_segment(table_name, bucket, prefix, segment, segments):
+    """Write one parallel scan segment of the table to ``part-<segment>.jsonl`` under ``prefix``."""
+    table = clients.table(table_name)
+    kwargs = {'Segment': segment, 'TotalSegments': segments}
+    count = 0
+    with s3.MultipartWriter(bucket, f'{prefix}part-{segment:05}.jsonl') as writer:
+        while True:
+            response = table.scan(**kwargs)
+            for item in response.get('Items', []):
+                writer.write(json.dumps({'id': item['id'], **history.record(item)}, ensure_ascii=False) + '\n')
+                count += 1
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return {'key': writer.key, 'items': count, 'bytes': writer.bytes_written}
+
+
+def export(table_name, bucket, prefix, segments=None):
+    segments = check_segments(segments)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(min(segments, 32)) as executor:
+        parts = list(executor.map(lambda segment: export_segment(table_name, bucket, prefix, segment, segments),
+                                  range(segments)))
+    elapsed = time.perf_counter() - start
+    items = sum(part['items'] for part in parts)
+    return {
+        'segments': segments,
+        'items': items,
+        'bytes': sum(part['bytes'] for part in parts),
+        'objects': [part['key'] for part in parts],
+        'seconds': round(elapsed, 3),
+        'items_per_second': round(items / elapsed, 2) if elapsed else None,
+    }
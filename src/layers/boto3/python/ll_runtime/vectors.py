@@ -0,0 +1,134 @@
+"""Binary embedding interchange between /vdb/embed and /vdb/add.
+
+An embedding set is three S3 objects:
+
+* ``<key>``: a small JSON manifest (``format``, ``dtype``, ``dim``, ``count``)
+* ``<key>.f32``: the vectors as a row-major little-endian float32 matrix
+* ``<key>.meta.jsonl``: one JSON metadata value per row
+
+The matrix has no header, so it can be written as a multipart stream without
+knowing the row count up front, and read back with ranged GETs one block of
+rows at a time (a downloaded copy can equally be opened with ``numpy.memmap``).
+"""
+import json
+import os
+
+import numpy as np
+
+from ll_runtime import clients, s3
+
+FORMAT = 'llmanager-vectors'
+DTYPE = '<f4'
+READ_ROWS = int(os.environ.get('VECTOR_READ_ROWS', 4096))
+
+
+def is_manifest(record):
+    return isinstance(record, dict) and record.get('format') == FORMAT
+
+
+class VectorWriter:
+    def __init__(self, bucket, key, source=None):
+        self.bucket = bucket
+        self.key = key
+        self.source = source
+        self.dim = None
+        self.count = 0
+        self._vectors = s3.MultipartWriter(bucket, f'{key}.f32', content_type='application/octet-stream')
+        self._metadata = s3.MultipartWriter(bucket, f'{key}.meta.jsonl')
+
+    @property
+    def bytes_written(self):
+        return self._vectors.bytes_written + self._metadata.bytes_written
+
+    def write(self, metadata, vectors):
+        matrix = np.asarray(vectors, dtype=DTYPE)
+        if matrix.ndim != 2 or matrix.shape[0] != len(metadata):
+            raise ValueError(f'Expected {len(metadata)} vectors, got shape {matrix.shape}')
+        if self.dim is None:
+            self.dim = matrix.shape[1]
+        elif matrix.shape[1] != self.dim:
+            raise ValueError(f'Expected dimension {self.dim}, got {matrix.shape[1]}')
+        self._vectors.write(matrix.tobytes())
+        self._metadata.write(''.join(json.dumps(item) + '\n' for item in metadata))
+        self.count += len(metadata)
+
+    def close(self):
+        self._vectors.close()
+        self._metadata.close()
+        manifest = {
+            'format': FORMAT,
+            'version': 1,
+            'dtype': DTYPE,
+            'dim': self.dim or 0,
+            'count': self.count,
+            'vectors': self._vectors.key,
+            'metadata': self._metadata.key,
+        }
+        if self.source:
+            manifest['source'] = self.source
+        clients.client('s3').put_object(Bucket=self.bucket, Key=self.key, Body=json.dumps(manifest).encode('utf-8'),
+                                        ContentType='application/json')
+
+    def abort(self):
+        self._vectors.abort()
+        self._metadata.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class JsonLinesWriter:
+    """The JSON fallback: one ``{metadata, embedding}`` record per line."""
+
+    def __init__(self, bucket, key):
+        self._records = s3.MultipartWriter(bucket, key)
+
+    @property
+    def bytes_written(self):
+        return self._records.bytes_written
+
+    def write(self, metadata, vectors):
+        self._records.write(''.join(json.dumps({'metadata': item, 'embedding': list(vector)}) + '\n'
+                                    for item, vector in zip(metadata, vectors)))
+
+    def close(self):
+        self._records.close()
+
+    def abort(self):
+        self._records.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._records.__exit__(exc_type, exc, tb)
+
+
+def open_writer(bucket, key, output_format='f32', source=None):
+    # Only the f32 manifest has room to record the source object
+    if output_format == 'jsonl':
+        return JsonLinesWriter(bucket, key)
+    if output_format == 'f32':
+        return VectorWriter(bucket, key, source)
+    raise ValueError(f'Unknown embedding format {output_format}')
+
+
+def read_blocks(bucket, manifest, rows=None):
+    """Yield ``(matrix, metadata)`` blocks; ``matrix`` is a read-only view over the fetched bytes."""
+    rows = rows or READ_ROWS
+    dim, count = manifest['dim'], manifest['count']
+    row_bytes = dim * np.dtype(manifest['dtype']).itemsize
+    metadata = (json.loads(line) for line in s3.iter_lines(bucket, manifest['metadata']))
+    s3_client = clients.client('s3')
+    for start in range(0, count, rows):
+        stop = min(start + rows, count)
+        response = s3_client.get_object(Bucket=bucket, Key=manifest['vectors'],
+                                        Range=f'bytes={start * row_bytes}-{stop * row_bytes - 1}')
+        matrix = np.frombuffer(response['Body'].read(), dtype=manifest['dtype']).reshape(stop - start, dim)
+        yield matrix, [next(metadata) for _ in range(stop - start)]
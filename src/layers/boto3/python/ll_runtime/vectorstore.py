@@ -0,0 +1,364 @@
+"""Vector-store backends behind the vdb handlers.
+
+``get_store`` returns the backend for a collection, chosen by
+``VECTOR_STORE_BACKEND``:
+
+* ``aoss``: the OpenSearch Serverless collection (the default)
+* ``local``: ``LocalVectorStore``, an exact NumPy engine over float32 matrices
+  kept under ``VECTOR_STORE_PATH``. It is for tests and local development:
+  deployed, each function would write to its own ephemeral ``/tmp``.
+
+Indexes are defined with an OpenSearch index body in both cases, so the same
+``/vdb/add_index`` request works against either backend.
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from ll_runtime import collections, opensearch
+
+VECTOR_STORE_BACKEND = os.environ.get('VECTOR_STORE_BACKEND', 'aoss')
+VECTOR_STORE_PATH = os.environ.get('VECTOR_STORE_PATH', '/tmp/llmanager-vectors')
+SEARCH_BLOCK_ROWS = int(os.environ.get('VECTOR_SEARCH_BLOCK_ROWS', 65536))
+MAX_K = int(os.environ.get('MAX_K', 10000))
+SPACE_TYPES = ('l2', 'cosinesimil', 'innerproduct')
+DTYPE = '<f4'
+
+_lock = threading.Lock()
+_stores = {}
+
+
+def get_store(name, backend=None):
+    """Return the store for collection ``name``, or None when the AOSS collection does not exist."""
+    backend = backend or VECTOR_STORE_BACKEND
+    if backend == 'aoss':
+        collection = collections.resolve(name)
+        return OpenSearchStore(collection) if collection else None
+    if backend == 'local':
+        with _lock:
+            if name not in _stores:
+                _stores[name] = LocalVectorStore(os.path.join(VECTOR_STORE_PATH, name))
+            return _stores[name]
+    raise ValueError(f'Unknown vector store backend {backend}')
+
+
+def reset():
+    with _lock:
+        _stores.clear()
+
+
+def check_page(k, size):
+    k = int(k)
+    size = k if size is None else int(size)
+    if not 0 < k <= MAX_K or not 0 < size <= k:
+        raise ValueError(f'k must be between 1 and {MAX_K} and size between 1 and k')
+    return k, size
+
+
+class VectorStore:
+    """Operations every backend provides.
+
+    ``docs`` are ``{'embedding': [...], 'metadata': ...}`` records. Searches
+    return hits as ``{'metadata', 'score', 'sort'}``, best first, where
+    ``sort`` can be passed back as ``search_after`` to fetch the next page of
+    the same ``k`` neighbours.
+    """
+
+    def create_index(self, index, body):
+        raise NotImplementedError
+
+    def add(self, index, docs, chunk_size=None, workers=None, on_indexed=None):
+        """Index ``docs``; ``on_indexed(docs, ids)`` receives the ids of each chunk as it is stored."""
+        raise NotImplementedError
+
+    def delete(self, index, doc_ids):
+        raise NotImplementedError
+
+    def search(self, index, vector, k=10, size=None, ef_search=None, filters=None, search_after=None):
+        raise NotImplementedError
+
+    def msearch(self, index, vectors, k=10, size=None, ef_search=None, filters=None):
+        """Return one ``{'hits': [...]}`` or ``{'status', 'error'}`` response per vector."""
+        responses = []
+        for vector in vectors:
+            try:
+                responses.append({'hits': self.search(index, vector, k, size, ef_search, filters)})
+            except ValueError as e:
+                responses.append({'status': 400, 'error': str(e)})
+        return responses
+
+
+class OpenSearchStore(VectorStore):
+    def __init__(self, collection):
+        self.collection = collection
+
+    @property
+    def client(self):
+        return opensearch.get_client(self.collection)
+
+    def create_index(self, index, body):
+        self.client.indices.create(index, body=body)
+
+    def add(self, index, docs, chunk_size=None, workers=None, on_indexed=None):
+        return opensearch.bulk_index(self.client, index, docs, chunk_size or opensearch.BULK_CHUNK_SIZE,
+                                     workers or opensearch.BULK_WORKERS, on_indexed=on_indexed)
+
+    def delete(self, index, doc_ids):
+        return opensearch.bulk_delete(self.client, index, doc_ids)
+
+    def search(self, index, vector, k=10, size=None, ef_search=None, filters=None, search_after=None):
+        query = opensearch.knn_query(vector, *check_page(k, size), ef_search, filters, search_after)
+        return [_hit(hit) for hit in self.client.search(index=index, body=query)['hits']['hits']]
+
+    def msearch(self, index, vectors, k=10, size=None, ef_search=None, filters=None):
+        k, size = check_page(k, size)
+        searches = []
+        for vector in vectors:
+            searches.append({'index': index})
+            searches.append(opensearch.knn_query(vector, k, size, ef_search, filters))
+        responses = []
+        for item in self.client.msearch(body=searches)['responses']:
+            if 'error' in item:
+                responses.append({'status': opensearch.response_status(item.get('status')), 'error': item['error']})
+            else:
+                responses.append({'hits': [_hit(hit) for hit in item['hits']['hits']]})
+        return responses
+
+
+def _hit(hit):
+    return {'metadata': hit['_source']['metadata'], 'score': hit.get('_score'), 'sort': hit.get('sort')}
+
+
+class LocalVectorStore(VectorStore):
+    """Exact kNN over memory-mapped float32 matrices, one directory per index.
+
+    Each index holds ``vectors.f32`` (a row-major matrix with no header),
+    ``metadata.jsonl`` (one JSON value per row) and ``index.json``. Appends
+    write both data files first and then commit the new row count to
+    ``index.json``, so rows from an interrupted append are never read and are
+    truncated by the next one. Writers to an index must be serialised.
+
+    Scores follow the OpenSearch conventions for each space type, so results
+    are comparable with an AOSS index built from the same vectors. Search is
+    exact, so HNSW parameters and encoders in the index body are ignored.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._metadata = {}
+
+    def _path(self, index, name):
+        return os.path.join(self.root, index, name)
+
+    def _info(self, index):
+        try:
+            with open(self._path(index, 'index.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise ValueError(f'Index {index} does not exist')
+
+    def _commit(self, index, info):
+        path = self._path(index, 'index.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(info, f)
+        os.replace(path + '.tmp', path)
+
+    def create_index(self, index, body):
+        field, mapping = _vector_field(body)
+        if 'dimension' not in mapping:
+            raise ValueError('Local indexes need an explicit dimension')
+        space_type = mapping.get('method', {}).get('space_type', 'l2')
+        if space_type not in SPACE_TYPES:
+            raise ValueError(f'Unsupported space_type {space_type}')
+        os.makedirs(os.path.join(self.root, index), exist_ok=True)
+        if os.path.exists(self._path(index, 'index.json')):
+            raise ValueError(f'Index {index} already exists')
+        for name in ('vectors.f32', 'metadata.jsonl'):
+            open(self._path(index, name), 'wb').close()
+        self._commit(index, {'field': field, 'dimension': int(mapping['dimension']), 'space_type': space_type,
+                             'count': 0, 'metadata_bytes': 0})
+
+    def add(self, index, docs, chunk_size=None, workers=None, on_indexed=None):
+        info = self._info(index)
+        dimension = info['dimension']
+        chunk_size = chunk_size or opensearch.BULK_CHUNK_SIZE
+        summary = {'indexed': 0, 'failed': 0, 'requests': 0, 'errors': []}
+        start = time.perf_counter()
+
+        with open(self._path(index, 'vectors.f32'), 'r+b') as vectors, \
+                open(self._path(index, 'metadata.jsonl'), 'r+b') as metadata:
+            vectors.truncate(info['count'] * dimension * 4)
+            metadata.truncate(info['metadata_bytes'])
+            vectors.seek(0, os.SEEK_END)
+            metadata.seek(0, os.SEEK_END)
+
+            def flush(chunk, valid, rows, lines):
+                if not chunk:
+                    return
+                if rows:
+                    vectors.write(np.asarray(rows, dtype=DTYPE).tobytes())
+                    metadata.write(b''.join(lines))
+                    vectors.flush()
+                    metadata.flush()
+                    summary['indexed'] += len(rows)
+                    summary['requests'] += 1
+                # Rows are committed chunk by chunk, so reported ids are always readable
+                row_ids = iter(range(info['count'], info['count'] + len(rows)))
+                info['count'] += len(rows)
+                info['metadata_bytes'] = metadata.tell()
+                self._commit(index, info)
+                if on_indexed:
+                    on_indexed(chunk, [str(next(row_ids)) if ok else None for ok in valid])
+
+            chunk, valid, rows, lines = [], [], [], []
+            for doc in docs:
+                embedding = np.asarray(doc[opensearch.VECTOR_FIELD], dtype=DTYPE)
+                chunk.append(doc)
+                valid.append(embedding.shape == (dimension,))
+                if not valid[-1]:
+                    summary['failed'] += 1
+                    if len(summary['errors']) < opensearch.MAX_REPORTED_ERRORS:
+                        summary['errors'].append(f'Expected {dimension} dimensions, got {embedding.size}')
+                else:
+                    rows.append(embedding)
+                    lines.append(json.dumps(doc['metadata']).encode('utf-8') + b'\n')
+                if len(chunk) == chunk_size:
+                    flush(chunk, valid, rows, lines)
+                    chunk, valid, rows, lines = [], [], [], []
+            flush(chunk, valid, rows, lines)
+
+        elapsed = time.perf_counter() - start
+        summary['seconds'] = round(elapsed, 3)
+        summary['docs_per_second'] = round(summary['indexed'] / elapsed, 2) if elapsed else None
+        return summary
+
+    def delete(self, index, doc_ids):
+        # Rows are never rewritten; deleted ones are recorded and masked out of searches
+        info = self._info(index)
+        rows = np.array([int(doc_id) for doc_id in doc_ids if 0 <= int(doc_id) < info['count']], dtype='<i8')
+        with open(self._path(index, 'deleted.i64'), 'ab') as f:
+            f.write(rows.tobytes())
+        return {'deleted': len(rows), 'failed': 0, 'errors': []}
+
+    def _live(self, index, count):
+        try:
+            deleted = np.fromfile(self._path(index, 'deleted.i64'), dtype='<i8')
+        except FileNotFoundError:
+            return None
+        live = np.ones(count, dtype=bool)
+        live[deleted[deleted < count]] = False
+        return live
+
+    def _load_metadata(self, index, info):
+        # Rows are append-only, so only the lines added since the last read are parsed
+        values, offset = self._metadata.get(index, ([], 0))
+        if offset > info['metadata_bytes']:
+            values, offset = [], 0
+        if offset < info['metadata_bytes']:
+            with open(self._path(index, 'metadata.jsonl'), 'rb') as f:
+                f.seek(offset)
+                data = f.read(info['metadata_bytes'] - offset)
+            values = values + [json.loads(line) for line in data.splitlines()]
+            offset = info['metadata_bytes']
+        self._metadata[index] = (values, offset)
+        return values[:info['count']]
+
+    def matrix(self, index):
+        """The index's vectors as a read-only ``(count, dimension)`` memory map."""
+        info = self._info(index)
+        if not info['count']:
+            return np.empty((0, info['dimension']), dtype=DTYPE)
+        return np.memmap(self._path(index, 'vectors.f32'), dtype=DTYPE, mode='r', shape=(info['count'], info['dimension']))
+
+    def search(self, index, vector, k=10, size=None, ef_search=None, filters=None, search_after=None):
+        # ef_search has no meaning for an exact search and is ignored
+        k, size = check_page(k, size)
+        info = self._info(index)
+        query = np.asarray(vector, dtype=DTYPE)
+        if query.shape != (info['dimension'],):
+            raise ValueError(f'Expected {info["dimension"]} dimensions, got {query.size}')
+        matrix = self.matrix(index)
+        metadata = self._load_metadata(index, info)
+        mask = self._live(index, info['count'])
+        if filters:
+            matches = np.fromiter((_matches(value, filters) for value in metadata), bool, len(metadata))
+            mask = matches if mask is None else mask & matches
+
+        scores, rows = top_k(matrix, query, k, info['space_type'], mask)
+        # The row breaks score ties, as the doc key does for OpenSearch
+        hits = [{'metadata': metadata[row], 'score': float(score), 'sort': [float(score), int(row)]}
+                for score, row in zip(scores, rows)]
+        if search_after:
+            after = _sort_key(search_after)
+            hits = [hit for hit in hits if _sort_key(hit['sort']) > after]
+        return hits[:size]
+
+
+def _sort_key(sort):
+    # Score descending, then the tiebreaker ascending; a cursor without one resumes after every tie
+    score, *tiebreaker = sort
+    return (-float(score), *tiebreaker) if tiebreaker else (-float(score), float('inf'))
+
+
+def _vector_field(body):
+    for field, mapping in body.get('mappings', {}).get('properties', {}).items():
+        if mapping.get('type') == 'knn_vector':
+            return field, mapping
+    raise ValueError('Index body has no knn_vector field')
+
+
+def _matches(metadata, filters):
+    if not isinstance(metadata, dict):
+        return False
+    for field, value in filters.items():
+        if isinstance(value, list):
+            if metadata.get(field) not in value:
+                return False
+        elif metadata.get(field) != value:
+            return False
+    return True
+
+
+def score(matrix, query, space_type):
+    """OpenSearch-style scores (higher is better) of every row of ``matrix`` against ``query``."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    dot = matrix @ query
+    if space_type == 'l2':
+        distance = np.einsum('ij,ij->i', matrix, matrix) - 2 * dot + query @ query
+        return 1 / (1 + np.maximum(distance, 0))
+    if space_type == 'cosinesimil':
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        cosine = np.divide(dot, norms, out=np.zeros_like(dot), where=norms > 0)
+        return (1 + cosine) / 2
+    if space_type == 'innerproduct':
+        return np.where(dot >= 0, dot + 1, 1 / (1 - np.minimum(dot, 0)))
+    raise ValueError(f'Unsupported space_type {space_type}')
+
+
+def top_k(matrix, query, k, space_type, mask=None, block_rows=None):
+    """Return the ``k`` best ``(scores, rows)`` of ``matrix``, best first.
+
+    The matrix is scored ``block_rows`` rows at a time, so a memory map is
+    never read into memory whole. Rows where ``mask`` is False are skipped.
+    """
+    block_rows = block_rows or SEARCH_BLOCK_ROWS
+    best_scores = np.empty(0, dtype=np.float32)
+    best_rows = np.empty(0, dtype=np.int64)
+    for start in range(0, len(matrix), block_rows):
+        scores = score(matrix[start:start + block_rows], query, space_type)
+        rows = np.arange(start, start + len(scores))
+        if mask is not None:
+            keep = mask[start:start + len(scores)]
+            scores, rows = scores[keep], rows[keep]
+        scores = np.concatenate([best_scores, scores])
+        rows = np.concatenate([best_rows, rows])
+        if len(scores) > k:
+            keep = np.argpartition(-scores, k - 1)[:k]
+            scores, rows = scores[keep], rows[keep]
+        best_scores, best_rows = scores, rows
+    # Highest score first, ties broken by insertion order
+    order = np.lexsort((best_rows, -best_scores))
+    return best_scores[order], best_rows[order]
@@ -1,13 +1,12 @@
 from datetime import datetime, timedelta, timezone
 import json
-import boto3
 import os
+from ll_runtime import clients
 
 def get_svc_names():
-    client = boto3.client('sagemaker')
+    client = clients.client('sagemaker')
 
-    dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.Table(os.environ.get('TABLE_NAME'))
+    table = clients.table(os.environ.get('TABLE_NAME'))
     response = table.scan()
     results = response.get('Items', [{}])
 
@@ -28,7 +27,7 @@ def get_svc_names():
 
 def check_inactive(vars):
     svc_name, timeout, threshold = vars
-    client = boto3.client('cloudwatch')
+    client = clients.client('cloudwatch')
 
     response = client.get_metric_data(
         MetricDataQueries=[
@@ -67,7 +66,7 @@ def delete_inactive(svc_name, function_name):
     payload = {
         "name": svc_name,
     }
-    client = boto3.client('lambda')
+    client = clients.client('lambda')
     # TODO: Check payload for delete function
     response = client.invoke(
         FunctionName=function_name,
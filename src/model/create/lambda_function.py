@@ -1,6 +1,6 @@
 import json
 import os
-import boto3
+from ll_runtime import clients
 from sagemaker import script_uris
 from sagemaker import image_uris 
 from sagemaker import model_uris
@@ -10,8 +10,8 @@ from sagemaker.jumpstart.notebook_utils import list_jumpstart_models
 
 class ModelStatus:
     def __init__(self, name):
-        self.sagemaker = boto3.client("sagemaker", region_name=os.environ.get('AWS_REGION'))
-        self.iam = boto3.client("iam", region_name=os.environ.get('AWS_REGION'))
+        self.sagemaker = clients.client("sagemaker", region_name=os.environ.get('AWS_REGION'))
+        self.iam = clients.client("iam", region_name=os.environ.get('AWS_REGION'))
         self.name = name
 
     def endpoint_in_service(self):
@@ -40,8 +40,8 @@ class ModelStatus:
 
 class CreateModel:
     def __init__(self):
-        self.sagemaker = boto3.client("sagemaker", region_name=os.environ.get('AWS_REGION'))
-        self.iam = boto3.client("iam", region_name=os.environ.get('AWS_REGION'))
+        self.sagemaker = clients.client("sagemaker", region_name=os.environ.get('AWS_REGION'))
+        self.iam = clients.client("iam", region_name=os.environ.get('AWS_REGION'))
 
     def create(self, name, model, instance_type=None, bucket=None, key=None, env_vars=None, docker_img=None):
         model, instance_type = self._resolve_instance_type(model, instance_type)
@@ -206,5 +206,5 @@ def addTimeout(body, name):
     timeout = body.get('timeout', 300)
     if enableTimeout:
         tableName = os.environ.get('TABLE_NAME')
-        table = boto3.resource('dynamodb').Table(tableName)
+        table = clients.table(tableName)
         table.put_item(Item={'id': name, 'timeout': timeout, 'threshold': threshold})
\ No newline at end of file
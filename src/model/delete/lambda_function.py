@@ -1,12 +1,12 @@
 import json
-import boto3
 import os
+from ll_runtime import clients
 
 
 class ModelStatus:
     def __init__(self, name):
-        self.sagemaker = boto3.client("sagemaker", region_name=os.environ.get('AWS_REGION'))
-        self.iam = boto3.client("iam", region_name=os.environ.get('AWS_REGION'))
+        self.sagemaker = clients.client("sagemaker", region_name=os.environ.get('AWS_REGION'))
+        self.iam = clients.client("iam", region_name=os.environ.get('AWS_REGION'))
         self.name = name
 
     def endpoint_in_service(self):
@@ -36,8 +36,8 @@ class ModelStatus:
 def lambda_handler(event, context):
     body = json.loads(event['body'])
     name = body['name']
-    sagemaker = boto3.client('sagemaker')
-    iam = boto3.client('iam')
+    sagemaker = clients.client('sagemaker')
+    iam = clients.client('iam')
 
     status = ModelStatus(name)
     if status.endpoint_in_service():
@@ -1,34 +1,151 @@
+import itertools
 import json
-import boto3
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ll_runtime import endpoints
+from ll_runtime.cache import TieredCache, make_key
+
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', 16))
+GENERATION_CACHE_SIZE = int(os.environ.get('GENERATION_CACHE_SIZE', 1024))
+GENERATION_CACHE_TTL = int(os.environ.get('GENERATION_CACHE_TTL', 86400))
+STREAM_PORT = int(os.environ.get('AWS_LWA_PORT', 8080))
+
+generation_cache = TieredCache(GENERATION_CACHE_SIZE, os.environ.get('CACHE_TABLE_NAME'), GENERATION_CACHE_TTL)
+
+
+SAMPLING_PARAMETERS = ('temperature', 'top_p', 'top_k', 'typical_p')
+
+
+def is_deterministic(parameters):
+    # TGI samples whenever a warper is set, whatever do_sample says
+    if parameters.get('seed') is not None:
+        return True
+    return parameters.get('do_sample') is False and not any(parameters.get(name) is not None for name in SAMPLING_PARAMETERS)
+
+
+def generate(endpoint_name, query, parameters, cache=None):
+    # cache=None caches deterministic requests only, True/False forces the choice
+    use_cache = is_deterministic(parameters) if cache is None else bool(cache)
+    if use_cache:
+        key = make_key(endpoint_name, query, parameters)
+        result = generation_cache.get(key)
+        if result is not None:
+            return result, 'HIT'
+
+    response = endpoints.invoke(endpoint_name, {"inputs": query, "parameters": parameters})
+    result = response[0]["generated_text"]
+    if use_cache:
+        generation_cache.put(key, result)
+        return result, 'MISS'
+    return result, 'BYPASS'
+
+
+def generate_batch(endpoint_name, items, max_workers=BATCH_MAX_WORKERS, cache=None):
+    # TGI has no list-valued "inputs", so the batch fans out as concurrent requests
+    def run(item):
+        try:
+            if isinstance(item, str):
+                item = {'query': item}
+            parameters = dict(item.get('parameters', {}))
+            populate_defaults(parameters)
+            result, cache_status = generate(endpoint_name, item['query'], parameters, item.get('cache', cache))
+            return {'statusCode': 200, 'generated_text': result, 'cache': cache_status}
+        except Exception as e:
+            return {'statusCode': 400, 'error': str(e)}
+
+    if not items:
+        return []
+    workers = max(1, min(int(max_workers), BATCH_MAX_WORKERS, len(items)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run, items))
+
+
+def iter_tokens(event_stream):
+    # TGI sends server-sent events, which SageMaker splits across PayloadParts arbitrarily
+    buffer = b''
+    for event in event_stream:
+        buffer += event.get('PayloadPart', {}).get('Bytes', b'')
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            token = _parse_token(line)
+            if token is not None:
+                yield token
+    token = _parse_token(buffer)
+    if token is not None:
+        yield token
+
+
+def _parse_token(line):
+    line = line.strip()
+    if not line.startswith(b'data:'):
+        return None
+    token = json.loads(line[len(b'data:'):]).get('token') or {}
+    if token.get('special'):
+        return None
+    return token.get('text')
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def stream(endpoint_name, payload):
+    start = time.perf_counter()
+    event_stream = endpoints.invoke_stream(endpoint_name, {**payload, "stream": True})
+
+    time_to_first_token = None
+    tokens = 0
+    for token in iter_tokens(event_stream):
+        if time_to_first_token is None:
+            time_to_first_token = (time.perf_counter() - start) * 1000
+        tokens += 1
+        yield format_event('token', {'text': token})
+    yield format_event('done', {
+        'tokens': tokens,
+        'time_to_first_token_ms': time_to_first_token,
+        'total_ms': (time.perf_counter() - start) * 1000,
+    })
 
 
 def lambda_handler(event, context):
     try:
         body = json.loads(event['body'])
         name = body['name']
+
+        endpoint_name = endpoints.endpoint_name(name)
+        if not endpoints.in_service(endpoint_name):
+            return {
+                'statusCode': 400,
+                'body': json.dumps('LLM not in service')
+            }
+
+        if 'queries' in body:
+            results = generate_batch(endpoint_name, body['queries'], body.get('max_workers', BATCH_MAX_WORKERS),
+                                     body.get('cache'))
+            print(json.dumps({'generation_cache': generation_cache.stats()}))
+            return {
+                'statusCode': 200,
+                'body': json.dumps(results)
+            }
+
         query = body['query']
         parameters = body.get('parameters', {})
-        sagemaker = boto3.client('sagemaker')
-
         populate_defaults(parameters)
 
-        response = sagemaker.list_endpoints(NameContains=f'LLManager-{name}-endpoint', StatusEquals='InService')
-        active =  len(response['Endpoints']) > 0
-        if not active:
+        if body.get('stream', False):
+            # API Gateway buffers whole responses; streams are served by StreamHandler
             return {
                 'statusCode': 400,
-                'body': json.dumps('LLM not in service')
+                'body': json.dumps('stream is served from the model stream function URL')
             }
         else:
-            response = sagemaker.invoke_endpoint(
-                EndpointName=f'LLManager-{name}-endpoint',
-                ContentType='application/json',
-                Accept='application/json',
-                Body=json.dumps({"inputs": query, "parameters": parameters})
-            )
-            result = response[0]["generated_text"]
+            result, cache_status = generate(endpoint_name, query, parameters, body.get('cache'))
+            print(json.dumps({'generation_cache': generation_cache.stats()}))
             return {
                 'statusCode': 200,
+                'headers': {'X-Cache': cache_status},
                 'body': json.dumps(result)
             }
     except Exception as e:
@@ -38,9 +155,72 @@ def lambda_handler(event, context):
         }
 
 def populate_defaults(parameters):
-    if 'temprature' not in parameters:
-        parameters['temperature'] = 0.1
-    if 'top_p' not in parameters:
-        parameters['top_p'] = 0.15
+    # Greedy requests keep no warpers, or TGI would sample them anyway
+    if parameters.get('do_sample') is not False:
+        if 'temprature' not in parameters:
+            parameters['temperature'] = 0.1
+        if 'top_p' not in parameters:
+            parameters['top_p'] = 0.15
     if 'repitition_penalty' not in parameters:
-        parameters['repitition_penalty'] = 1.1
\ No newline at end of file
+        parameters['repitition_penalty'] = 1.1
+
+
+class StreamHandler(BaseHTTPRequestHandler):
+    """Token streaming over HTTP for the Lambda Web Adapter.
+
+    The stream function runs this module as a server behind a RESPONSE_STREAM
+    function URL, so each event reaches the client as soon as it is written.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        # The adapter's readiness check
+        self._send(200, 'ok')
+
+    def do_POST(self):
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            endpoint_name = endpoints.endpoint_name(body['name'])
+            if not endpoints.in_service(endpoint_name):
+                self._send(400, 'LLM not in service')
+                return
+            parameters = body.get('parameters', {})
+            populate_defaults(parameters)
+            events = stream(endpoint_name, {"inputs": body['query'], "parameters": parameters})
+            # Waiting for the first event lets a failed invoke still answer 400
+            first = next(events)
+        except Exception as e:
+            self._send(400, str(e))
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for event in itertools.chain([first], events):
+                self._chunk(event.encode('utf-8'))
+        except Exception as e:
+            self._chunk(format_event('error', {'message': str(e)}).encode('utf-8'))
+        self._chunk(b'')
+
+    def _send(self, status, message):
+        data = json.dumps(message).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chunk(self, data):
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+
+def serve(port=STREAM_PORT):
+    ThreadingHTTPServer(('0.0.0.0', port), StreamHandler).serve_forever()
+
+
+if __name__ == '__main__':
+    serve()
@@ -0,0 +1,3 @@
+#!/bin/bash
+# Entry point of the model stream function under the Lambda Web Adapter
+PYTHONPATH=/opt/python:$PYTHONPATH exec python3 lambda_function.py
@@ -1,11 +1,11 @@
 import os
-import boto3
 import json
+from ll_runtime import clients
 
 class ModelStatus:
     def __init__(self, name):
-        self.sagemaker = boto3.client("sagemaker", region_name=os.environ.get('AWS_REGION'))
-        self.iam = boto3.client("iam", region_name=os.environ.get('AWS_REGION'))
+        self.sagemaker = clients.client("sagemaker", region_name=os.environ.get('AWS_REGION'))
+        self.iam = clients.client("iam", region_name=os.environ.get('AWS_REGION'))
         self.name = name
 
     def endpoint_in_service(self):
@@ -1,18 +1,65 @@
-from requests_aws4auth import AWS4Auth
-from opensearchpy import OpenSearch, RequestsHttpConnection
-import os
 import json
-import boto3
-
-def check_collection_status(name):
-    opensearch = boto3.client('opensearchserverless', region_name=os.environ.get('AWS_REGION'))
-    full_name = 'LLManager-' + name
-    response = opensearch.list_collections(
-        collectionFilters={'name': full_name, 'status': 'ACTIVE'})
-    active_collections = response['collectionSummaries']
-    if len(active_collections) > 0:
-        return active_collections[0]['id']
-    return False
+import os
+from ll_runtime import manifest, opensearch, s3, vectors, vectorstore
+
+def read_documents(bucket, key, source=None):
+    # /vdb/embed writes a binary vector manifest by default, or one
+    # {metadata, embedding} record per line; older outputs are a single
+    # {metadata: [...], embeddings: [...]} document
+    for line in s3.iter_lines(bucket, key):
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if vectors.is_manifest(record):
+            if source is not None and not source.get('uri'):
+                source['uri'] = record.get('source')
+            for matrix, metadata in vectors.read_blocks(bucket, record):
+                for embedding, metadata_item in zip(matrix, metadata):
+                    yield {opensearch.VECTOR_FIELD: embedding, 'metadata': metadata_item}
+            return
+        elif 'embeddings' in record:
+            for embedding, metadata_item in zip(record['embeddings'], record['metadata']):
+                yield {opensearch.VECTOR_FIELD: embedding, 'metadata': metadata_item}
+        else:
+            yield {opensearch.VECTOR_FIELD: record['embedding'], 'metadata': record['metadata']}
+
+class ManifestRecorder:
+    """Records the document ids of each indexed chunk in the source's manifest.
+
+    The source is the text object /vdb/embed read, named by the request's
+    ``source`` or the embed output; without one nothing is recorded.
+    """
+
+    def __init__(self, table_name, name, index, source):
+        self.table_name = table_name
+        self.name = name
+        self.index = index
+        self.source = source
+
+    @property
+    def manifest(self):
+        if not self.table_name or not self.source.get('uri'):
+            return None
+        return manifest.SourceManifest(self.table_name, manifest.source_id(self.name, self.index, self.source['uri']))
+
+    def record(self, docs, doc_ids):
+        source_manifest = self.manifest
+        if source_manifest:
+            indexed = [(manifest.chunk_hash(doc['metadata']), doc_id) for doc, doc_id in zip(docs, doc_ids) if doc_id]
+            source_manifest.record([hash_ for hash_, _ in indexed], [doc_id for _, doc_id in indexed])
+
+    def prune(self, store):
+        # Chunks that a re-embed no longer found are deleted once their replacements are indexed
+        source_manifest = self.manifest
+        if not source_manifest:
+            return {}
+        removed = source_manifest.removed()
+        if not removed:
+            return {'deleted': 0}
+        deleted = store.delete(self.index, [doc_id for _, doc_id in removed])
+        if not deleted['failed']:
+            source_manifest.forget([item_id for item_id, _ in removed])
+        return {'deleted': deleted['deleted']}
 
 def lambda_handler(event, context):
     # extract params
@@ -21,41 +68,31 @@ def lambda_handler(event, context):
     index = body['index']
     s3_src_bucket = body['s3_src_bucket']
     s3_src_key = body['s3_src_key']
+    chunk_size = int(body.get('chunk_size', opensearch.BULK_CHUNK_SIZE))
+    workers = int(body.get('workers', opensearch.BULK_WORKERS))
+
+    try:
+        store = vectorstore.get_store(name)
+        if not store:
+            return {
+                'statusCode': 400,
+                'body': json.dumps('Collection not found')
+            }
 
-    # pull data from S3
-    s3 = boto3.client('s3')
-    response = s3.get_object(Bucket=s3_src_bucket, Key=s3_src_key)
-    data = response['Body'].read().decode('utf-8')
-    
-    # Extract embeddings and data from S3
-    embeddings = data['embeddings']
-    metadata = data['metadata']
-    
-    # Set up AOSS connection
-    region = os.environ.get('AWS_REGION')
-    service = 'aoss'
-    credentials = boto3.Session().get_credentials()
-    awsauth = AWS4Auth(credentials.access_key, credentials.secret_key, region, service, session_token=credentials.token)
-    id = check_collection_status(name)
-    url = f'https://{id}.us-east-1.aoss.amazonaws.com'
-    aws_vector = OpenSearch(
-        hosts = [url],
-        http_auth = awsauth,
-        use_ssl = True,
-        verify_certs = True,
-        http_compress = True,
-        connection_class = RequestsHttpConnection
-    )
-
-    # Upload embeddings and metadata to OpenSearch
-    for embedding, metadata_item in zip(embeddings, metadata):
-        doc = {
-            'embedding': embedding,
-            'metadata': metadata_item
+        # Stream embeddings and metadata from S3 into the store in bulk requests
+        source = {'uri': body.get('source')}
+        recorder = ManifestRecorder(os.environ.get('TABLE_NAME'), name, index, source)
+        summary = store.add(index, read_documents(s3_src_bucket, s3_src_key, source), chunk_size, workers,
+                            recorder.record)
+        summary.update(recorder.prune(store))
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps(str(e))
         }
-        aws_vector.index(index=index, body=doc)
+    print(json.dumps({'bulk_index': summary}))
 
     return {
-        'statusCode': 200,
-        'body': json.dumps('Successfully uploaded embeddings and metadata to OpenSearch serverless collection.')
+        'statusCode': 200 if summary['failed'] == 0 else 207,
+        'body': json.dumps(summary)
     }
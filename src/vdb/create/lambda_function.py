@@ -1,10 +1,10 @@
 import os
-import boto3
 import json
+from ll_runtime import clients
 
 
 def _create_collection(full_name):
-    opensearch = boto3.client('opensearchservice', region_name=os.environ.get('AWS_REGION'))
+    opensearch = clients.client('opensearchserverless', region_name=os.environ.get('AWS_REGION'))
     opensearch.create_collection(
         name=full_name,
         standbyReplicas='DISABLED',
@@ -12,7 +12,7 @@ def _create_collection(full_name):
     )
 
 def _collection_is_up(full_name):
-    opensearch = boto3.client('opensearchserverless', region_name=os.environ.get('AWS_REGION'))
+    opensearch = clients.client('opensearchserverless', region_name=os.environ.get('AWS_REGION'))
     response = opensearch.list_collections(collectionFilters={'name': full_name})
     collections = response['collectionSummaries']
     return len(collections) > 0
@@ -25,7 +25,7 @@ def lambda_handler(event, context):
 
     full_name = 'LLManager-' + name
     if not _collection_is_up(full_name):
-        _create_collection(full_name, full_name) 
+        _create_collection(full_name)
 
     return {
         'statusCode': 200,
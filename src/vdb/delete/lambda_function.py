@@ -1,13 +1,13 @@
 import os
-import boto3
 import json
+from ll_runtime import clients
 
 
 def lambda_handler(event, context):
     body = json.loads(event['body'])
     name = body['name']
     full_name = 'LLManager-' + name
-    opensearch = boto3.client('opensearchserverless', region_name=os.environ.get('AWS_REGION'))
+    opensearch = clients.client('opensearchserverless', region_name=os.environ.get('AWS_REGION'))
     response = opensearch.list_collections(collectionFilters={'name': full_name})
     collections = response['collectionSummaries']
     for collection in collections:
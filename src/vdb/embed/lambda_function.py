@@ -1,17 +1,6 @@
-import os
 import json
-import boto3
-
-def query_model(name, data):
-    lambda_ = boto3.client('lambda')
-    model_lambda = os.environ.get('MODEL_LAMBDA')
-    response = lambda_.invoke(
-        FunctionName=model_lambda,
-        InvocationType='RequestResponse',
-        Payload=json.dumps({'name': name, 'query': data})
-    )
-    embeddings = json.loads(response['Payload'].read())
-    return data, embeddings
+import os
+from ll_runtime import endpoints, pipeline
 
 def lambda_handler(event, context):
     body = json.loads(event['body'])
@@ -21,23 +10,24 @@ def lambda_handler(event, context):
     s3_dest_key = body['s3_dest_key']
     model_name = body['model']
 
-    s3 = boto3.client('s3')
-    response = s3.get_object(Bucket=s3_src_bucket, Key=s3_src_key)
-    data = response['Body'].read().decode('utf-8')
-    pages = data.split('\n')
-    embeddings = []
-    metadata = []
-    for page in pages:
-        query, embedding = query_model(model_name, page)
-        metadata.append(query)
-        embeddings.append(embedding)
-    result = {
-        'metadata': metadata,
-        'embeddings': embeddings
-    }
-    s3.put_object(Bucket=s3_dest_bucket, Key=s3_dest_key, Body=json.dumps(result))
+    endpoint_name = endpoints.endpoint_name(model_name)
+    if not endpoints.in_service(endpoint_name):
+        return {
+            'statusCode': 400,
+            'body': json.dumps('Embedding model not in service')
+        }
+
+    try:
+        stats = pipeline.embed_object(endpoint_name, s3_src_bucket, s3_src_key, s3_dest_bucket, s3_dest_key, body,
+                                      os.environ.get('TABLE_NAME'))
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps(str(e))
+        }
+    print(json.dumps({'embed': stats}))
 
     return {
         'statusCode': 200,
-        'body': json.dumps('VDB Embed!')
-    }
\ No newline at end of file
+        'body': json.dumps(stats)
+    }
@@ -0,0 +1,48 @@
+import json
+import os
+from ll_runtime import endpoints, ingest, jobs
+
+def not_found(job_id):
+    return {
+        'statusCode': 400,
+        'body': json.dumps(f'Job {job_id} not found')
+    }
+
+def lambda_handler(event, context):
+    body = json.loads(event['body'])
+    table_name = os.environ['JOBS_TABLE_NAME']
+    route = event.get('resource', '/vdb/ingest').rstrip('/').rsplit('/', 1)[-1]
+
+    if route == 'status':
+        result = jobs.status(table_name, body['job_id'])
+        if result is None:
+            return not_found(body['job_id'])
+        return {
+            'statusCode': 200,
+            'body': json.dumps(result)
+        }
+
+    kinds = ingest.kinds(os.environ.get('TABLE_NAME'))
+    queue = jobs.get_queue(table_name, kinds)
+    if route == 'retry':
+        result = jobs.retry(table_name, queue, body['job_id'])
+        if result is None:
+            return not_found(body['job_id'])
+    else:
+        endpoint_name = endpoints.endpoint_name(body['model'])
+        if not endpoints.in_service(endpoint_name):
+            return {
+                'statusCode': 400,
+                'body': json.dumps('Embedding model not in service')
+            }
+        options = {key: value for key, value in body.items()
+                   if key not in ('s3_src_bucket', 's3_src_prefix', 's3_dest_bucket', 's3_dest_prefix', 'model')}
+        result = ingest.start(table_name, queue, kinds, body['s3_src_bucket'], body['s3_src_prefix'], body['s3_dest_bucket'],
+                              body['s3_dest_prefix'], endpoint_name, options)
+    queue.join()
+    print(json.dumps({'ingest': result}))
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps(result)
+    }
@@ -0,0 +1,6 @@
+import os
+from ll_runtime import ingest, jobs, queues
+
+def lambda_handler(event, context):
+    return jobs.work(os.environ['JOBS_TABLE_NAME'], queues.get_queue(None), ingest.kinds(os.environ.get('TABLE_NAME')),
+                     event['Records'], os.environ.get('DEAD_LETTER_QUEUE_ARN'))
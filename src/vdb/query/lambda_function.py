@@ -1,77 +1,133 @@
-import boto3
-from requests_aws4auth import AWS4Auth
-from opensearchpy import OpenSearch, RequestsHttpConnection
 import os
 import json
+import re
+import numpy as np
+from botocore.exceptions import ClientError
+from opensearchpy import TransportError
+from ll_runtime import embeddings, endpoints, opensearch, vectorstore
+from ll_runtime.cache import TieredCache, make_key
+
+EMBEDDING_CACHE_SIZE = int(os.environ.get('EMBEDDING_CACHE_SIZE', 4096))
+EMBEDDING_CACHE_TTL = int(os.environ.get('EMBEDDING_CACHE_TTL', 86400))
+MAX_QUERIES = int(os.environ.get('MAX_QUERIES', 32))
+
+embedding_cache = TieredCache(EMBEDDING_CACHE_SIZE, os.environ.get('CACHE_TABLE_NAME'), EMBEDDING_CACHE_TTL)
+
+
+def normalize(text):
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def cached_embedding(model, query):
+    vectors, statuses = cached_embeddings(model, [query])
+    return vectors[0], statuses[0]
+
+
+def cached_embeddings(model, queries):
+    # Vectors are kept as little-endian float32 bytes, well under a quarter of their JSON size.
+    # Misses are embedded in one request straight against the model endpoint
+    keys = [make_key(model, normalize(query)) for query in queries]
+    values = {}
+    statuses = []
+    for key in keys:
+        if key not in values:
+            values[key] = embedding_cache.get(key)
+        statuses.append('MISS' if values[key] is None else 'HIT')
+
+    missing = [key for key in dict.fromkeys(keys) if values[key] is None]
+    if missing:
+        texts = [queries[keys.index(key)] for key in missing]
+        for key, vector in zip(missing, embeddings.embed_with_retry(endpoints.endpoint_name(model), texts)):
+            values[key] = np.asarray(vector, dtype='<f4').tobytes()
+            embedding_cache.put(key, values[key])
+    return [np.frombuffer(values[key], dtype='<f4').tolist() for key in keys], statuses
+
+
+def run_queries(store, model, index, queries, body):
+    if not 0 < len(queries) <= MAX_QUERIES:
+        raise ValueError(f'queries must contain between 1 and {MAX_QUERIES} entries')
+    vectors, statuses = cached_embeddings(model, queries)
+    print(json.dumps({'embedding_cache': embedding_cache.stats()}))
+    responses = store.msearch(index, vectors, body.get('k', 10), body.get('size'), body.get('ef_search'), body.get('filter'))
+
+    results = []
+    for query, status, response in zip(queries, statuses, responses):
+        if 'error' in response:
+            results.append({'query': query, 'statusCode': response['status'], 'error': response['error']})
+        else:
+            results.append({'query': query, 'statusCode': 200, 'cache': status,
+                            'results': [hit['metadata'] for hit in response['hits']]})
+    return results
+
+
+def error_response(e):
+    # The embedding endpoint's or the collection's own 4xx are passed on, other failures are a bad gateway
+    if isinstance(e, ClientError):
+        status = opensearch.response_status(e.response.get('ResponseMetadata', {}).get('HTTPStatusCode'))
+        message = e.response['Error'].get('Message') or e.response['Error']['Code']
+    else:
+        status = opensearch.error_status(e)
+        message = e.info if isinstance(e.info, dict) else str(e)
+    return {
+        'statusCode': status,
+        'body': json.dumps(message)
+    }
 
-def get_embedding(name, query):
-    lambda_ = boto3.client('lambda')
-    model_lambda = os.environ.get('MODEL_LAMBDA')
-    response = lambda_.invoke(
-        FunctionName=model_lambda,
-        InvocationType='RequestResponse',
-        Payload=json.dumps({'name': name, 'query': query})
-    )
-    embedding = json.loads(response['Payload'].read())
-    return embedding
 
 def lambda_handler(event, context):
     # Extract params
     body = json.loads(event['body'])
     name = body['name']
     index = body['index']
-    query = body['query']
-
-    # Get embedding
-    query_embedding = get_embedding(name, query)
-
-    # Set up AOSS connection
-    region = os.environ.get('AWS_REGION')
-    service = 'aoss'
-    credentials = boto3.Session().get_credentials()
-    awsauth = AWS4Auth(credentials.access_key, credentials.secret_key, region, service, session_token=credentials.token)
-    id = check_collection_status(name)
-    url = f'https://{id}.us-east-1.aoss.amazonaws.com'
-    aws_vector = OpenSearch(
-        hosts=[url],
-        http_auth=awsauth,
-        use_ssl=True,
-        verify_certs=True,
-        http_compress=True,
-        connection_class=RequestsHttpConnection
-    )
-
-    # Query the vector database
-    query = {
-        "size": 10,
-        "query": {
-            "knn": {
-                "embedding": {
-                    "vector": query_embedding,
-                    "k": 10
-                }
+    model = body.get('model', name)
+
+    try:
+        store = vectorstore.get_store(name)
+        if not store:
+            return {
+                'statusCode': 400,
+                'body': json.dumps('Collection not found')
+            }
+        if not endpoints.in_service(endpoints.endpoint_name(model)):
+            return {
+                'statusCode': 400,
+                'body': json.dumps('Embedding model not in service')
+            }
+
+        if 'queries' in body:
+            results = run_queries(store, model, index, body['queries'], body)
+            return {
+                'statusCode': 200,
+                'body': json.dumps(results)
             }
+
+        # Get embedding
+        query_embedding, cache_status = cached_embedding(model, body['query'])
+        print(json.dumps({'embedding_cache': embedding_cache.stats()}))
+
+        # Query the vector database
+        k, size = vectorstore.check_page(body.get('k', 10), body.get('size'))
+        hits = store.search(index, query_embedding, k, size, body.get('ef_search'), body.get('filter'),
+                            body.get('search_after'))
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps(str(e))
         }
-    }
-    response = aws_vector.search(index=index, body=query)
+    except (ClientError, TransportError) as e:
+        return error_response(e)
 
     # Extract results
-    results = []
-    for hit in response['hits']['hits']:
-        metadata = hit['_source']['metadata']
-        results.append(metadata)
+    results = [hit['metadata'] for hit in hits]
+
+    headers = {'X-Embedding-Cache': cache_status}
+    # A full page of fewer than k may have more neighbours behind it; pass this back as search_after.
+    # The search never returns more than k, so there is nothing after a page of all of them
+    if hits and len(hits) == size < k:
+        headers['X-Search-After'] = json.dumps(hits[-1]['sort'])
 
     return {
         'statusCode': 200,
+        'headers': headers,
         'body': json.dumps(results)
     }
-
-def check_collection_status(name):
-    opensearch = boto3.client('opensearchserverless', region_name=os.environ.get('AWS_REGION'))
-    full_name = 'LLManager-' + name
-    response = opensearch.list_collections(
-        collectionFilters={'name': full_name, 'status': 'ACTIVE'})
-    active_collections = response['collectionSummaries']
-    if len(active_collections) > 0:
-        return active_collections[0]['id']
-    return False
\ No newline at end of file
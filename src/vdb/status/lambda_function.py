@@ -1,12 +1,12 @@
 import json
-import boto3
 import os
+from ll_runtime import clients
 
 
 def lambda_handler(event, context):
     body = json.loads(event['body'])
     name = body['name']
-    opensearch = boto3.client('opensearchserverless', region_name=os.environ.get('AWS_REGION'))
+    opensearch = clients.client('opensearchserverless', region_name=os.environ.get('AWS_REGION'))
     full_name = 'LLManager-' + name
     response = opensearch.list_collections(
         collectionFilters={'name': full_name, 'status': 'ACTIVE'})
@@ -0,0 +1,66 @@
+import os
+import sys
+
+import boto3
+import pytest
+from moto import mock_aws
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src', 'layers', 'boto3', 'python'))
+
+from ll_runtime import clients, collections, endpoints, history, opensearch, vectorstore  # noqa: E402
+
+TURNS_TABLE = 'chatHistoryTurnsTable'
+
+
+@pytest.fixture(autouse=True)
+def aws_environment(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_SESSION_TOKEN', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('AWS_REGION', 'us-east-1')
+    for module in (clients, collections, endpoints, opensearch, vectorstore):
+        module.reset()
+    yield
+    for module in (clients, collections, endpoints, opensearch, vectorstore):
+        module.reset()
+
+
+@pytest.fixture
+def aws_clients():
+    """Register local stand-ins in place of the shared AWS clients."""
+    def use(service, fake, region_name=None):
+        clients._clients[(service, region_name)] = fake
+        return fake
+    return use
+
+
+def create_turns_table(name):
+    """A chat history turns table, with the idle index the archive reads."""
+    boto3.client('dynamodb').create_table(
+        TableName=name, BillingMode='PAY_PER_REQUEST',
+        KeySchema=[{'AttributeName': 'id', 'KeyType': 'HASH'}, {'AttributeName': 'turn', 'KeyType': 'RANGE'}],
+        AttributeDefinitions=[{'AttributeName': 'id', 'AttributeType': 'S'}, {'AttributeName': 'turn', 'AttributeType': 'N'},
+                              {'AttributeName': 'idle_shard', 'AttributeType': 'N'},
+                              {'AttributeName': 'last_active', 'AttributeType': 'N'}],
+        GlobalSecondaryIndexes=[{'IndexName': history.IDLE_INDEX, 'Projection': {'ProjectionType': 'KEYS_ONLY'},
+                                 'KeySchema': [{'AttributeName': 'idle_shard', 'KeyType': 'HASH'},
+                                               {'AttributeName': 'last_active', 'KeyType': 'RANGE'}]}])
+    return boto3.resource('dynamodb').Table(name)
+
+
+@pytest.fixture
+def turns_table(monkeypatch):
+    """The history Lambdas' ``TABLE_NAME``, in a mocked account."""
+    monkeypatch.setenv('TABLE_NAME', TURNS_TABLE)
+    with mock_aws():
+        yield create_turns_table(TURNS_TABLE)
+
+
+def create_jobs_table(name):
+    """A jobs table, see ll_runtime.jobs."""
+    boto3.client('dynamodb').create_table(
+        TableName=name, BillingMode='PAY_PER_REQUEST',
+        KeySchema=[{'AttributeName': 'job_id', 'KeyType': 'HASH'}, {'AttributeName': 'task', 'KeyType': 'RANGE'}],
+        AttributeDefinitions=[{'AttributeName': 'job_id', 'AttributeType': 'S'}, {'AttributeName': 'task', 'AttributeType': 'S'}])
+    return boto3.resource('dynamodb').Table(name)
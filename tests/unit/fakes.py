@@ -0,0 +1,151 @@
+import io
+import json
+
+from botocore.exceptions import ClientError
+
+from ll_runtime import opensearch
+
+
+def client_error(code, operation, message=''):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+class FakeSageMaker:
+    def __init__(self, endpoints=None):
+        self.endpoints = dict(endpoints or {})
+        self.describe_calls = 0
+
+    def describe_endpoint(self, EndpointName):
+        self.describe_calls += 1
+        if EndpointName not in self.endpoints:
+            raise client_error('ValidationException', 'DescribeEndpoint', f'Could not find endpoint "{EndpointName}".')
+        return {'EndpointName': EndpointName, 'EndpointStatus': self.endpoints[EndpointName]}
+
+
+class FakeSageMakerRuntime:
+    def __init__(self, handler=None, record=True):
+        self.handler = handler or (lambda endpoint, payload: [{'generated_text': payload['inputs'] + '!'}])
+        self.record = record
+        self.calls = []
+
+    def invoke_endpoint(self, EndpointName, Body, **kwargs):
+        payload = json.loads(Body)
+        if self.record:
+            self.calls.append((EndpointName, payload))
+        result = self.handler(EndpointName, payload)
+        if isinstance(result, Exception):
+            raise result
+        return {'Body': io.BytesIO(json.dumps(result).encode('utf-8'))}
+
+    def invoke_endpoint_with_response_stream(self, EndpointName, Body, **kwargs):
+        payload = json.loads(Body)
+        self.calls.append((EndpointName, payload))
+        result = self.handler(EndpointName, payload)
+        if isinstance(result, Exception):
+            raise result
+        return {'Body': fake_event_stream(result[0]['generated_text'].split(' '))}
+
+
+def fake_event_stream(tokens, part_size=7):
+    """TGI style server-sent events, split into PayloadParts mid-line."""
+    events = [{'token': {'id': i, 'text': text, 'special': False}, 'generated_text': None} for i, text in enumerate(tokens)]
+    events.append({'token': {'id': len(tokens), 'text': '</s>', 'special': True}, 'generated_text': ' '.join(tokens)})
+    data = b''.join(b'data:' + json.dumps(event).encode('utf-8') + b'\n\n' for event in events)
+    for start in range(0, len(data), part_size):
+        yield {'PayloadPart': {'Bytes': data[start:start + part_size]}}
+
+
+def fake_embedding(text):
+    return [float(len(text)), float(sum(map(ord, text)) % 97), 1.0]
+
+
+class FakeEmbeddingRuntime(FakeSageMakerRuntime):
+    def __init__(self, failures=0, record=True):
+        super().__init__(self.respond, record)
+        self.failures = failures
+
+    def respond(self, endpoint, payload):
+        if self.failures:
+            self.failures -= 1
+            return client_error('ThrottlingException', 'InvokeEndpoint')
+        return {'embedding': [fake_embedding(text) for text in payload['text_inputs']]}
+
+
+class FakeOpenSearchServerless:
+    def __init__(self, collections=None):
+        self.collections = dict(collections or {})
+        self.calls = 0
+
+    def batch_get_collection(self, names):
+        self.calls += 1
+        return {'collectionDetails': [{
+            'id': self.collections[name],
+            'name': name,
+            'status': 'ACTIVE',
+            'arn': f'arn:aws:aoss:eu-west-2:123456789012:collection/{self.collections[name]}',
+            'collectionEndpoint': f'https://{self.collections[name]}.eu-west-2.aoss.amazonaws.com',
+        } for name in names if name in self.collections]}
+
+
+class FakeOpenSearch:
+    """Records bulk requests and answers them, failing items chosen by ``fail``."""
+
+    def __init__(self, fail=None):
+        self.fail = fail or (lambda doc, attempt: None)
+        self.documents = {}
+        self.bulk_requests = 0
+        self.attempts = {}
+        self.searches = []
+        self.msearch_requests = 0
+        self.scores = {}
+
+    def bulk(self, body):
+        self.bulk_requests += 1
+        items = []
+        body = iter(body)
+        for action in body:
+            if 'delete' in action:
+                doc_id = action['delete']['_id']
+                status = 200 if self.documents.pop(doc_id, None) else 404
+                items.append({'delete': {'_id': doc_id, 'status': status}})
+                continue
+            doc = next(body)
+            key = json.dumps(doc['metadata'], sort_keys=True)
+            attempt = self.attempts[key] = self.attempts.get(key, 0) + 1
+            status = self.fail(doc, attempt)
+            if status:
+                items.append({'index': {'status': status, 'error': {'type': f'error_{status}'}}})
+            else:
+                doc_id = f'doc-{len(self.documents)}'
+                self.documents[doc_id] = (action['index']['_index'], doc)
+                items.append({'index': {'_id': doc_id, 'status': 201}})
+        return {'errors': any(next(iter(item.values()))['status'] >= 300 for item in items), 'items': items}
+
+    def search(self, index, body):
+        self.searches.append((index, body))
+        docs = [(doc_id, doc) for doc_id, (doc_index, doc) in self.documents.items() if doc_index == index]
+        includes = body.get('_source', {}).get('includes')
+        tiebreak = any(opensearch.DOC_KEY_FIELD in sort for sort in body.get('sort', []))
+        hits = []
+        for rank, (doc_id, doc) in enumerate(docs[:body['query']['knn']['embedding']['k']]):
+            score = self.scores.get(doc_id, 1.0 / (rank + 1))
+            doc_key = doc.get(opensearch.DOC_KEY_FIELD, doc_id)
+            hits.append({'_id': doc_id, '_score': score, 'sort': [score, doc_key] if tiebreak else [score],
+                         '_source': {key: value for key, value in doc.items() if includes is None or key in includes}})
+
+        def key(sort):
+            return (-sort[0], *sort[1:])
+        hits.sort(key=lambda hit: key(hit['sort']))
+        if 'search_after' in body:
+            hits = [hit for hit in hits if key(hit['sort']) > key(body['search_after'])]
+        return {'hits': {'hits': hits[:body.get('size', 10)]}}
+
+    def msearch(self, body):
+        self.msearch_requests += 1
+        responses = []
+        for header, search in zip(body[::2], body[1::2]):
+            try:
+                responses.append(dict(self.search(header['index'], search), status=200))
+            except KeyError as e:
+                responses.append({'status': 400, 'error': {'type': 'parsing_exception', 'reason': str(e)}})
+        return {'responses': responses}
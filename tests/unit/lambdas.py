@@ -0,0 +1,13 @@
+import importlib.util
+import os
+
+SRC = os.path.join(os.path.dirname(__file__), '..', '..', 'src')
+
+
+def load_lambda(path):
+    """Import ``src/<path>/lambda_function.py`` under a unique module name."""
+    module_name = 'lambda_' + path.replace('/', '_')
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(SRC, path, 'lambda_function.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,36 @@
+import boto3
+from moto import mock_aws
+
+from ll_runtime.cache import LRUCache, TieredCache, make_key
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+
+
+def test_key_ignores_parameter_order():
+    assert make_key('e', 'q', {'a': 1, 'b': 2}) == make_key('e', 'q', {'b': 2, 'a': 1})
+
+
+@mock_aws
+def test_dynamodb_tier_is_shared_between_environments():
+    boto3.client('dynamodb').create_table(
+        TableName='cache', BillingMode='PAY_PER_REQUEST',
+        KeySchema=[{'AttributeName': 'id', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'id', 'AttributeType': 'S'}])
+
+    TieredCache(8, 'cache').put('text', 'generated')
+    TieredCache(8, 'cache').put('bytes', b'\x00\x01')
+
+    cold = TieredCache(8, 'cache')
+    assert cold.get('text') == 'generated'
+    assert cold.get('bytes') == b'\x00\x01'
+    assert cold.get('text') == 'generated'
+    assert cold.get('missing') is None
+    assert cold.stats() == {'hits': 3, 'local_hits': 1, 'remote_hits': 2, 'misses': 1, 'errors': 0, 'size': 2}
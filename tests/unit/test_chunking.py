@@ -0,0 +1,33 @@
+import pytest
+
+from ll_runtime import chunking
+
+
+def test_line_chunks_drop_blank_lines():
+    assert list(chunking.chunk(['  to be ', '', '   ', 'or not'])) == ['to be', 'or not']
+
+
+def test_character_windows_overlap_across_lines():
+    chunks = list(chunking.chunk(['abcdef', 'ghij'], 'chars', size=5, overlap=2))
+    assert chunks == ['abcde', 'def\ng', 'ghij']
+    assert list(chunking.chunk(['abcd'], 'chars', size=5)) == ['abcd']
+
+
+def test_token_windows_overlap_and_keep_the_tail():
+    lines = ['one two three', 'four five six seven']
+    assert list(chunking.chunk(lines, 'tokens', size=3, overlap=1)) == [
+        'one two three', 'three four five', 'five six seven']
+    assert list(chunking.chunk(lines, 'tokens', size=4, overlap=1)) == ['one two three four', 'four five six seven']
+
+
+def test_invalid_options_are_rejected_before_reading():
+    with pytest.raises(ValueError):
+        chunking.chunk(iter([]), 'tokens', size=4, overlap=4)
+    with pytest.raises(ValueError):
+        chunking.chunk(iter([]), 'sentences')
+
+
+def test_drop_duplicates_counts_what_it_drops():
+    stats = {}
+    assert list(chunking.drop_duplicates(['a', 'b', 'a', 'a'], stats)) == ['a', 'b']
+    assert stats == {'duplicates_dropped': 2}
@@ -0,0 +1,14 @@
+from ll_runtime import clients
+
+
+def test_clients_are_created_once_and_reused():
+    first = clients.client('s3')
+    assert clients.client('s3') is first
+    assert clients.client('s3', region_name='eu-west-1') is not first
+    assert clients.table('chatHistoryTable') is clients.table('chatHistoryTable')
+
+
+def test_clients_use_pooled_adaptive_config():
+    config = clients.client('dynamodb').meta.config
+    assert config.retries['mode'] == 'adaptive'
+    assert config.max_pool_connections == clients.MAX_POOL_CONNECTIONS
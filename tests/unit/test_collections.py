@@ -0,0 +1,30 @@
+import pytest
+
+from ll_runtime import collections
+from tests.unit.fakes import FakeOpenSearchServerless
+
+
+@pytest.fixture
+def aoss(aws_clients):
+    return aws_clients('opensearchserverless', FakeOpenSearchServerless({'LLManager-docs': 'abc123'}), region_name='us-east-1')
+
+
+def test_resolves_real_endpoint_and_region(aoss):
+    collection = collections.resolve('docs')
+    assert collection.id == 'abc123'
+    assert collection.endpoint == 'https://abc123.eu-west-2.aoss.amazonaws.com'
+    assert collection.region == 'eu-west-2'
+
+
+def test_lookups_are_cached_including_misses(aoss):
+    for _ in range(3):
+        assert collections.resolve('docs').id == 'abc123'
+        assert collections.resolve('missing') is None
+    assert aoss.calls == 2
+
+
+def test_entries_expire(aoss, monkeypatch):
+    monkeypatch.setattr(collections, 'COLLECTION_CACHE_TTL', 0)
+    collections.resolve('docs')
+    collections.resolve('docs')
+    assert aoss.calls == 2
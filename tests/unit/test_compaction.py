@@ -0,0 +1,110 @@
+import json
+
+import boto3
+import pytest
+from boto3.dynamodb.types import TypeSerializer
+
+from ll_runtime import compaction, history
+from tests.unit.conftest import TURNS_TABLE as TABLE
+from tests.unit.fakes import FakeSageMaker, FakeSageMakerRuntime
+from tests.unit.lambdas import load_lambda
+
+
+@pytest.fixture
+def conversation(turns_table, aws_clients, monkeypatch):
+    monkeypatch.setenv('COMPACTION_MODEL', 'summarizer')
+    monkeypatch.setattr(compaction, 'COMPACT_AFTER_TURNS', 5)
+    monkeypatch.setattr(compaction, 'COMPACT_AFTER_CHARS', 1000)
+    monkeypatch.setattr(compaction, 'KEEP_RECENT_TURNS', 2)
+    aws_clients('sagemaker', FakeSageMaker({'LLManager-summarizer-endpoint': 'InService'}))
+    model = aws_clients('sagemaker-runtime', FakeSageMakerRuntime(
+        lambda endpoint, payload: [{'generated_text': f' summary {payload["inputs"].count("User:")} '}]))
+    conversation_id = history.create(TABLE, 'q1', 'a1')
+    return conversation_id, model
+
+
+def append(conversation_id, *turns):
+    for turn in turns:
+        history.append(TABLE, conversation_id, f'q{turn}', f'a{turn}')
+
+
+def stream(conversation_id):
+    """Run the compact Lambda on the stream record of the conversation's head item."""
+    head = boto3.resource('dynamodb').Table(TABLE).get_item(Key={'id': conversation_id, 'turn': history.HEAD})['Item']
+    image = {key: TypeSerializer().serialize(value) for key, value in head.items()}
+    record = {'eventName': 'MODIFY', 'dynamodb': {'Keys': {'id': image['id'], 'turn': image['turn']}, 'NewImage': image}}
+    load_lambda('history/compact').lambda_handler({'Records': [record, record]}, None)
+
+
+def get(**body):
+    response = load_lambda('history/get').lambda_handler({'body': json.dumps(body)}, None)
+    return response['statusCode'], json.loads(response['body'])
+
+
+def test_appends_never_call_the_model(conversation):
+    conversation_id, model = conversation
+    append(conversation_id, *range(2, 10))
+    assert model.calls == []
+
+
+def test_older_turns_are_folded_into_a_rolling_summary(conversation):
+    conversation_id, model = conversation
+    append(conversation_id, *range(2, 5))
+    stream(conversation_id)
+    assert model.calls == []
+
+    append(conversation_id, 5)
+    stream(conversation_id)
+    assert len(model.calls) == 1
+    assert get(id=conversation_id, summary=True) == (200, {
+        'summary': 'summary 3', 'turns': [{'q': 'q4', 'a': 'a4'}, {'q': 'q5', 'a': 'a5'}]})
+
+    append(conversation_id, *range(6, 10))
+    stream(conversation_id)
+    prompt = model.calls[-1][1]['inputs']
+    assert 'Summary so far:\nsummary 3' in prompt and 'q7' in prompt and 'q8' not in prompt
+    _, body = get(id=conversation_id, summary=True)
+    assert body == {'summary': 'summary 4', 'turns': [{'q': 'q8', 'a': 'a8'}, {'q': 'q9', 'a': 'a9'}]}
+
+    # Plain reads still return every turn
+    assert len(get(id=conversation_id)[1]) == 9
+
+
+def test_long_turns_trigger_compaction_by_size(conversation):
+    conversation_id, model = conversation
+    history.append(TABLE, conversation_id, 'q2', 'x' * 1000)
+    append(conversation_id, 3)
+    stream(conversation_id)
+    assert get(id=conversation_id, summary=True)[1] == {
+        'summary': 'summary 1', 'turns': [{'q': 'q2', 'a': 'x' * 1000}, {'q': 'q3', 'a': 'a3'}]}
+
+
+def test_summary_counts_towards_the_budget(conversation):
+    conversation_id, model = conversation
+    append(conversation_id, *range(2, 6))
+    stream(conversation_id)
+    _, body = get(id=conversation_id, summary=True, max_chars=len('summary 3') + 4)
+    assert body == {'summary': 'summary 3', 'turns': [{'q': 'q5', 'a': 'a5'}]}
+    assert get(id=conversation_id, summary=True, before_turn=3)[0] == 400
+
+
+def test_conversations_without_a_summary_return_all_turns(conversation):
+    conversation_id, model = conversation
+    assert get(id=conversation_id, summary=True) == (200, {'summary': None, 'turns': [{'q': 'q1', 'a': 'a1'}]})
+
+
+def test_gaps_left_by_failed_appends_are_skipped(conversation):
+    conversation_id, model = conversation
+    append(conversation_id, 2, 3)
+    # Turns 4 and 5 were handed out but never written
+    boto3.resource('dynamodb').Table(TABLE).update_item(Key={'id': conversation_id, 'turn': history.HEAD},
+                                                        UpdateExpression='ADD turns :two, gaps :two',
+                                                        ExpressionAttributeValues={':two': 2})
+    append(conversation_id, 6)
+    stream(conversation_id)
+    assert model.calls == []
+
+    append(conversation_id, 7)
+    stream(conversation_id)
+    assert get(id=conversation_id, summary=True)[1] == {
+        'summary': 'summary 3', 'turns': [{'q': 'q6', 'a': 'a6'}, {'q': 'q7', 'a': 'a7'}]}
@@ -0,0 +1,224 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+import pytest
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from ll_runtime import compression, history
+from tests.unit.lambdas import load_lambda
+
+
+@pytest.fixture
+def tables(turns_table, monkeypatch):
+    monkeypatch.setenv('LEGACY_TABLE_NAME', 'chatHistoryTable')
+    boto3.client('dynamodb').create_table(
+        TableName='chatHistoryTable', BillingMode='PAY_PER_REQUEST',
+        KeySchema=[{'AttributeName': 'id', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'id', 'AttributeType': 'S'}])
+    return boto3.resource('dynamodb').Table('chatHistoryTable')
+
+
+def call(path, **body):
+    response = load_lambda(f'history/{path}').lambda_handler({'body': json.dumps(body)}, None)
+    return response['statusCode'], json.loads(response['body'])
+
+
+def test_conversations_are_stored_one_item_per_turn(tables):
+    _, created = call('new', q='hi', a='hello')
+    call('append', id=created['id'], q='how are you', a='fine')
+
+    code, chat = call('get', id=created['id'])
+    assert code == 200
+    assert chat == [{'q': 'hi', 'a': 'hello'}, {'q': 'how are you', 'a': 'fine'}]
+
+    items = boto3.resource('dynamodb').Table('chatHistoryTurnsTable').scan()['Items']
+    assert sorted(int(item['turn']) for item in items) == [0, 1, 2]
+
+
+class SerializedTable:
+    """A table whose calls run one at a time, as DynamoDB applies each write atomically and moto does not."""
+
+    def __init__(self, table):
+        self.table = table
+        self.meta = table.meta
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        method = getattr(self.table, name)
+
+        def call(*args, **kwargs):
+            with self.lock:
+                return method(*args, **kwargs)
+        return call
+
+
+def test_concurrent_appends_keep_every_turn(tables, monkeypatch):
+    table = SerializedTable(boto3.resource('dynamodb').Table('chatHistoryTurnsTable'))
+    monkeypatch.setattr(history.clients, 'table', lambda name: table)
+    conversation_id = history.create('chatHistoryTurnsTable', 'q0', 'a0')
+    with ThreadPoolExecutor(8) as pool:
+        turns = list(pool.map(lambda i: history.append('chatHistoryTurnsTable', conversation_id, f'q{i}', f'a{i}'),
+                              range(1, 21)))
+    assert sorted(turns) == list(range(2, 22))
+    chat = history.turns('chatHistoryTurnsTable', conversation_id)
+    assert sorted(entry['q'] for entry in chat) == sorted(f'q{i}' for i in range(21))
+
+
+def test_taken_turns_are_retried_and_left_as_gaps(tables):
+    table = boto3.resource('dynamodb').Table('chatHistoryTurnsTable')
+    conversation_id = history.create('chatHistoryTurnsTable', 'q1', 'a1')
+    # A turn written behind the head's back, as an append racing a restore could
+    table.put_item(Item={'id': conversation_id, 'turn': 2, 'q': 'q2', 'a': 'a2'})
+
+    assert history.append('chatHistoryTurnsTable', conversation_id, 'q3', 'a3') == 3
+    head = table.get_item(Key={'id': conversation_id, 'turn': history.HEAD})['Item']
+    assert (head['turns'], head['gaps'], head['chars']) == (3, 1, len('q1a1q3a3'))
+    assert [entry['q'] for entry in history.turns('chatHistoryTurnsTable', conversation_id)] == ['q1', 'q2', 'q3']
+
+
+def test_failed_writes_leave_gaps_that_reads_skip(tables, monkeypatch):
+    table = boto3.resource('dynamodb').Table('chatHistoryTurnsTable')
+    conversation_id = history.create('chatHistoryTurnsTable', 'q1', 'a1')
+    put_item = table.put_item
+
+    def unavailable(**kwargs):
+        raise ClientError({'Error': {'Code': 'InternalServerError', 'Message': 'unavailable'}}, 'PutItem')
+
+    monkeypatch.setattr(history.clients, 'table', lambda name: table)
+    monkeypatch.setattr(table, 'put_item', unavailable)
+    with pytest.raises(ClientError):
+        history.append('chatHistoryTurnsTable', conversation_id, 'lost', 'turn')
+    monkeypatch.setattr(table, 'put_item', put_item)
+    for turn in range(3, 6):
+        history.append('chatHistoryTurnsTable', conversation_id, f'q{turn}', f'a{turn}')
+
+    head = table.get_item(Key={'id': conversation_id, 'turn': history.HEAD})['Item']
+    assert (head['turns'], head['gaps'], head['chars']) == (5, 1, 4 * len('q1a1'))
+    code, chat, cursor = get(id=conversation_id, last_n=2)
+    assert [entry['q'] for entry in chat] == ['q4', 'q5'] and cursor == '4'
+    _, chat, cursor = get(id=conversation_id, last_n=2, before_turn=int(cursor))
+    assert [entry['q'] for entry in chat] == ['q1', 'q3'] and cursor is None
+
+
+def test_unknown_conversations_are_rejected(tables):
+    assert call('get', id='missing') == (400, 'Conversation not found')
+    assert call('append', id='missing', q='q', a='a') == (400, 'Conversation not found')
+
+
+def test_legacy_conversations_are_migrated_when_first_touched(tables):
+    tables.put_item(Item={'id': 'old', 'chat': [{'q': 'q1', 'a': 'a1'}, {'q': 'q2', 'a': 'a2'}]})
+    call('append', id='old', q='q3', a='a3')
+    assert call('get', id='old') == (200, [{'q': f'q{i}', 'a': f'a{i}'} for i in (1, 2, 3)])
+
+    tables.put_item(Item={'id': 'read', 'chat': [{'q': 'q1', 'a': 'a1'}]})
+    assert call('get', id='read') == (200, [{'q': 'q1', 'a': 'a1'}])
+
+
+def test_migration_copies_legacy_conversations_once(tables):
+    for i in range(5):
+        tables.put_item(Item={'id': f'c{i}', 'chat': [{'q': f'q{turn}', 'a': f'a{turn}'} for turn in range(i + 1)]})
+    history.migrate('chatHistoryTurnsTable', 'chatHistoryTable', 'c0')
+    history.append('chatHistoryTurnsTable', 'c0', 'new', 'turn')
+
+    migrate = load_lambda('history/migrate')
+    result = migrate.lambda_handler({'segment': 0, 'total_segments': 1}, None)
+    assert (result['migrated'], result['skipped'], result['start_key']) == (4, 1, None)
+    assert migrate.lambda_handler({}, None)['skipped'] == 5
+
+    assert history.turns('chatHistoryTurnsTable', 'c4') == [{'q': f'q{turn}', 'a': f'a{turn}'} for turn in range(5)]
+    assert history.turns('chatHistoryTurnsTable', 'c0') == [{'q': 'q0', 'a': 'a0'}, {'q': 'new', 'a': 'turn'}]
+
+
+def get(**body):
+    response = load_lambda('history/get').lambda_handler({'body': json.dumps(body)}, None)
+    return response['statusCode'], json.loads(response['body']), response.get('headers', {}).get('X-Before-Turn')
+
+
+@pytest.fixture
+def conversation(tables):
+    conversation_id = history.create('chatHistoryTurnsTable', 'q1', 'a1')
+    for turn in range(2, 11):
+        history.append('chatHistoryTurnsTable', conversation_id, f'q{turn}', 'a' * turn)
+    return conversation_id
+
+
+def test_last_n_pages_backwards_with_a_before_turn_cursor(conversation):
+    code, chat, cursor = get(id=conversation, last_n=3)
+    assert code == 200
+    assert [entry['q'] for entry in chat] == ['q8', 'q9', 'q10'] and cursor == '8'
+
+    _, chat, cursor = get(id=conversation, last_n=3, before_turn=int(cursor))
+    assert [entry['q'] for entry in chat] == ['q5', 'q6', 'q7'] and cursor == '5'
+
+    _, chat, cursor = get(id=conversation, before_turn=3)
+    assert [entry['q'] for entry in chat] == ['q1', 'q2'] and cursor is None
+    assert get(id=conversation, before_turn=1)[1:] == ([], None)
+
+
+def test_budget_keeps_the_newest_turns_that_fit(conversation):
+    # turn n costs len('qn') + n characters and 2 tokens
+    _, chat, cursor = get(id=conversation, max_chars=3 + 10 + 2 + 9 + 2 + 8)
+    assert [entry['q'] for entry in chat] == ['q8', 'q9', 'q10'] and cursor == '8'
+
+    _, chat, _ = get(id=conversation, max_tokens=9)
+    assert [entry['q'] for entry in chat] == ['q7', 'q8', 'q9', 'q10']
+
+    _, chat, cursor = get(id=conversation, max_chars=5)
+    assert (chat, cursor) == ([], '10')
+    _, chat, cursor = get(id=conversation, max_chars=12, before_turn=int(cursor))
+    assert [entry['q'] for entry in chat] == ['q9'] and cursor == '9'
+
+
+def test_windowed_reads_fetch_only_what_they_return(conversation, monkeypatch):
+    table = boto3.resource('dynamodb').Table('chatHistoryTurnsTable')
+    queries = []
+    monkeypatch.setattr(history.clients, 'table', lambda name: table)
+    original = table.meta.client.query
+
+    def query(**kwargs):
+        response = original(**kwargs)
+        queries.append((kwargs, len(response['Items'])))
+        return response
+
+    monkeypatch.setattr(table.meta.client, 'query', query)
+    history.read('chatHistoryTurnsTable', conversation, last_n=2)
+    assert len(queries) == 1 and queries[0][1] == 3
+    assert queries[0][0]['ProjectionExpression'] == 'turn, q, a, p, c'
+
+
+@pytest.mark.parametrize('options', [{'last_n': 0}, {'before_turn': -1}, {'max_chars': 'ten'}, {'max_tokens': True}])
+def test_invalid_windows_are_rejected(conversation, options):
+    code, message, _ = get(id=conversation, **options)
+    assert code == 400 and 'positive integer' in message
+
+
+def test_long_turns_are_stored_compressed_and_short_ones_plain(tables, monkeypatch):
+    answer = 'Context: the quick brown fox jumps over the lazy dog. ' * 40
+    conversation_id = history.create('chatHistoryTurnsTable', 'hi', 'hello')
+    history.append('chatHistoryTurnsTable', conversation_id, 'summarize', answer)
+    monkeypatch.setattr(history, 'HISTORY_CODEC', None)
+    history.append('chatHistoryTurnsTable', conversation_id, 'again', answer)
+
+    items = boto3.resource('dynamodb').Table('chatHistoryTurnsTable').query(
+        KeyConditionExpression=Key('id').eq(conversation_id))['Items']
+    short, compressed, plain = items[1:]
+    assert short['q'] == 'hi' and 'p' not in short
+    assert compressed['c'] == 'zlib' and 'a' not in compressed and len(compressed['p'].value) < len(answer) / 10
+    assert plain['a'] == answer
+
+    assert history.turns('chatHistoryTurnsTable', conversation_id) == [
+        {'q': 'hi', 'a': 'hello'}, {'q': 'summarize', 'a': answer}, {'q': 'again', 'a': answer}]
+
+
+def test_zstd_records_are_read_back():
+    pytest.importorskip('zstandard')
+    item = {'p': compression.compress(json.dumps({'q': 'q', 'a': 'a' * 500}).encode('utf-8'), 'zstd'), 'c': 'zstd'}
+    assert history.decode(item) == {'q': 'q', 'a': 'a' * 500}
+
+
+def test_unknown_codecs_are_rejected():
+    with pytest.raises(ValueError):
+        compression.compress(b'data', 'lz4')
@@ -0,0 +1,95 @@
+import gzip
+import json
+import time
+
+import boto3
+import pytest
+from boto3.dynamodb.conditions import Key
+
+from ll_runtime import history
+from tests.unit.conftest import TURNS_TABLE as TABLE
+from tests.unit.lambdas import load_lambda
+
+
+@pytest.fixture
+def tables(turns_table, monkeypatch):
+    monkeypatch.setenv('HISTORY_ARCHIVE_BUCKET', 'archive')
+    monkeypatch.setattr(history, 'HISTORY_ARCHIVE_BUCKET', 'archive')
+    boto3.client('s3').create_bucket(Bucket='archive')
+    return turns_table
+
+
+def items(table, conversation_id):
+    return table.query(KeyConditionExpression=Key('id').eq(conversation_id))['Items']
+
+
+def idle(table, conversation_id, days):
+    table.update_item(Key={'id': conversation_id, 'turn': history.HEAD}, UpdateExpression='SET last_active = :then',
+                      ExpressionAttributeValues={':then': int(time.time() - days * 86400)})
+
+
+def test_only_the_head_expires(tables):
+    conversation_id = history.create(TABLE, 'q1', 'a1')
+    history.append(TABLE, conversation_id, 'q2', 'a2' * 200)
+    horizon = time.time() + history.HISTORY_TTL_DAYS * 86400
+    head, *turns = items(tables, conversation_id)
+    assert head['turn'] == history.HEAD and abs(int(head['expires_at']) - horizon) < 60
+    assert len(turns) == 2 and not any('expires_at' in turn for turn in turns)
+
+
+def test_idle_conversations_move_to_s3_and_come_back_on_demand(tables):
+    old = history.create(TABLE, 'q1', 'a1')
+    history.append(TABLE, old, 'q2', 'long answer ' * 50)
+    recent = history.create(TABLE, 'hi', 'hello')
+    idle(tables, old, 45)
+
+    assert load_lambda('history/archive').lambda_handler({}, None) == {'archived': 1, 'skipped': 0}
+    assert items(tables, old) == [] and len(items(tables, recent)) == 2
+
+    body = boto3.client('s3').get_object(Bucket='archive', Key=history.archive_key(old))['Body'].read()
+    records = [json.loads(line) for line in gzip.decompress(body).decode('utf-8').splitlines()]
+    assert records == [{'turn': 0, 'turns': 2, 'chars': 4 + 2 + 600},
+                       {'turn': 1, 'q': 'q1', 'a': 'a1'}, {'turn': 2, 'q': 'q2', 'a': 'long answer ' * 50}]
+
+    response = load_lambda('history/get').lambda_handler({'body': json.dumps({'id': old})}, None)
+    assert json.loads(response['body']) == [{'q': 'q1', 'a': 'a1'}, {'q': 'q2', 'a': 'long answer ' * 50}]
+    assert history.append(TABLE, old, 'q3', 'a3') == 3
+    assert load_lambda('history/archive').lambda_handler({}, None) == {'archived': 0, 'skipped': 0}
+
+
+def test_appending_to_an_archived_conversation_rehydrates_it(tables):
+    conversation_id = history.create(TABLE, 'q1', 'a1')
+    idle(tables, conversation_id, 45)
+    load_lambda('history/archive').lambda_handler({'days': 30}, None)
+
+    response = load_lambda('history/append').lambda_handler(
+        {'body': json.dumps({'id': conversation_id, 'q': 'q2', 'a': 'a2'})}, None)
+    assert response['statusCode'] == 200
+    assert history.turns(TABLE, conversation_id) == [{'q': 'q1', 'a': 'a1'}, {'q': 'q2', 'a': 'a2'}]
+
+
+def test_conversations_active_since_they_were_read_are_not_archived(tables):
+    conversation_id = history.create(TABLE, 'q1', 'a1')
+    history.append(TABLE, conversation_id, 'q2', 'a2')
+    assert not history.archive(TABLE, 'archive', conversation_id, 0)
+    assert len(items(tables, conversation_id)) == 3
+
+
+def test_appends_while_archiving_keep_the_conversation_whole(tables, monkeypatch):
+    conversation_id = history.create(TABLE, 'q1', 'a1')
+    for turn in range(2, 6):
+        history.append(TABLE, conversation_id, f'q{turn}', f'a{turn}')
+    idle(tables, conversation_id, 45)
+    last_active = tables.get_item(Key={'id': conversation_id, 'turn': history.HEAD})['Item']['last_active']
+    monkeypatch.setattr(history, 'TRANSACT_WRITE_SIZE', 3)
+    monkeypatch.setattr(history.clients, 'table', lambda name: tables)
+    transact_write_items = tables.meta.client.transact_write_items
+
+    def append_in_between(**kwargs):
+        transact_write_items(**kwargs)
+        monkeypatch.setattr(tables.meta.client, 'transact_write_items', transact_write_items)
+        history.append(TABLE, conversation_id, 'q6', 'a6')
+
+    monkeypatch.setattr(tables.meta.client, 'transact_write_items', append_in_between)
+    assert not history.archive(TABLE, 'archive', conversation_id, last_active)
+    assert history.turns(TABLE, conversation_id) == [{'q': f'q{turn}', 'a': f'a{turn}'} for turn in range(1, 7)]
@@ -0,0 +1,153 @@
+import json
+
+import boto3
+import pytest
+
+from ll_runtime import batch, bulk_jobs, clients, history, queues, transfer
+from tests.unit.conftest import TURNS_TABLE as TABLE, create_jobs_table, create_turns_table
+from tests.unit.lambdas import load_lambda
+
+
+JOBS_TABLE = 'chatHistoryJobsTable'
+
+
+@pytest.fixture
+def bulk(turns_table, monkeypatch):
+    monkeypatch.setenv('JOBS_TABLE_NAME', JOBS_TABLE)
+    # Tasks run one at a time: moto does not apply the job counters' ADDs atomically across threads
+    monkeypatch.setattr(queues, 'LOCAL_QUEUE_WORKERS', 1)
+    create_jobs_table(JOBS_TABLE)
+    s3 = boto3.client('s3')
+    s3.create_bucket(Bucket='exports')
+    module = load_lambda('history/bulk')
+
+    def call(route, **body):
+        response = module.lambda_handler({'resource': f'/history/{route}', 'body': json.dumps(body)}, None)
+        return response['statusCode'], json.loads(response['body'])
+
+    yield call, s3
+
+
+def run_job(call, route, **body):
+    code, job = call(route, **body)
+    assert code == 200 and job['status'] == 'running'
+    code, stats = call('status', job_id=job['job_id'])
+    assert code == 200
+    return stats
+
+
+def test_import_writes_conversations_in_batches(bulk):
+    call, s3 = bulk
+    lines = [{'id': f'c{i}', 'chat': [{'q': f'q{turn}', 'a': f'a{turn}' * 100} for turn in range(3)]} for i in range(20)]
+    lines.append({'chat': [{'q': 'no id', 'a': 'given'}]})
+    s3.put_object(Bucket='exports', Key='chats.jsonl', Body='\n'.join(json.dumps(line) for line in lines).encode('utf-8'))
+
+    stats = run_job(call, 'import', s3_src_bucket='exports', s3_src_key='chats.jsonl', workers=4)
+    assert (stats['kind'], stats['status'], stats['succeeded'], stats['pending']) == ('import', 'succeeded', 1, 0)
+    assert (stats['lines'], stats['conversations'], stats['items']) == (21, 21, 20 * 4 + 2)
+    assert stats['requests'] == 4
+    assert history.turns(TABLE, 'c7') == lines[7]['chat']
+    assert history.append(TABLE, 'c7', 'q3', 'a3') == 4
+
+
+def test_repeated_keys_in_one_import_keep_the_last_write(turns_table):
+    lines = [{'id': 'c1', 'turn': 1, 'q': 'old', 'a': 'answer'}, {'id': 'c1', 'turn': 0, 'turns': 1, 'chars': 9},
+             {'id': 'c1', 'turn': 1, 'q': 'new', 'a': 'answer'}]
+    stats = transfer.import_lines(TABLE, [json.dumps(line) for line in lines])
+    assert (stats['lines'], stats['items'], stats['requests']) == (3, 2, 1)
+    assert history.turns(TABLE, 'c1') == [{'q': 'new', 'a': 'answer'}]
+
+
+def test_export_round_trips_through_import(bulk):
+    call, s3 = bulk
+    ids = [history.create(TABLE, f'q{i}', f'a{i}') for i in range(30)]
+    for conversation_id in ids[:10]:
+        history.append(TABLE, conversation_id, 'long', 'answer ' * 100)
+
+    stats = run_job(call, 'export', s3_dest_bucket='exports', s3_dest_prefix='export/', segments=4)
+    assert (stats['kind'], stats['status'], stats['total']) == ('export', 'succeeded', 4)
+    assert stats['items'] == 30 * 2 + 10 and sorted(stats['objects']) == [f'export/part-{i:05}.jsonl' for i in range(4)]
+    lines = [line for key in stats['objects']
+             for line in s3.get_object(Bucket='exports', Key=key)['Body'].read().decode('utf-8').splitlines()]
+    assert len(lines) == stats['items'] and stats['bytes'] == sum(len(line.encode('utf-8')) + 1 for line in lines)
+    assert {'id': ids[0], 'turn': 2, 'q': 'long', 'a': 'answer ' * 100} in map(json.loads, lines)
+
+    create_turns_table('restored')
+    s3.put_object(Bucket='exports', Key='all.jsonl', Body='\n'.join(lines).encode('utf-8'))
+    stats = transfer.import_object('restored', 'exports', 'all.jsonl')
+    assert (stats['items'], stats['conversations']) == (70, 30)
+    for conversation_id in ids:
+        assert history.turns('restored', conversation_id) == history.turns(TABLE, conversation_id)
+
+
+def test_malformed_lines_fail_the_job(bulk):
+    call, s3 = bulk
+    s3.put_object(Bucket='exports', Key='bad.jsonl', Body=b'{"chat": [{"q": "q", "a": "a"}]}\n{"id": "x"}\n')
+    stats = run_job(call, 'import', s3_src_bucket='exports', s3_src_key='bad.jsonl')
+    assert (stats['status'], stats['failed']) == ('failed', 1)
+    assert stats['failures'][0]['task'] == 'bad.jsonl' and stats['failures'][0]['error'].startswith('ValueError: line 2')
+
+    assert call('export', s3_dest_bucket='exports', segments=bulk_jobs.MAX_EXPORT_SEGMENTS + 1)[0] == 400
+    assert call('status', job_id='missing') == (400, 'Job missing not found')
+
+
+def test_workers_run_queued_tasks_and_report_dead_letters(bulk, monkeypatch):
+    call, s3 = bulk
+    sqs = boto3.client('sqs')
+    url = sqs.create_queue(QueueName='bulk')['QueueUrl']
+    dead_letters = 'arn:aws:sqs:us-east-1:123456789012:bulk-dlq'
+    monkeypatch.setenv('QUEUE_URL', url)
+    monkeypatch.setenv('DEAD_LETTER_QUEUE_ARN', dead_letters)
+    history.create(TABLE, 'q', 'a')
+
+    code, job = call('export', s3_dest_bucket='exports', s3_dest_prefix='export/', segments=2)
+    assert call('status', job_id=job['job_id'])[1]['pending'] == 2
+    messages = sqs.receive_message(QueueUrl=url, MaxNumberOfMessages=10)['Messages']
+    records = sorted(({'messageId': message['MessageId'], 'body': message['Body']} for message in messages),
+                     key=lambda record: json.loads(record['body'])['task'])
+    worker = load_lambda('history/bulk_worker')
+    assert worker.lambda_handler({'Records': records[:1] * 2}, None) == {'batchItemFailures': []}
+    assert worker.lambda_handler({'Records': [dict(records[1], eventSourceARN=dead_letters)]}, None) == {
+        'batchItemFailures': []}
+
+    _, stats = call('status', job_id=job['job_id'])
+    assert (stats['status'], stats['succeeded'], stats['failed']) == ('failed', 1, 1)
+    assert stats['objects'] == ['export/part-00000.jsonl'] and stats['items'] == len(
+        s3.get_object(Bucket='exports', Key='export/part-00000.jsonl')['Body'].read().splitlines())
+    assert stats['failures'] == [{'task': '00001', 'error': 'Moved to the dead-letter queue after repeated failed deliveries'}]
+
+
+class ThrottledDynamoDB:
+    """Leaves every other item of a request unprocessed the first ``throttled`` times."""
+
+    def __init__(self, throttled):
+        self.throttled = throttled
+        self.written = []
+        self.requests = 0
+
+    def batch_write_item(self, RequestItems):
+        self.requests += 1
+        (table, requests), = RequestItems.items()
+        assert len(requests) <= batch.BATCH_WRITE_SIZE
+        if self.throttled:
+            self.throttled -= 1
+            self.written += requests[::2]
+            return {'UnprocessedItems': {table: requests[1::2]}}
+        self.written += requests
+        return {'UnprocessedItems': {}}
+
+
+def test_unprocessed_items_are_retried_with_backoff(monkeypatch):
+    monkeypatch.setattr(batch, 'BATCH_WRITE_BACKOFF', 0)
+    dynamodb = clients._resources[('dynamodb', None)] = ThrottledDynamoDB(throttled=3)
+    with batch.BatchWriter('table', workers=1) as writer:
+        for i in range(30):
+            writer.put({'id': str(i)})
+    assert sorted(int(request['PutRequest']['Item']['id']) for request in dynamodb.written) == list(range(30))
+    assert writer.stats == {'items': 30, 'requests': dynamodb.requests, 'retried': 12 + 6 + 3}
+
+    dynamodb.throttled = 10
+    with pytest.raises(RuntimeError):
+        with batch.BatchWriter('table', workers=1, retries=2) as writer:
+            for i in range(8):
+                writer.put({'id': str(i)})
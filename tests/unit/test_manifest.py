@@ -0,0 +1,81 @@
+import json
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from ll_runtime import embeddings, manifest, vectorstore
+from tests.unit.fakes import FakeEmbeddingRuntime, FakeSageMaker
+from tests.unit.lambdas import load_lambda
+
+
+@pytest.fixture
+def ingest(aws_clients, tmp_path, monkeypatch):
+    monkeypatch.setenv('TABLE_NAME', 'vdbLifecycleTable')
+    monkeypatch.setattr(embeddings, 'EMBED_BACKOFF', 0)
+    monkeypatch.setattr(vectorstore, 'VECTOR_STORE_PATH', str(tmp_path))
+    monkeypatch.setattr(vectorstore, 'VECTOR_STORE_BACKEND', 'local')
+    with mock_aws():
+        boto3.client('dynamodb').create_table(
+            TableName='vdbLifecycleTable', BillingMode='PAY_PER_REQUEST',
+            KeySchema=[{'AttributeName': 'id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': name, 'AttributeType': 'S'}
+                                  for name in ('id', 'source_id', 'chunk_hash')],
+            GlobalSecondaryIndexes=[{'IndexName': manifest.SOURCE_INDEX, 'Projection': {'ProjectionType': 'ALL'},
+                                     'KeySchema': [{'AttributeName': 'source_id', 'KeyType': 'HASH'},
+                                                   {'AttributeName': 'chunk_hash', 'KeyType': 'RANGE'}]}])
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket='docs')
+        aws_clients('sagemaker', FakeSageMaker({'LLManager-gte-endpoint': 'InService'}))
+        runtime = aws_clients('sagemaker-runtime', FakeEmbeddingRuntime())
+        store = vectorstore.get_store('vdb', 'local')
+        store.create_index('idx', {'mappings': {'properties': {'embedding': {'type': 'knn_vector', 'dimension': 3}}}})
+        embed, add = load_lambda('vdb/embed'), load_lambda('vdb/add')
+
+        def run(text, index=True):
+            s3.put_object(Bucket='docs', Key='play.txt', Body=text.encode('utf-8'))
+            runtime.calls.clear()
+            target = {'name': 'vdb', 'index': 'idx'}
+            embedded = embed.lambda_handler({'body': json.dumps({
+                **target, 's3_src_bucket': 'docs', 's3_src_key': 'play.txt', 's3_dest_bucket': 'docs',
+                's3_dest_key': 'play.vectors', 'model': 'gte'})}, None)
+            added = index and add.lambda_handler({'body': json.dumps({
+                **target, 's3_src_bucket': 'docs', 's3_src_key': 'play.vectors'})}, None)
+            sent = [text for _, payload in runtime.calls for text in payload['text_inputs']]
+            return json.loads(embedded['body']), added and json.loads(added['body']), sent
+
+        yield run, store
+
+
+def test_reingestion_embeds_only_changed_chunks_and_deletes_removed_ones(ingest):
+    run, store = ingest
+    embedded, added, sent = run('to be\nor not\nto be\nthat is')
+    assert sent == ['to be', 'or not', 'that is']
+    assert added['indexed'] == 4 and added['deleted'] == 0
+
+    embedded, added, sent = run('to be\nthat is\nthe question')
+    assert sent == ['the question']
+    assert embedded['unchanged'] == 2 and embedded['removed'] == 1
+    assert added['indexed'] == 1 and added['deleted'] == 1
+
+    hits = store.search('idx', [1.0, 1.0, 1.0], k=10)
+    assert sorted(hit['metadata'] for hit in hits) == ['that is', 'the question', 'to be', 'to be']
+
+    source = manifest.SourceManifest('vdbLifecycleTable', manifest.source_id('vdb', 'idx', 's3://docs/play.txt'))
+    assert source.removed() == []
+    assert len(source.chunks()) == 3
+
+
+def test_chunks_that_reappear_before_pruning_are_indexed_again(ingest):
+    run, store = ingest
+    run('to be\nor not')
+    embedded, _, _ = run('to be', index=False)
+    assert embedded['removed'] == 1
+
+    embedded, added, sent = run('to be\nor not')
+    assert sent == ['or not'] and embedded['removed'] == 0
+    assert added['indexed'] == 1 and added['deleted'] == 1
+    assert sorted(hit['metadata'] for hit in store.search('idx', [1.0, 1.0, 1.0], k=10)) == ['or not', 'to be']
+
+    source = manifest.SourceManifest('vdbLifecycleTable', manifest.source_id('vdb', 'idx', 's3://docs/play.txt'))
+    assert source.removed() == [] and len(source.chunks()) == 2
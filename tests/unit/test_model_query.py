@@ -0,0 +1,193 @@
+import http.client
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from ll_runtime import endpoints
+from tests.unit.fakes import FakeSageMaker, FakeSageMakerRuntime, client_error
+from tests.unit.lambdas import load_lambda
+
+ENDPOINT = 'LLManager-llm-endpoint'
+
+
+@pytest.fixture
+def query(aws_clients):
+    module = load_lambda('model/query')
+    module.sagemaker = aws_clients('sagemaker', FakeSageMaker({ENDPOINT: 'InService'}))
+    module.runtime = aws_clients('sagemaker-runtime', FakeSageMakerRuntime())
+    return module
+
+
+def call(module, **body):
+    return module.lambda_handler({'body': json.dumps(body)}, None)
+
+
+def test_endpoint_state_is_cached_across_invocations(query):
+    for _ in range(3):
+        response = call(query, name='llm', query='hello')
+        assert response['statusCode'] == 200
+        assert json.loads(response['body']) == 'hello!'
+    assert query.sagemaker.describe_calls == 1
+    assert len(query.runtime.calls) == 3
+
+
+def test_missing_endpoint_is_negatively_cached(query):
+    for _ in range(2):
+        response = call(query, name='missing', query='hello')
+        assert response['statusCode'] == 400
+        assert json.loads(response['body']) == 'LLM not in service'
+    assert query.sagemaker.describe_calls == 1
+    assert query.runtime.calls == []
+
+
+def test_cache_expires_after_ttl(query, monkeypatch):
+    monkeypatch.setattr(endpoints, 'ENDPOINT_CACHE_TTL', 0)
+    call(query, name='llm', query='hello')
+    call(query, name='llm', query='hello')
+    assert query.sagemaker.describe_calls == 2
+
+
+def test_invoke_validation_error_invalidates_cache(query):
+    call(query, name='llm', query='hello')
+    query.runtime.handler = lambda endpoint, payload: client_error('ValidationError', 'InvokeEndpoint', 'Endpoint not found')
+    response = call(query, name='llm', query='hello')
+    assert response['statusCode'] == 400
+    assert ENDPOINT not in endpoints._endpoint_state
+
+    query.sagemaker.endpoints.clear()
+    response = call(query, name='llm', query='hello')
+    assert json.loads(response['body']) == 'LLM not in service'
+    assert query.sagemaker.describe_calls == 2
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split('\n\n'):
+        event, data = block.split('\n')
+        events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+@pytest.fixture
+def stream_server(query):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), query.StreamHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def post(port, **body):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    connection.request('POST', '/', json.dumps(body), {'Content-Type': 'application/json'})
+    return connection.getresponse()
+
+
+def test_stream_forwards_tokens_and_reports_time_to_first_token(query, stream_server):
+    response = post(stream_server, name='llm', query='the quick brown fox')
+    assert response.status == 200
+    assert response.getheader('Content-Type') == 'text/event-stream'
+
+    events = parse_events(response.read().decode('utf-8'))
+    assert [data['text'] for event, data in events if event == 'token'] == ['the', 'quick', 'brown', 'fox!']
+    event, done = events[-1]
+    assert event == 'done'
+    assert done['tokens'] == 4
+    assert 0 <= done['time_to_first_token_ms'] <= done['total_ms']
+    assert query.runtime.calls[0][1]['stream'] is True
+
+
+def test_stream_sends_tokens_before_generation_finishes(query, stream_server):
+    released = threading.Event()
+
+    def generate(EndpointName, Body, **kwargs):
+        def parts():
+            for text in ('hello', 'world'):
+                yield {'PayloadPart': {'Bytes': b'data:' + json.dumps({'token': {'text': text, 'special': False}}).encode() + b'\n\n'}}
+                assert released.wait(5)
+        return {'Body': parts()}
+    query.runtime.invoke_endpoint_with_response_stream = generate
+
+    response = post(stream_server, name='llm', query='hi')
+    assert response.readline() == b'event: token\n'
+    assert json.loads(response.readline()[len(b'data: '):]) == {'text': 'hello'}
+    released.set()
+    assert [data for event, data in parse_events(response.read().decode('utf-8')) if event == 'token'] == [{'text': 'world'}]
+
+
+def test_stream_errors_before_the_first_token_are_reported(query, stream_server):
+    response = post(stream_server, name='missing', query='hello')
+    assert (response.status, json.loads(response.read())) == (400, 'LLM not in service')
+
+    query.runtime.handler = lambda endpoint, payload: client_error('ModelError', 'InvokeEndpoint', 'input too long')
+    response = post(stream_server, name='llm', query='hello')
+    assert response.status == 400 and 'input too long' in json.loads(response.read())
+
+
+def test_api_gateway_does_not_buffer_streams(query):
+    response = call(query, name='llm', query='hello', stream=True)
+    assert response['statusCode'] == 400
+    assert query.runtime.calls == []
+
+
+def test_batch_returns_ordered_results_with_per_item_status(query):
+    def handler(endpoint, payload):
+        if payload['inputs'] == 'bad':
+            return client_error('ModelError', 'InvokeEndpoint', 'input too long')
+        return [{'generated_text': payload['inputs'].upper()}]
+    query.runtime.handler = handler
+
+    queries = [f'prompt {i}' for i in range(20)]
+    queries[7] = 'bad'
+    queries[3] = {'query': 'custom', 'parameters': {'max_new_tokens': 5}}
+    response = call(query, name='llm', queries=queries, max_workers=4)
+    assert response['statusCode'] == 200
+
+    results = json.loads(response['body'])
+    assert len(results) == 20
+    assert results[0] == {'statusCode': 200, 'generated_text': 'PROMPT 0', 'cache': 'BYPASS'}
+    assert results[3]['generated_text'] == 'CUSTOM'
+    assert results[7]['statusCode'] == 400 and 'input too long' in results[7]['error']
+    assert all(result['statusCode'] == 200 for i, result in enumerate(results) if i != 7)
+    assert query.sagemaker.describe_calls == 1
+    custom = next(payload for _, payload in query.runtime.calls if payload['inputs'] == 'custom')
+    assert custom['parameters']['max_new_tokens'] == 5
+    assert custom['parameters']['top_p'] == 0.15
+
+
+def test_deterministic_requests_hit_generation_cache(query):
+    parameters = {'do_sample': False}
+    first = call(query, name='llm', query='faq', parameters=parameters)
+    second = call(query, name='llm', query='faq', parameters=parameters)
+    assert first['headers']['X-Cache'] == 'MISS'
+    assert second['headers']['X-Cache'] == 'HIT'
+    assert json.loads(second['body']) == 'faq!'
+    assert len(query.runtime.calls) == 1
+
+    call(query, name='llm', query='faq', parameters={'do_sample': False, 'max_new_tokens': 10})
+    sampled = call(query, name='llm', query='faq')
+    assert sampled['headers']['X-Cache'] == 'BYPASS'
+    assert len(query.runtime.calls) == 3
+    assert query.generation_cache.stats()['hits'] == 1
+    assert query.generation_cache.stats()['misses'] == 2
+
+
+def test_requests_with_sampling_warpers_are_not_deterministic(query):
+    greedy = call(query, name='llm', query='faq', parameters={'do_sample': False})
+    assert greedy['headers']['X-Cache'] == 'MISS'
+    assert 'temperature' not in query.runtime.calls[0][1]['parameters'] and 'top_p' not in query.runtime.calls[0][1]['parameters']
+
+    for parameters in ({'do_sample': False, 'temperature': 0.7}, {'do_sample': False, 'top_k': 5}):
+        for _ in range(2):
+            assert call(query, name='llm', query='faq', parameters=parameters)['headers']['X-Cache'] == 'BYPASS'
+    for _ in range(2):
+        seeded = call(query, name='llm', query='faq', parameters={'seed': 7})
+    assert seeded['headers']['X-Cache'] == 'HIT'
+
+
+def test_callers_can_opt_in_to_caching_sampled_requests(query):
+    for _ in range(2):
+        call(query, name='llm', query='dashboard', cache=True)
+    assert len(query.runtime.calls) == 1
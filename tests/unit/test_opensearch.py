@@ -0,0 +1,72 @@
+import pytest
+from botocore.credentials import RefreshableCredentials
+from opensearchpy import RequestsHttpConnection, Urllib3HttpConnection
+
+from ll_runtime import clients, opensearch
+from ll_runtime.collections import Collection
+
+COLLECTION = Collection('abc', 'LLManager-docs', 'https://abc.eu-west-2.aoss.amazonaws.com', 'eu-west-2')
+
+
+def test_client_is_reused_per_endpoint_and_backend():
+    client = opensearch.get_client(COLLECTION)
+    assert opensearch.get_client(COLLECTION) is client
+    assert isinstance(client.transport.get_connection(), Urllib3HttpConnection)
+
+    requests_client = opensearch.get_client(COLLECTION, backend='requests')
+    assert requests_client is not client
+    assert isinstance(requests_client.transport.get_connection(), RequestsHttpConnection)
+
+
+def test_signer_reads_rotating_credentials_per_request(monkeypatch):
+    rotations = iter([('first', '2000-01-01T00:00:00Z'), ('second', '2999-01-01T00:00:00Z')])
+
+    def refresh():
+        access_key, expiry_time = next(rotations)
+        return {'access_key': access_key, 'secret_key': 'secret', 'token': 'token', 'expiry_time': expiry_time}
+
+    credentials = RefreshableCredentials.create_from_metadata(refresh(), refresh, 'test')
+    monkeypatch.setattr(clients.session(), 'get_credentials', lambda: credentials)
+    signer = opensearch.get_client(COLLECTION).transport.kwargs['http_auth']
+
+    headers = signer('GET', 'https://abc.eu-west-2.aoss.amazonaws.com/_search', None)
+    assert 'Credential=second/' in headers['Authorization']
+    assert '/eu-west-2/aoss/' in headers['Authorization']
+
+
+def test_index_body_names_the_vector_field_consistently():
+    body = opensearch.knn_index_body(768, engine='faiss', space_type='innerproduct', m=32, ef_construction=256,
+                                     encoder='sq_fp16')
+    field = body['mappings']['properties'][opensearch.VECTOR_FIELD]
+    assert field['method'] == {'name': 'hnsw', 'engine': 'faiss', 'space_type': 'innerproduct', 'parameters': {
+        'm': 32, 'ef_construction': 256, 'encoder': {'name': 'sq', 'parameters': {'type': 'fp16'}}}}
+    assert opensearch.knn_query([0.0], 10, 10)['query']['knn'].keys() == {opensearch.VECTOR_FIELD}
+    assert body['mappings']['properties'][opensearch.DOC_KEY_FIELD] == {'type': 'keyword'}
+
+    assert opensearch.knn_index_body(8, engine='lucene', data_type='byte')['mappings']['properties']['embedding'][
+        'data_type'] == 'byte'
+    assert opensearch.knn_index_body(model_id='ivfpq')['mappings']['properties']['embedding'] == {
+        'type': 'knn_vector', 'model_id': 'ivfpq'}
+
+
+def test_encoder_must_match_engine():
+    with pytest.raises(ValueError):
+        opensearch.knn_index_body(8, engine='lucene', encoder='sq_fp16')
+    with pytest.raises(ValueError):
+        opensearch.knn_index_body(8, engine='annoy')
+
+
+def test_ef_search_and_data_type_must_match_engine():
+    assert opensearch.knn_index_body(8, engine='nmslib', ef_search=128)['mappings']['properties']['embedding'][
+        'method']['parameters'] == {'ef_search': 128}
+    with pytest.raises(ValueError):
+        opensearch.knn_index_body(8, engine='lucene', ef_search=128)
+
+    assert opensearch.knn_index_body(8, engine='faiss', space_type='hamming', data_type='binary')
+    for engine, space_type, data_type in (('nmslib', 'l2', 'byte'), ('faiss', 'cosinesimil', 'byte'),
+                                          ('lucene', 'hamming', 'binary'), ('faiss', 'l2', 'int8')):
+        with pytest.raises(ValueError):
+            opensearch.knn_index_body(8, engine=engine, space_type=space_type, data_type=data_type)
+    with pytest.raises(ValueError):
+        opensearch.knn_index_body(8, engine='faiss', encoder='sq_fp16', data_type='byte')
+
@@ -0,0 +1,81 @@
+import json
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from ll_runtime import opensearch, vectors
+from tests.unit.fakes import FakeOpenSearch, FakeOpenSearchServerless
+from tests.unit.lambdas import load_lambda
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(opensearch, 'BULK_BACKOFF', 0)
+
+
+def docs(count):
+    return [{'embedding': [float(i), 1.0], 'metadata': f'line {i}'} for i in range(count)]
+
+
+def test_bulk_index_chunks_requests():
+    client = FakeOpenSearch()
+    summary = opensearch.bulk_index(client, 'idx', iter(docs(1050)), chunk_size=100, workers=3)
+    assert summary['indexed'] == 1050 and summary['failed'] == 0
+    assert summary['requests'] == client.bulk_requests == 11
+    assert sorted(doc['metadata'] for _, doc in client.documents.values()) == sorted(f'line {i}' for i in range(1050))
+    assert len({doc[opensearch.DOC_KEY_FIELD] for _, doc in client.documents.values()}) == 1050
+
+
+def test_bulk_index_retries_only_failed_items():
+    def fail(doc, attempt):
+        if doc['metadata'] in ('line 3', 'line 7') and attempt == 1:
+            return 429
+        if doc['metadata'] == 'line 9':
+            return 400
+    client = FakeOpenSearch(fail)
+    summary = opensearch.bulk_index(client, 'idx', docs(10), chunk_size=10, workers=1)
+    assert summary['indexed'] == 9 and summary['failed'] == 1
+    assert summary['errors'] == [{'type': 'error_400'}]
+    assert client.bulk_requests == 2
+    assert client.attempts['"line 0"'] == 1 and client.attempts['"line 3"'] == 2
+
+
+def test_bulk_index_reports_ids_in_order_for_bulk_delete():
+    client = FakeOpenSearch(lambda doc, attempt: 400 if doc['metadata'] == 'line 2' else None)
+    recorded = []
+    opensearch.bulk_index(client, 'idx', docs(5), chunk_size=2, workers=2,
+                          on_indexed=lambda chunk, ids: recorded.extend(zip((doc['metadata'] for doc in chunk), ids)))
+    assert [metadata for metadata, _ in recorded] == [f'line {i}' for i in range(5)]
+    assert dict(recorded)['line 2'] is None
+
+    ids = [doc_id for _, doc_id in recorded if doc_id]
+    summary = opensearch.bulk_delete(client, 'idx', ids + ['missing'])
+    assert summary == {'deleted': 5, 'failed': 0, 'errors': []}
+    assert client.documents == {}
+
+
+@mock_aws
+def test_add_reads_embed_output_and_legacy_documents(aws_clients, monkeypatch):
+    s3 = boto3.client('s3')
+    s3.create_bucket(Bucket='dest')
+    with vectors.VectorWriter('dest', 'doc.bin') as writer:
+        writer.write(['x', 'y', 'z'], [[1.0, 0.0], [0.5, 0.5], [0.0, 1.0]])
+    records = ''.join(json.dumps(doc) + '\n' for doc in docs(5))
+    s3.put_object(Bucket='dest', Key='doc.jsonl', Body=records.encode('utf-8'))
+    s3.put_object(Bucket='dest', Key='legacy.json', Body=json.dumps({
+        'metadata': ['a', 'b'], 'embeddings': [[1.0, 0.0], [0.0, 1.0]]}).encode('utf-8'))
+
+    module = load_lambda('vdb/add')
+    aws_clients('opensearchserverless', FakeOpenSearchServerless({'LLManager-vdb': 'abc'}), region_name='us-east-1')
+    client = FakeOpenSearch()
+    monkeypatch.setattr(opensearch, 'get_client', lambda collection, backend=None: client)
+
+    for key, count in (('doc.bin', 3), ('doc.jsonl', 5), ('legacy.json', 2)):
+        body = {'name': 'vdb', 'index': 'idx', 's3_src_bucket': 'dest', 's3_src_key': key}
+        response = module.lambda_handler({'body': json.dumps(body)}, None)
+        assert response['statusCode'] == 200
+        assert json.loads(response['body'])['indexed'] == count
+    assert len(client.documents) == 10
+    binary = {doc['metadata']: doc['embedding'] for _, doc in client.documents.values()}
+    assert list(binary['y']) == [0.5, 0.5]
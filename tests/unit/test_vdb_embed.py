@@ -0,0 +1,165 @@
+import io
+import json
+import tracemalloc
+
+import boto3
+import numpy as np
+import pytest
+from botocore.response import StreamingBody
+from moto import mock_aws
+
+from ll_runtime import embeddings, s3, vectors
+from tests.unit.fakes import FakeEmbeddingRuntime, FakeSageMaker, fake_embedding
+from tests.unit.lambdas import load_lambda
+
+
+@pytest.fixture
+def embed(aws_clients, monkeypatch):
+    monkeypatch.setattr(embeddings, 'EMBED_BACKOFF', 0)
+    with mock_aws():
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket='src')
+        s3.create_bucket(Bucket='dest')
+        module = load_lambda('vdb/embed')
+        aws_clients('sagemaker', FakeSageMaker({'LLManager-gte-endpoint': 'InService'}))
+        module.runtime = aws_clients('sagemaker-runtime', FakeEmbeddingRuntime())
+        module.s3_client = s3
+        yield module
+
+
+def run(module, text, **options):
+    module.s3_client.put_object(Bucket='src', Key='doc.txt', Body=text.encode('utf-8'))
+    body = {'s3_src_bucket': 'src', 's3_src_key': 'doc.txt', 's3_dest_bucket': 'dest', 's3_dest_key': 'doc.json',
+            'model': 'gte', **options}
+    return module.lambda_handler({'body': json.dumps(body)}, None)
+
+
+def test_lines_are_embedded_in_batches_and_kept_in_order(embed):
+    lines = [f'line {i}' for i in range(25)]
+    response = run(embed, '\n'.join(lines), batch_size=4, max_in_flight=3, format='jsonl')
+    assert response['statusCode'] == 200
+    stats = json.loads(response['body'])
+    assert stats['lines'] == 25 and stats['lines_per_second'] > 0
+
+    assert len(embed.runtime.calls) == 7
+    output = embed.s3_client.get_object(Bucket='dest', Key='doc.json')['Body'].read().decode('utf-8')
+    records = [json.loads(line) for line in output.splitlines()]
+    assert [record['metadata'] for record in records] == lines
+    assert [record['embedding'] for record in records] == [fake_embedding(line) for line in lines]
+
+
+def test_default_output_is_a_float32_matrix_with_metadata_sidecar(embed):
+    lines = [f'line {i}' for i in range(10)]
+    response = run(embed, '\n'.join(lines), batch_size=3)
+    assert json.loads(response['body'])['format'] == 'f32'
+
+    manifest = json.loads(embed.s3_client.get_object(Bucket='dest', Key='doc.json')['Body'].read())
+    assert manifest['format'] == vectors.FORMAT and manifest['count'] == 10 and manifest['dim'] == 3
+    raw = embed.s3_client.get_object(Bucket='dest', Key=manifest['vectors'])['Body'].read()
+    assert len(raw) == 10 * 3 * 4
+    matrix = np.frombuffer(raw, dtype='<f4').reshape(10, 3)
+    np.testing.assert_array_equal(matrix, np.array([fake_embedding(line) for line in lines], dtype='<f4'))
+
+    blocks = list(vectors.read_blocks('dest', manifest, rows=4))
+    assert [len(metadata) for _, metadata in blocks] == [4, 4, 2]
+    assert sum((metadata for _, metadata in blocks), []) == lines
+    np.testing.assert_array_equal(np.vstack([block for block, _ in blocks]), matrix)
+
+
+def test_failed_batches_are_retried(embed):
+    embed.runtime.failures = 2
+    response = run(embed, 'a\nb\nc', batch_size=2)
+    assert response['statusCode'] == 200
+    assert len(embed.runtime.calls) == 4
+
+
+def test_duplicate_chunks_are_embedded_once_and_fanned_out(embed):
+    text = 'to be\n\nor not\nto be\n  \nto be\nthe end'
+    stats = json.loads(run(embed, text, batch_size=2, format='jsonl')['body'])
+    assert stats['lines'] == 5 and stats['embedded'] == 3 and stats['reused'] == 2
+    sent = [text for _, payload in embed.runtime.calls for text in payload['text_inputs']]
+    assert sorted(sent) == ['or not', 'the end', 'to be']
+
+    output = embed.s3_client.get_object(Bucket='dest', Key='doc.json')['Body'].read().decode('utf-8')
+    records = [json.loads(line) for line in output.splitlines()]
+    assert [record['metadata'] for record in records] == ['to be', 'or not', 'to be', 'to be', 'the end']
+    assert all(record['embedding'] == fake_embedding(record['metadata']) for record in records)
+
+    stats = json.loads(run(embed, text, drop_duplicates=True, chunk_by='chars', chunk_size=100)['body'])
+    assert stats['lines'] == 1 and stats['duplicates_dropped'] == 0
+    assert json.loads(run(embed, text, drop_duplicates=True)['body'])['duplicates_dropped'] == 2
+    assert run(embed, text, chunk_by='chars', chunk_size=4, chunk_overlap=4)['statusCode'] == 400
+
+
+class SyntheticStream(io.RawIOBase):
+    """A large text object generated on demand instead of held in memory."""
+
+    def __init__(self, lines):
+        self.lines = iter(f'synthetic line number {i} with some padding text\n'.encode('utf-8') for i in range(lines))
+        self.pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while len(self.pending) < len(buffer):
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.pending += line
+        size = min(len(buffer), len(self.pending))
+        buffer[:size], self.pending = self.pending[:size], self.pending[size:]
+        return size
+
+
+class DiscardingS3:
+    def __init__(self, lines):
+        self.lines = lines
+        self.uploaded = 0
+        self.parts = 0
+
+    def get_object(self, Bucket, Key):
+        return {'Body': StreamingBody(SyntheticStream(self.lines), None)}
+
+    def create_multipart_upload(self, **kwargs):
+        return {'UploadId': 'upload'}
+
+    def upload_part(self, Body, PartNumber, **kwargs):
+        self.uploaded += len(Body)
+        self.parts += 1
+        return {'ETag': f'etag-{PartNumber}'}
+
+    def complete_multipart_upload(self, **kwargs):
+        pass
+
+    def put_object(self, Body, **kwargs):
+        self.uploaded += len(Body)
+
+
+def peak_memory(module, aws_clients, lines):
+    fake = aws_clients('s3', DiscardingS3(lines))
+    body = {'s3_src_bucket': 'src', 's3_src_key': 'big.txt', 's3_dest_bucket': 'dest', 's3_dest_key': 'big.jsonl',
+            'model': 'gte', 'batch_size': 64}
+    tracemalloc.start()
+    try:
+        response = module.lambda_handler({'body': json.dumps(body)}, None)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert json.loads(response['body'])['lines'] == lines
+    return peak, fake
+
+
+def test_peak_memory_stays_flat_as_input_grows(aws_clients, monkeypatch):
+    monkeypatch.setattr(s3, 'PART_SIZE', 32 * 1024)
+    monkeypatch.setattr(s3, 'READ_CHUNK_SIZE', 16 * 1024)
+    module = load_lambda('vdb/embed')
+    aws_clients('sagemaker', FakeSageMaker({'LLManager-gte-endpoint': 'InService'}))
+    aws_clients('sagemaker-runtime', FakeEmbeddingRuntime(record=False))
+
+    small_peak, _ = peak_memory(module, aws_clients, 5_000)
+    large_peak, large = peak_memory(module, aws_clients, 40_000)
+
+    assert large.parts > 8
+    assert large_peak < 2 * 1024 * 1024
+    assert large_peak < small_peak * 1.5
@@ -0,0 +1,181 @@
+import json
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from ll_runtime import embeddings, queues
+from ll_runtime import ingest as ingest_jobs
+from tests.unit.conftest import create_jobs_table
+from tests.unit.fakes import FakeEmbeddingRuntime, FakeSageMaker, client_error
+from tests.unit.lambdas import load_lambda
+
+
+class FlakyEmbeddingRuntime(FakeEmbeddingRuntime):
+    """Fails every request containing ``broken`` text while ``broken`` is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.broken = True
+
+    def respond(self, endpoint, payload):
+        if self.broken and any('broken' in text for text in payload['text_inputs']):
+            return client_error('ModelError', 'InvokeEndpoint', 'cannot embed')
+        return super().respond(endpoint, payload)
+
+
+@pytest.fixture
+def ingest(aws_clients, monkeypatch):
+    monkeypatch.setenv('TABLE_NAME', 'vdbLifecycleTable')
+    monkeypatch.setenv('JOBS_TABLE_NAME', 'vdbIngestJobsTable')
+    # Tasks run one at a time: moto does not apply the job counters' ADDs atomically across threads
+    monkeypatch.setattr(queues, 'LOCAL_QUEUE_WORKERS', 1)
+    monkeypatch.delenv('QUEUE_URL', raising=False)
+    monkeypatch.setattr(embeddings, 'EMBED_BACKOFF', 0)
+    monkeypatch.setattr(ingest_jobs, 'LIST_PAGE_SIZE', 5)
+    with mock_aws():
+        create_jobs_table('vdbIngestJobsTable')
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket='docs')
+        for i in range(12):
+            s3.put_object(Bucket='docs', Key=f'corpus/doc-{i:02}.txt', Body=f'first {i}\nsecond {i}'.encode('utf-8'))
+        s3.put_object(Bucket='docs', Key='corpus/doc-broken.txt', Body=b'broken line')
+        s3.put_object(Bucket='docs', Key='other/doc.txt', Body=b'not in the job')
+        aws_clients('sagemaker', FakeSageMaker({'LLManager-gte-endpoint': 'InService'}))
+        runtime = aws_clients('sagemaker-runtime', FlakyEmbeddingRuntime())
+        module = load_lambda('vdb/ingest')
+
+        def call(route, **body):
+            response = module.lambda_handler({'resource': f'/vdb/{route}', 'body': json.dumps(body)}, None)
+            return response['statusCode'], json.loads(response['body'])
+
+        yield call, s3, runtime
+
+
+def start(call, **options):
+    return call('ingest', s3_src_bucket='docs', s3_src_prefix='corpus/', s3_dest_bucket='docs',
+                s3_dest_prefix='vectors/', model='gte', format='jsonl', **options)
+
+
+def test_job_embeds_every_object_under_the_prefix_and_records_failures(ingest):
+    call, s3, runtime = ingest
+    code, job = start(call)
+    assert code == 200 and job['status'] == 'listing'
+
+    code, status = call('ingest/status', job_id=job['job_id'])
+    assert code == 200
+    assert status['status'] == 'failed' and status['total'] == 13
+    assert (status['succeeded'], status['failed'], status['pending']) == (12, 1, 0)
+    assert status['kind'] == 'ingest' and status['lines'] == 24 and status['tasks_per_second'] > 0
+    assert [failure['task'] for failure in status['failures']] == ['corpus/doc-broken.txt']
+    assert 'cannot embed' in status['failures'][0]['error']
+
+    output = s3.get_object(Bucket='docs', Key='vectors/doc-03.txt')['Body'].read().decode('utf-8')
+    assert [json.loads(line)['metadata'] for line in output.splitlines()] == ['first 3', 'second 3']
+    assert 'Contents' not in s3.list_objects_v2(Bucket='docs', Prefix='vectors/other')
+
+
+def test_retry_reprocesses_only_failed_objects(ingest):
+    call, s3, runtime = ingest
+    _, job = start(call)
+    runtime.broken = False
+    runtime.calls.clear()
+
+    code, retried = call('ingest/retry', job_id=job['job_id'])
+    assert code == 200 and retried['retried'] == 1
+    assert [payload['text_inputs'] for _, payload in runtime.calls] == [['broken line']]
+
+    _, status = call('ingest/status', job_id=job['job_id'])
+    assert status['status'] == 'succeeded'
+    assert (status['succeeded'], status['failed'], status['failures']) == (13, 0, [])
+
+    _, retried = call('ingest/retry', job_id=job['job_id'])
+    assert retried['retried'] == 0
+
+
+def test_unknown_jobs_and_models_are_rejected(ingest):
+    call, s3, runtime = ingest
+    assert call('ingest/status', job_id='missing')[0] == 400
+    assert call('ingest/retry', job_id='missing')[0] == 400
+    code, body = call('ingest', s3_src_bucket='docs', s3_src_prefix='corpus/', s3_dest_bucket='docs',
+                      s3_dest_prefix='vectors/', model='missing')
+    assert code == 400 and body == 'Embedding model not in service'
+
+
+def receive(sqs, url, count):
+    messages = []
+    while len(messages) < count:
+        messages += sqs.receive_message(QueueUrl=url, MaxNumberOfMessages=10).get('Messages', [])
+    return [{'messageId': message['MessageId'], 'body': message['Body']} for message in messages]
+
+
+def test_workers_list_the_prefix_and_skip_redelivered_messages(ingest, monkeypatch):
+    call, s3, runtime = ingest
+    sqs = boto3.client('sqs')
+    url = sqs.create_queue(QueueName='ingest')['QueueUrl']
+    monkeypatch.setenv('QUEUE_URL', url)
+    monkeypatch.setattr(ingest_jobs, 'LIST_PAGE_SIZE', 1000)
+    _, job = start(call)
+    _, status = call('ingest/status', job_id=job['job_id'])
+    assert status['status'] == 'listing' and status['total'] == 0
+
+    worker = load_lambda('vdb/ingest_worker')
+    listing = receive(sqs, url, 1)
+    assert worker.lambda_handler({'Records': listing}, None) == {'batchItemFailures': []}
+    records = receive(sqs, url, 13)
+    _, status = call('ingest/status', job_id=job['job_id'])
+    assert status['status'] == 'running' and status['pending'] == 13
+
+    assert worker.lambda_handler({'Records': records}, None) == {'batchItemFailures': []}
+    runtime.calls.clear()
+    finished = [record for record in records if 'broken' not in record['body']]
+    worker.lambda_handler({'Records': finished[:3]}, None)
+    assert runtime.calls == []
+
+    # A redelivered page neither counts its objects again nor resets the ones that ran
+    worker.lambda_handler({'Records': listing}, None)
+    worker.lambda_handler({'Records': receive(sqs, url, 13)}, None)
+    assert runtime.calls == []
+    _, status = call('ingest/status', job_id=job['job_id'])
+    assert (status['total'], status['succeeded'], status['failed']) == (13, 12, 1)
+
+
+def test_dead_lettered_messages_are_reported_as_failures(ingest, monkeypatch):
+    call, s3, runtime = ingest
+    dead_letter_queue = 'arn:aws:sqs:us-east-1:123456789012:ingest-dlq'
+    sqs = boto3.client('sqs')
+    url = sqs.create_queue(QueueName='ingest')['QueueUrl']
+    monkeypatch.setenv('QUEUE_URL', url)
+    monkeypatch.setenv('DEAD_LETTER_QUEUE_ARN', dead_letter_queue)
+    monkeypatch.setattr(ingest_jobs, 'LIST_PAGE_SIZE', 1000)
+    worker = load_lambda('vdb/ingest_worker')
+    error = 'Moved to the dead-letter queue after repeated failed deliveries'
+
+    _, job = start(call)
+    worker.lambda_handler({'Records': receive(sqs, url, 1)}, None)
+    records = sorted(receive(sqs, url, 13), key=lambda record: json.loads(record['body'])['task'])
+    for record in records[:2]:
+        record['eventSourceARN'] = dead_letter_queue
+    assert worker.lambda_handler({'Records': records}, None) == {'batchItemFailures': []}
+
+    _, status = call('ingest/status', job_id=job['job_id'])
+    assert status['status'] == 'failed'
+    assert (status['total'], status['succeeded'], status['failed']) == (13, 10, 3)
+    assert {'task': 'corpus/doc-00.txt', 'error': error} in status['failures']
+
+    _, job = start(call)
+    listing = receive(sqs, url, 1)
+    listing[0]['eventSourceARN'] = dead_letter_queue
+    worker.lambda_handler({'Records': listing}, None)
+    _, status = call('ingest/status', job_id=job['job_id'])
+    assert (status['status'], status['total'], status['failures']) == ('failed', 0, [{'task': None, 'error': error}])
+
+
+def test_local_queue_reraises_handler_errors():
+    def handler(message):
+        raise RuntimeError(message)
+
+    queue = queues.LocalQueue(handler, workers=2)
+    queue.send(['boom'])
+    with pytest.raises(RuntimeError):
+        queue.join()
@@ -0,0 +1,184 @@
+import json
+
+import boto3
+import pytest
+from moto import mock_aws
+from opensearchpy import ConnectionTimeout, TransportError
+
+from ll_runtime import embeddings, opensearch
+from ll_runtime.cache import TieredCache
+from tests.unit.fakes import (FakeEmbeddingRuntime, FakeOpenSearch, FakeOpenSearchServerless, FakeSageMaker,
+                              FakeSageMakerRuntime, client_error)
+from tests.unit.lambdas import load_lambda
+
+
+@pytest.fixture
+def query(aws_clients, monkeypatch):
+    module = load_lambda('vdb/query')
+    aws_clients('opensearchserverless', FakeOpenSearchServerless({'LLManager-vdb': 'abc'}), region_name='us-east-1')
+    module.sagemaker = aws_clients('sagemaker', FakeSageMaker({'LLManager-vdb-endpoint': 'InService',
+                                                              'LLManager-other-model-endpoint': 'InService'}))
+    module.model = aws_clients('sagemaker-runtime', FakeEmbeddingRuntime())
+    module.search = FakeOpenSearch()
+    module.search.documents['doc-0'] = ('idx', {'embedding': [0.1, 0.2, 0.3], 'metadata': 'hello'})
+    monkeypatch.setattr(opensearch, 'get_client', lambda collection, backend=None: module.search)
+    return module
+
+
+def call(module, **body):
+    return module.lambda_handler({'body': json.dumps({'name': 'vdb', 'index': 'idx', **body})}, None)
+
+
+def test_repeated_queries_reuse_the_embedding(query):
+    first = call(query, query='what is  a\tvector?')
+    second = call(query, query=' what is a vector? ')
+    assert first['headers']['X-Embedding-Cache'] == 'MISS'
+    assert query.model.calls == [('LLManager-vdb-endpoint', {'text_inputs': ['what is  a\tvector?']})]
+    assert second['headers']['X-Embedding-Cache'] == 'HIT'
+    assert json.loads(second['body']) == ['hello']
+    assert len(query.model.calls) == 1
+    assert query.search.searches[0][1] == query.search.searches[1][1]
+    assert query.embedding_cache.stats()['hits'] == 1
+
+
+def test_cache_is_keyed_by_embedding_model(query):
+    call(query, query='same text')
+    call(query, query='same text', model='other-model')
+    assert [endpoint for endpoint, _ in query.model.calls] == ['LLManager-vdb-endpoint', 'LLManager-other-model-endpoint']
+
+
+@mock_aws
+def test_embeddings_are_shared_through_dynamodb_as_float32(query):
+    boto3.client('dynamodb').create_table(
+        TableName='embeddings', BillingMode='PAY_PER_REQUEST',
+        KeySchema=[{'AttributeName': 'id', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'id', 'AttributeType': 'S'}])
+    query.embedding_cache = TieredCache(8, 'embeddings')
+    call(query, query='warm')
+
+    item = boto3.resource('dynamodb').Table('embeddings').scan()['Items'][0]
+    assert len(item['value'].value) == 3 * 4
+
+    query.embedding_cache = TieredCache(8, 'embeddings')
+    assert call(query, query='warm')['headers']['X-Embedding-Cache'] == 'HIT'
+    assert len(query.model.calls) == 1
+    assert query.embedding_cache.stats()['remote_hits'] == 1
+
+
+def test_search_returns_metadata_only_and_pages_with_search_after(query):
+    for i in range(1, 5):
+        query.search.documents[f'doc-{i}'] = ('idx', {'embedding': [0.0, 0.0, float(i)], 'metadata': f'doc {i}'})
+
+    first = call(query, query='q', k=4, size=3, ef_search=128, filter={'lang': 'en', 'source': ['a', 'b']})
+    assert json.loads(first['body']) == ['hello', 'doc 1', 'doc 2']
+    sent = query.search.searches[0][1]
+    assert sent['_source'] == {'includes': ['metadata']}
+    assert sent['query']['knn']['embedding']['k'] == 4
+    assert sent['query']['knn']['embedding']['method_parameters'] == {'ef_search': 128}
+    assert sent['query']['knn']['embedding']['filter'] == {'bool': {'filter': [
+        {'term': {'metadata.lang': 'en'}}, {'terms': {'metadata.source': ['a', 'b']}}]}}
+
+    cursor = json.loads(first['headers']['X-Search-After'])
+    second = call(query, query='q', k=4, size=3, search_after=cursor)
+    assert json.loads(second['body']) == ['doc 3']
+    assert 'X-Search-After' not in second['headers']
+
+
+def test_search_after_keeps_hits_tied_across_a_page_boundary(query):
+    for i in range(1, 5):
+        query.search.documents[f'doc-{i}'] = ('idx', {'embedding': [0.0, 0.0, 1.0], 'metadata': f'doc {i}',
+                                                       opensearch.DOC_KEY_FIELD: f'key-{5 - i}'})
+    query.search.scores = dict.fromkeys(query.search.documents, 0.5)
+
+    first = call(query, query='q', k=5, size=3)
+    assert query.search.searches[0][1]['sort'] == [{'_score': 'desc'},
+                                                   {'doc_key': {'order': 'asc', 'unmapped_type': 'keyword'}}]
+    second = call(query, query='q', k=5, size=3, search_after=json.loads(first['headers']['X-Search-After']))
+    assert sorted(json.loads(first['body']) + json.loads(second['body'])) == ['doc 1', 'doc 2', 'doc 3', 'doc 4', 'hello']
+
+
+def test_a_page_of_all_k_neighbours_has_no_cursor(query):
+    for i in range(1, 5):
+        query.search.documents[f'doc-{i}'] = ('idx', {'embedding': [0.0, 0.0, float(i)], 'metadata': f'doc {i}'})
+    response = call(query, query='q', k=3)
+    assert json.loads(response['body']) == ['hello', 'doc 1', 'doc 2']
+    assert 'X-Search-After' not in response['headers']
+
+
+def test_size_larger_than_k_is_rejected(query):
+    response = call(query, query='q', k=2, size=5)
+    assert response['statusCode'] == 400
+    assert query.search.searches == []
+
+
+def test_queries_are_embedded_together_and_sent_as_one_msearch(query):
+    call(query, query='cached')
+
+    response = call(query, queries=['cached', 'first', 'second', 'first '], k=2)
+    results = json.loads(response['body'])
+    assert [result['query'] for result in results] == ['cached', 'first', 'second', 'first ']
+    assert [result['cache'] for result in results] == ['HIT', 'MISS', 'MISS', 'MISS']
+    assert all(result['results'] == ['hello'] for result in results)
+
+    assert [payload['text_inputs'] for _, payload in query.model.calls] == [['cached'], ['first', 'second']]
+    assert query.search.msearch_requests == 1
+    assert len(query.search.searches) == 1 + 4
+
+
+def test_too_many_queries_are_rejected(query, monkeypatch):
+    monkeypatch.setattr(query, 'MAX_QUERIES', 2)
+    assert call(query, queries=['a', 'b', 'c'])['statusCode'] == 400
+    assert call(query, queries=[])['statusCode'] == 400
+
+
+def test_embedding_model_must_be_in_service(query):
+    response = call(query, query='q', model='missing')
+    assert response['statusCode'] == 400
+    assert json.loads(response['body']) == 'Embedding model not in service'
+    assert query.model.calls == [] and query.search.searches == []
+
+
+def test_endpoint_errors_are_passed_on_as_json(query, aws_clients, monkeypatch):
+    monkeypatch.setattr(embeddings, 'EMBED_BACKOFF', 0)
+    error = client_error('ModelError', 'InvokeEndpoint', 'Received server error (500) from model')
+    error.response['ResponseMetadata'] = {'HTTPStatusCode': 424}
+    aws_clients('sagemaker-runtime', FakeSageMakerRuntime(lambda endpoint, payload: error))
+    response = call(query, query='q')
+    assert response['statusCode'] == 424
+    assert json.loads(response['body']) == 'Received server error (500) from model'
+
+    response = call(query, queries=['q'])
+    assert response['statusCode'] == 424
+
+
+def test_collection_errors_map_to_client_and_gateway_errors(query, monkeypatch):
+    def fail(error):
+        def raise_error(*args, **kwargs):
+            raise error
+        return raise_error
+
+    monkeypatch.setattr(query.search, 'search', fail(TransportError(404, 'index_not_found_exception',
+                                                                    {'error': {'reason': 'no such index'}})))
+    response = call(query, query='q')
+    assert response['statusCode'] == 404
+    assert json.loads(response['body']) == {'error': {'reason': 'no such index'}}
+
+    monkeypatch.setattr(query.search, 'search', fail(TransportError(500, 'internal_error', 'boom')))
+    assert call(query, query='q')['statusCode'] == 502
+
+    monkeypatch.setattr(query.search, 'msearch', fail(ConnectionTimeout('TIMEOUT', 'timed out', TimeoutError('read timed out'))))
+    response = call(query, queries=['q'])
+    assert response['statusCode'] == 504
+    assert 'timed out' in json.loads(response['body'])
+
+
+def test_failed_sub_queries_get_their_own_status(query, monkeypatch):
+    monkeypatch.setattr(query.search, 'msearch', lambda body: {'responses': [
+        {'status': 200, 'hits': {'hits': []}},
+        {'status': 429, 'error': {'type': 'too_many_requests'}},
+        {'status': 503, 'error': {'type': 'unavailable'}},
+        {'error': {'type': 'unknown'}},
+    ]})
+    results = json.loads(call(query, queries=['a', 'b', 'c', 'd'])['body'])
+    assert [result['statusCode'] for result in results] == [200, 429, 502, 502]
+    assert results[1]['error'] == {'type': 'too_many_requests'}
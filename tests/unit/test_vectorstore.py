@@ -0,0 +1,100 @@
+import json
+
+import numpy as np
+import pytest
+
+from ll_runtime import vectorstore
+from tests.unit.fakes import FakeSageMaker, FakeSageMakerRuntime
+from tests.unit.lambdas import load_lambda
+
+
+def index_body(dimension, space_type='l2'):
+    return {'settings': {'index.knn': True}, 'mappings': {'properties': {'embedding': {
+        'type': 'knn_vector', 'dimension': dimension, 'method': {'name': 'hnsw', 'space_type': space_type}}}}}
+
+
+@pytest.fixture
+def local(tmp_path, monkeypatch):
+    monkeypatch.setattr(vectorstore, 'VECTOR_STORE_PATH', str(tmp_path))
+    return vectorstore.get_store('docs', 'local')
+
+
+@pytest.mark.parametrize('space_type', ['l2', 'cosinesimil', 'innerproduct'])
+def test_local_search_matches_brute_force(local, space_type):
+    rng = np.random.default_rng(7)
+    matrix = rng.standard_normal((500, 16)).astype(np.float32)
+    query = rng.standard_normal(16).astype(np.float32)
+    local.create_index('idx', index_body(16, space_type))
+    local.add('idx', ({'embedding': row.tolist(), 'metadata': i} for i, row in enumerate(matrix)), chunk_size=64)
+
+    if space_type == 'l2':
+        expected = np.argsort(((matrix - query) ** 2).sum(axis=1))
+    elif space_type == 'cosinesimil':
+        expected = np.argsort(-(matrix @ query) / np.linalg.norm(matrix, axis=1))
+    else:
+        expected = np.argsort(-(matrix @ query))
+    hits = local.search('idx', query.tolist(), k=10)
+    assert [hit['metadata'] for hit in hits] == expected[:10].tolist()
+
+    scores, rows = vectorstore.top_k(local.matrix('idx'), query, 10, space_type, block_rows=37)
+    assert rows.tolist() == expected[:10].tolist()
+
+
+def test_appends_are_incremental_and_survive_reopening(local, tmp_path):
+    local.create_index('idx', index_body(2))
+    local.add('idx', [{'embedding': [0.0, 0.0], 'metadata': 'origin'}])
+    assert [hit['metadata'] for hit in local.search('idx', [0.0, 0.0], k=5)] == ['origin']
+
+    summary = local.add('idx', [{'embedding': [1.0, 0.0], 'metadata': 'x'}, {'embedding': [1.0], 'metadata': 'bad'}])
+    assert summary['indexed'] == 1 and summary['failed'] == 1
+    with open(tmp_path / 'docs' / 'idx' / 'vectors.f32', 'ab') as f:
+        f.write(b'\x00' * 8)  # rows from an interrupted append are never read
+
+    reopened = vectorstore.LocalVectorStore(str(tmp_path / 'docs'))
+    assert reopened.matrix('idx').shape == (2, 2)
+    assert [hit['metadata'] for hit in reopened.search('idx', [0.9, 0.0], k=5)] == ['x', 'origin']
+
+
+def test_filters_and_search_after_page_through_k_neighbours(local):
+    local.create_index('idx', index_body(1))
+    local.add('idx', [{'embedding': [float(i)], 'metadata': {'n': i, 'lang': 'en' if i % 2 else 'fr'}} for i in range(10)])
+
+    hits = local.search('idx', [0.0], k=4, filters={'lang': 'en'})
+    assert [hit['metadata']['n'] for hit in hits] == [1, 3, 5, 7]
+
+    first = local.search('idx', [0.0], k=5, size=3)
+    second = local.search('idx', [0.0], k=5, size=3, search_after=first[-1]['sort'])
+    assert [hit['metadata']['n'] for hit in first + second] == [0, 1, 2, 3, 4]
+
+
+def test_search_after_keeps_hits_tied_across_a_page_boundary(local):
+    local.create_index('idx', index_body(1))
+    local.add('idx', [{'embedding': [1.0], 'metadata': i} for i in range(5)])
+
+    first = local.search('idx', [1.0], k=5, size=2)
+    second = local.search('idx', [1.0], k=5, size=2, search_after=first[-1]['sort'])
+    third = local.search('idx', [1.0], k=5, size=2, search_after=second[-1]['sort'])
+    assert sorted(hit['metadata'] for hit in first + second + third) == [0, 1, 2, 3, 4]
+
+
+def test_handlers_run_against_the_local_backend(local, aws_clients, monkeypatch):
+    monkeypatch.setattr(vectorstore, 'VECTOR_STORE_BACKEND', 'local')
+    add_index = load_lambda('vdb/add_index')
+    response = add_index.lambda_handler({'body': json.dumps({
+        'name': 'docs', 'dim': 3, 'space_type': 'cosinesimil', 'm': 32, 'encoder': 'sq_fp16'})}, None)
+    assert response['statusCode'] == 200
+    assert local._info('docs')['space_type'] == 'cosinesimil'
+
+    add = load_lambda('vdb/add')
+    monkeypatch.setattr(add, 'read_documents', lambda bucket, key, source=None: iter([
+        {'embedding': [1.0, 0.0, 0.0], 'metadata': 'x'}, {'embedding': [0.0, 1.0, 0.0], 'metadata': 'y'}]))
+    response = add.lambda_handler({'body': json.dumps({
+        'name': 'docs', 'index': 'docs', 's3_src_bucket': 'b', 's3_src_key': 'k'})}, None)
+    assert json.loads(response['body'])['indexed'] == 2
+
+    query = load_lambda('vdb/query')
+    aws_clients('sagemaker', FakeSageMaker({'LLManager-docs-endpoint': 'InService'}))
+    aws_clients('sagemaker-runtime', FakeSageMakerRuntime(lambda endpoint, payload: {'embedding': [[0.1, 0.9, 0.0]]}))
+    response = query.lambda_handler({'body': json.dumps({'name': 'docs', 'index': 'docs', 'query': 'q', 'k': 2, 'size': 1})}, None)
+    assert json.loads(response['body']) == ['y']
+    assert json.loads(response['headers']['X-Search-After'])[0] > 0.9